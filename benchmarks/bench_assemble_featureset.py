@@ -0,0 +1,85 @@
+"""Assembly of per-series feature values into a featureset.
+
+Times `featurize.assemble_featureset`, which fills a preallocated array, on
+the per-series feature values that `featurize_time_series` passes to it
+against the previous implementation, which concatenated the series with
+`pd.concat` and transposed the result.
+
+Usage::
+
+    python benchmarks/bench_assemble_featureset.py --n-series 1000 10000 100000
+"""
+import argparse
+import time
+
+import dask
+import numpy as np
+import pandas as pd
+
+from cesium import featurize
+from cesium.features import GENERAL_FEATS
+
+
+def assemble_concat(features_list, names):
+    """Previous `pd.concat`-based assembly."""
+    feat_df = pd.concat(features_list, axis=1, ignore_index=True).T
+    feat_df.index = names
+    return feat_df
+
+
+def sample_features(n_series, n_channels, features_to_use, size=20,
+                    seed=0):
+    """Feature values of random time series, as computed by
+    `featurize_time_series` (with the synchronous scheduler) before they are
+    assembled.
+    """
+    state = np.random.RandomState(seed)
+    times = [np.sort(state.uniform(0, 10, (n_channels, size)))
+             for i in range(n_series)]
+    values = [state.normal(size=(n_channels, size)) for i in range(n_series)]
+    errors = [state.exponential(0.1, (n_channels, size))
+              for i in range(n_series)]
+
+    features_list = []
+    assemble_featureset = featurize.assemble_featureset
+    def capture(all_features, *args, **kwargs):
+        features_list.extend(all_features)
+        return assemble_featureset(all_features, *args, **kwargs)
+    featurize.assemble_featureset = capture
+    try:
+        featurize.featurize_time_series(times, values, errors,
+                                        features_to_use, scheduler=dask.get)
+    finally:
+        featurize.assemble_featureset = assemble_featureset
+    return features_list
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--n-series', type=int, nargs='+',
+                        default=[1000, 10000, 100000])
+    parser.add_argument('--channels', type=int, default=1)
+    args = parser.parse_args()
+
+    print('{:>10} {:>12} {:>12} {:>8}'.format('series', 'concat (s)',
+                                              'assemble (s)', 'speedup'))
+    for n_series in args.n_series:
+        features_list = sample_features(n_series, args.channels,
+                                        GENERAL_FEATS)
+        names = ['ts{}'.format(i) for i in range(n_series)]
+
+        start = time.time()
+        expected = assemble_concat(features_list, names)
+        concat_time = time.time() - start
+
+        start = time.time()
+        fset = featurize.assemble_featureset(features_list, names=names)
+        assemble_time = time.time() - start
+
+        pd.util.testing.assert_frame_equal(fset, expected)
+        print('{:>10} {:>12.3f} {:>12.3f} {:>8.1f}'.format(
+            n_series, concat_time, assemble_time, concat_time / assemble_time))
+
+
+if __name__ == '__main__':
+    main()
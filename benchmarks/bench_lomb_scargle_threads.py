@@ -0,0 +1,71 @@
+"""Thread scaling of Lomb-Scargle featurization.
+
+Featurizes a synthetic collection of irregularly-sampled light curves with
+`featurize_time_series` using the threaded `dask` scheduler and an increasing
+number of worker threads, and reports the speedup relative to the first
+(by default, single-threaded) run.
+Since the Lomb-Scargle kernel runs without the GIL, the speedup should be
+close to linear up to the number of physical cores.
+
+Usage::
+
+    python benchmarks/bench_lomb_scargle_threads.py --n-series 256 \\
+        --threads 1 2 4 8 16 32
+"""
+import argparse
+import functools
+import time
+
+import numpy as np
+import dask.threaded
+
+from cesium import featurize
+
+
+def sample_light_curves(n_series, size, baseline, seed=0):
+    """Irregularly-sampled noisy sinusoids with random periods."""
+    state = np.random.RandomState(seed)
+    times, values, errors = [], [], []
+    for i in range(n_series):
+        t = np.sort(state.uniform(0, baseline, size))
+        freq = state.uniform(0.05, 5.)
+        times.append(t)
+        values.append(np.sin(2 * np.pi * freq * t)
+                      + state.normal(scale=0.1, size=size))
+        errors.append(state.exponential(0.1, size))
+    return times, values, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--n-series', type=int, default=128)
+    parser.add_argument('--size', type=int, default=100,
+                        help='number of observations per series')
+    parser.add_argument('--baseline', type=float, default=100.,
+                        help='time span of each series')
+    parser.add_argument('--threads', type=int, nargs='+',
+                        default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    times, values, errors = sample_light_curves(args.n_series, args.size,
+                                                args.baseline)
+    features_to_use = ['freq1_freq']
+
+    baseline_time = None
+    print('{:>8} {:>10} {:>8}'.format('threads', 'time (s)', 'speedup'))
+    for n_threads in args.threads:
+        scheduler = functools.partial(dask.threaded.get,
+                                      num_workers=n_threads)
+        start = time.time()
+        featurize.featurize_time_series(times, values, errors,
+                                        features_to_use=features_to_use,
+                                        scheduler=scheduler)
+        elapsed = time.time() - start
+        if baseline_time is None:
+            baseline_time = elapsed
+        print('{:>8} {:>10.2f} {:>8.2f}'.format(n_threads, elapsed,
+                                                baseline_time / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from .version import version as __version__
+
+
+__all__ = ['FeatureCache']
+
+
+class FeatureCache(object):
+    """Persistent on-disk cache of computed feature values.
+
+    Feature values (and, optionally, intermediate values such as
+    `_lomb_model`) are stored for each channel of a time series under a key
+    derived from the time, measurement and error values and meta-features of
+    the time series together with the `cesium` version, so that entries are
+    invalidated whenever the data or the feature implementations change.
+    Custom features, and any features computed from them (e.g., when a custom
+    dask graph overrides an intermediate value such as `_lomb_model`), are
+    never cached, since their definition is not part of the key.
+
+    Entries are stored in a SQLite database; if `max_size` is given, the
+    least recently used entries are evicted once the total size of the
+    stored values exceeds it.
+
+    Attributes
+    ----------
+    path : str
+        Path of the SQLite database file (created if necessary).
+    max_size : int or None
+        Maximum total size (in bytes) of the stored values, or None for no
+        limit.
+    intermediates : tuple of str
+        Names of intermediate values of the feature graph (e.g.,
+        '_lomb_model') to be cached in addition to the features themselves.
+    """
+    def __init__(self, path, max_size=None, intermediates=()):
+        self.path = path
+        self.max_size = max_size
+        self.intermediates = tuple(intermediates)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT, "
+                         "name TEXT, value BLOB, size INTEGER, atime REAL, "
+                         "PRIMARY KEY (key, name))")
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_atime ON "
+                         "entries (atime)")
+
+    def __getstate__(self):
+        return self.path, self.max_size, self.intermediates
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def _connect(self):
+        """SQLite connection for the current thread and process."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=60.)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    @staticmethod
+    def key(ts):
+        """Hash of the values and meta-features of a `TimeSeries` and the
+        `cesium` version.
+        """
+        h = hashlib.sha1(__version__.encode())
+        for channel in ts.channels():
+            for x in channel:
+                h.update(np.ascontiguousarray(x, dtype='float64').tobytes())
+            h.update(b'|')
+        h.update(json.dumps(sorted((str(k), repr(v)) for k, v
+                                   in ts.meta_features.items())).encode())
+        if ts.dtype != np.float64:  # features computed in single precision
+            h.update(ts.dtype.str.encode())
+        return h.hexdigest()
+
+    def get(self, key, names):
+        """Cached values of `names` for the time series with key `key`.
+
+        Returns
+        -------
+        dict
+            Dictionary mapping each cached name to the list of its values for
+            each channel; names that are not cached are omitted.
+        """
+        names = list(names)
+        if not names:
+            return {}
+        conn = self._connect()
+        with conn:
+            rows = conn.execute("SELECT name, value FROM entries WHERE key = ? "
+                                "AND name IN ({})".format(
+                                    ','.join('?' * len(names))),
+                                [key] + names).fetchall()
+            conn.executemany("UPDATE entries SET atime = ? WHERE key = ? AND "
+                             "name = ?",
+                             [(time.time(), key, name) for name, _ in rows])
+        return {name: pickle.loads(value) for name, value in rows}
+
+    def put(self, key, values):
+        """Store values (dictionary mapping names to lists of values for each
+        channel) for the time series with key `key`, evicting the least
+        recently used entries if necessary.
+        """
+        if not values:
+            return
+        now = time.time()
+        blobs = [(key, name, pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+                 for name, value in values.items()]
+        conn = self._connect()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO entries VALUES "
+                             "(?, ?, ?, ?, ?)",
+                             [(k, name, sqlite3.Binary(blob), len(blob), now)
+                              for k, name, blob in blobs])
+            if self.max_size is not None:
+                self._evict(conn)
+
+    def _evict(self, conn):
+        """Delete least recently used entries until the cache fits in
+        `max_size`.
+        """
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM "
+                             "entries").fetchone()[0]
+        if total <= self.max_size:
+            return
+        evicted = []
+        for key, name, size in conn.execute("SELECT key, name, size FROM "
+                                            "entries ORDER BY atime"):
+            if total <= self.max_size:
+                break
+            evicted.append((key, name))
+            total -= size
+        conn.executemany("DELETE FROM entries WHERE key = ? AND name = ?",
+                         evicted)
+
+    def size(self):
+        """Total size (in bytes) of the stored values."""
+        return self._connect().execute("SELECT COALESCE(SUM(size), 0) FROM "
+                                       "entries").fetchone()[0]
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM "
+                                       "entries").fetchone()[0]
+
+    def clear(self):
+        """Remove all entries."""
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM entries")
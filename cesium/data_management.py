@@ -1,4 +1,9 @@
+import io
+import itertools
+import multiprocessing
 import os
+import tarfile
+import zipfile
 import numpy as np
 import pandas as pd
 from . import util
@@ -6,11 +11,17 @@ from . import time_series
 from .time_series import TimeSeries
 
 
-__all__ = ['parse_ts_data', 'parse_headerfile', 'parse_and_store_ts_data']
+__all__ = ['parse_ts_data', 'parse_headerfile', 'iter_time_series',
+           'parse_and_store_ts_data']
+
+
+# Name of the file in which `parse_and_store_ts_data` records the time series
+# that have been stored, so that an interrupted ingest can be resumed
+INGEST_MANIFEST = 'ingest_manifest.txt'
 
 
 # TODO more robust error handling
-def parse_ts_data(filepath, sep=","):
+def parse_ts_data(filepath, sep=",", parser='pandas'):
     """Parses raw time series data file and returns an (n, 3) array of values.
 
     Data is expected as text in tabular format with separator `sep`. The output
@@ -30,13 +41,33 @@ def parse_ts_data(filepath, sep=","):
         Path to raw time series data to be parsed.
     sep : str, optional
         Separator of columns in data file; defaults to ','.
+    parser : {'pandas', 'numpy'}, optional
+        Whether to parse the file with the C parser of `pandas.read_csv`
+        (default; several times faster for large files) or with
+        `numpy.loadtxt`. Both produce identical values and raise ValueError
+        for malformed rows (missing or empty fields, e.g. short rows or
+        trailing separators, or extra columns); lines starting with '#' are
+        treated as comments.
 
     Returns
     -------
     np.ndarray
         3-column array of (time, measurement, error) values.
     """
-    ts_data = np.loadtxt(filepath, delimiter=sep, ndmin=2)
+    if parser == 'pandas':
+        try:
+            # Without NA detection, missing fields fail to convert to float
+            # (as in `numpy.loadtxt`) instead of silently becoming NaN
+            ts_data = pd.read_csv(filepath, sep=sep, header=None,
+                                  comment='#', dtype='float64',
+                                  na_filter=False,
+                                  float_precision='round_trip').values
+        except pd.errors.EmptyDataError:
+            ts_data = np.empty((0, 0))
+    elif parser == 'numpy':
+        ts_data = np.loadtxt(filepath, delimiter=sep, ndmin=2)
+    else:
+        raise ValueError("Unknown parser '{}'.".format(parser))
     ts_data = ts_data[:, :3]  # Only using T, M, E
     if ts_data.shape[0] == 0 or ts_data.shape[1] == 0:
         raise ValueError("Incomplete or improperly formatted time series data"
@@ -96,17 +127,21 @@ def parse_headerfile(headerfile_path, files_to_include=None):
     header.rename(columns={c: 'label' for c in ['label', 'target', 'class',
                                                 'class_label']}, inplace=True)
     labels = (header.label if 'label' in header
-              else pd.Series([None], index=header.index))
+              else pd.Series([None] * len(header), index=header.index))
     feature_data = header.drop(['label', 'class'], axis=1, errors='ignore')
     return labels, feature_data
 
 
 def parse_and_store_ts_data(data_path, output_dir, header_path=None,
-                            cleanup_archive=True, cleanup_header=True, sep=','):
+                            cleanup_archive=True, cleanup_header=True, sep=',',
+                            n_jobs=1, resume=False, collection=False):
     """Parses raw time series data from a single file or archive and loads
     metadata from header file (if applicable). Data is stored as files within
     `output_dir`, and the list of these paths is returned.
 
+    Archive members are read in memory (see `util.iter_archive_members`)
+    rather than extracted to a temporary directory.
+
     Parameters
     ----------
     data_path : str
@@ -119,40 +154,166 @@ def parse_and_store_ts_data(data_path, output_dir, header_path=None,
         meta_features.
     cleanup_archive : bool, optional
         Boolean specifying whether to delete the uploaded data file/archive
-        (defaults to True).
+        once all time series are stored (defaults to True).
     cleanup_header : bool, optional
         Boolean specifying whether to delete the uploaded header file (defaults
         to True).
     sep : str, optional
         Separator of columns in data file; defaults to ','.
+    n_jobs : int, optional
+        Number of worker processes used to parse (and store) the time series
+        files; if None, the number of CPUs is used. Defaults to 1 (no worker
+        processes).
+    resume : bool, optional
+        If True, the name of each stored time series is appended to the file
+        `INGEST_MANIFEST` in `output_dir` as soon as it is written, and time
+        series already recorded there (by an earlier, possibly interrupted
+        call) are not parsed again. Not supported together with
+        `collection`. Defaults to False.
+    collection : bool, optional
+        If True, all time series are stored in a single collection in
+        `output_dir` (see `time_series.save_collection`) rather than as one
+        `.npz` file each, and the path of the collection is returned.
+        Defaults to False.
 
     Returns
     -------
-    List of paths to time series files
+    List of paths to time series files (or path to the collection, if
+    `collection` is True)
     """
-    with util.extract_time_series(data_path, cleanup_archive=cleanup_archive,
-                                  cleanup_files=True) as ts_paths:
-        short_fnames = [util.shorten_fname(f) for f in ts_paths]
-        if header_path:
-            labels, meta_features = parse_headerfile(header_path, ts_paths)
+    if resume and collection:
+        raise ValueError("Resuming is not supported for collection output.")
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, INGEST_MANIFEST)
+    done = set()
+    if resume and os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            done = set(f.read().splitlines())
+
+    if header_path:
+        labels, meta_features = parse_headerfile(header_path)
+    else:
+        labels, meta_features = None, None
+
+    all_paths = []
+
+    def tasks():
+        for member_path, f in util.iter_archive_members(data_path):
+            fname = util.shorten_fname(member_path)
+            out_path = os.path.join(output_dir, '{}.npz'.format(fname))
+            all_paths.append(out_path)
+            if fname in done and os.path.exists(out_path):
+                continue
+            label, ts_meta_features = _header_entry(labels, meta_features,
+                                                    fname)
+            yield (f.read(), sep, label, ts_meta_features, fname,
+                   None if collection else out_path)
+
+    n_jobs = n_jobs or os.cpu_count() or 1
+    pool = multiprocessing.Pool(n_jobs) if n_jobs > 1 else None
+
+    def results():
+        # Archive members are read in bounded chunks, so that only a few
+        # files per worker are held in memory at a time
+        task_iter = tasks()
+        for chunk in iter(lambda: list(itertools.islice(task_iter,
+                                                        64 * n_jobs)), []):
+            yield from (pool.imap(_parse_and_store_file, chunk) if pool
+                        else map(_parse_and_store_file, chunk))
+
+    manifest = open(manifest_path, 'a') if resume else None
+    try:
+        if collection:
+            # Each time series is written to the collection as it is parsed
+            time_series.save_collection(results(), output_dir)
         else:
-            labels = pd.Series([None], index=short_fnames)
-            meta_features = pd.DataFrame(index=short_fnames)
-
-        all_time_series = []
-        for ts_path in ts_paths:
-            fname = util.shorten_fname(ts_path)
-            t, m, e = parse_ts_data(ts_path, sep)
-            ts_label = labels.loc[fname]
-            ts_meta_features = meta_features.loc[fname]
-            ts_path = '{}.npz'.format(fname)
-            ts_path = os.path.join(output_dir, ts_path)
-            ts = TimeSeries(t, m, e, ts_label, ts_meta_features, fname,
-                            ts_path)
-            ts.save(ts_path)
-            all_time_series.append(ts_path)
+            for fname in results():
+                if manifest:
+                    manifest.write(fname + '\n')
+                    manifest.flush()
+    finally:
+        if manifest:
+            manifest.close()
+        if pool:
+            pool.terminate()
+            pool.join()
 
+    if cleanup_archive and all_paths and (tarfile.is_tarfile(data_path) or
+                                          zipfile.is_zipfile(data_path)):
+        util.remove_files([data_path])
     if header_path and cleanup_header:
         util.remove_files([header_path])
 
-    return all_time_series
+    return output_dir if collection else all_paths
+
+
+def iter_time_series(data_path, header_path=None, sep=','):
+    """Iterate over the time series in a single file or archive without
+    extracting the archive to disk.
+
+    Archive members are read in memory (see `util.iter_archive_members`):
+    `.npz` members are loaded with `time_series.load`, and all other members
+    are parsed as raw time series data with `parse_ts_data`.
+
+    Parameters
+    ----------
+    data_path : str
+        Path to an individual time series file or tarball of multiple time
+        series files.
+    header_path : str, optional
+        Path to header file containing file names, labels/targets, and
+        meta_features.
+    sep : str, optional
+        Separator of columns in raw data files; defaults to ','.
+
+    Yields
+    ------
+    TimeSeries
+        Time series named after the corresponding archive member.
+    """
+    if header_path:
+        labels, meta_features = parse_headerfile(header_path)
+    else:
+        labels, meta_features = None, None
+    for member_path, f in util.iter_archive_members(data_path):
+        fname = util.shorten_fname(member_path)
+        if member_path.endswith('.npz'):
+            ts = time_series.load(io.BytesIO(f.read()))
+            ts.name = fname
+        else:
+            label, ts_meta_features = _header_entry(labels, meta_features,
+                                                    fname)
+            t, m, e = parse_ts_data(f, sep)
+            ts = TimeSeries(t, m, e, label, ts_meta_features, fname)
+        yield ts
+
+
+def _header_entry(labels, meta_features, fname):
+    """Label and meta-features of time series `fname` from the output of
+    `parse_headerfile` (or None).
+    """
+    if labels is None:
+        return None, {}
+    try:
+        return labels.loc[fname], meta_features.loc[fname]
+    except KeyError:
+        raise ValueError("Incomplete header file: make sure your "
+                         "header contains an entry for each time "
+                         "series file in the uploaded archive, and "
+                         "that the file names match the first column "
+                         "of the header.")
+
+
+def _parse_and_store_file(task):
+    """Parse the contents of a single time series file for
+    `parse_and_store_ts_data`; save
+    it and return its name if an output path is given, otherwise return the
+    `TimeSeries` object.
+    """
+    data, sep, label, meta_features, name, out_path = task
+    t, m, e = parse_ts_data(io.BytesIO(data), sep)
+    ts = TimeSeries(t, m, e, label, meta_features, name, out_path)
+    if out_path is None:
+        return ts
+    ts.save(out_path)
+    return name
@@ -1,3 +1,4 @@
 from .graphs import (CADENCE_FEATS, GENERAL_FEATS, LOMB_SCARGLE_FEATS,
-                     generate_dask_graph, feature_categories,
-                     dask_feature_graph, feature_tags)
+                     generate_dask_graph, feature_graph_options,
+                     compile_feature_plan, execute_feature_plan,
+                     feature_categories, dask_feature_graph, feature_tags)
@@ -1,4 +1,5 @@
 #include <math.h>
+#include <stdlib.h>
 #include "_eigs.h"
 
 static inline void copy_sincos (int numt, double sinx0[], double cosx0[], double sinx[], double cosx[]) {
@@ -76,9 +77,10 @@ static inline double do_lomb_zoom(int numt, int detrend_order, double *cn, doubl
     return px;
 }
 
-static inline void def_hat(int numt, int nharm, int detrend_order, double hat_matr[], double hat0[], double sinx[], double cosx[], double wt[], double cn[], double hat_hat[], double vec[], double lambda0) {
+// sx0 is scratch space for 2*numt values
+static inline void def_hat(int numt, int nharm, int detrend_order, double hat_matr[], double hat0[], double sinx[], double cosx[], double wt[], double cn[], double hat_hat[], double vec[], double lambda0, double sx0[]) {
     int i,j=numt*nharm,k,j1,npar=2*nharm,dord1=detrend_order+1;
-    double sx0[numt],cx0[numt],ct,st,sum;
+    double *cx0=sx0+numt,ct,st,sum;
     for (i=0;i<numt;i++) {
         sx0[i] = (hat_matr[i]=sinx[i])/wt[i]; cx0[i] = (hat_matr[i+j]=cosx[i])/wt[i];
     }
@@ -167,10 +169,10 @@ static inline void inv_hat(int n, double hat_hat[], double vec[], double vec1[],
     }
 }
 
-static inline double refine_psd(int numt, int nharm, int detrend_order, double hat_matr[], double hat0[], double hat_hat[], double sinx[], double cosx[], double wt[], double cn[], double vec1[], double *lambda0, double *lambda0_range, double chi0, double tc, double *Tr, int inv) {
+static inline double refine_psd(int numt, int nharm, int detrend_order, double hat_matr[], double hat0[], double hat_hat[], double sinx[], double cosx[], double wt[], double cn[], double vec1[], double *lambda0, double *lambda0_range, double chi0, double tc, double *Tr, int inv, double scratch[]) {
     int i,j,k,npar=2*nharm;
     double p[npar],vec[npar],eigs[npar],sum,px,lambda00=*lambda0;
-    def_hat(numt,nharm,detrend_order,hat_matr,hat0,sinx,cosx,wt,cn,hat_hat,vec,*lambda0);
+    def_hat(numt,nharm,detrend_order,hat_matr,hat0,sinx,cosx,wt,cn,hat_hat,vec,*lambda0,scratch);
     get_eigs(npar,hat_hat,eigs);
     for (i=0;i<npar;i++) {
         for (sum=0,j=0;j<npar;j++) sum += hat_hat[i+j*npar] * vec[j];
@@ -181,46 +183,219 @@ static inline double refine_psd(int numt, int nharm, int detrend_order, double h
     return px;
 }
 
-void lomb_scargle(int numt, int numf, int nharm, int detrend_order,
-                  double psd[], double cn[], double wth[], double sinx[],
-                  double cosx[], double sinx_step[], double cosx_step[],
-                  double sinx_back[], double cosx_back[],
-                  double sinx_smallstep[], double cosx_smallstep[],
-                  double hat_matr[], double hat_hat[],
-                  double hat0[], double soln[], double chi0,
-                  double freq_zoom, double psdmin, double tone_control,
-                  double lambda0[], double lambda0_range[],
-                  double Tr[], int ifreq[])
+// state of a frequency scan: best (refined) and best (simple) periodogram
+// values so far, plus scratch buffers for the zoomed/best-fit sines and cosines
+// and for the refinement (def_hat)
+typedef struct {
+    double psdmax, psd0max;
+    unsigned long jmax;
+    int ifr;
+    double *sinx1, *cosx1, *sinx2, *cosx2, *scratch;
+} scan_state;
+
+// scratch buffers live on the heap so that long series can be fit from
+// worker threads with small stacks; returns -1 if they cannot be allocated
+static inline int init_scan(scan_state *state, int numt, double freq_zoom) {
+    state->psdmax = 0.;
+    state->psd0max = 0.;
+    state->jmax = 0;
+    state->ifr = (int)(freq_zoom)/2;
+    state->sinx1 = malloc(6*(size_t)numt*sizeof(double));
+    if (state->sinx1 == NULL) return -1;
+    state->cosx1 = state->sinx1 + numt;
+    state->sinx2 = state->cosx1 + numt;
+    state->cosx2 = state->sinx2 + numt;
+    state->scratch = state->cosx2 + numt;
+    return 0;
+}
+
+static inline void scan_frequency(scan_state *state, unsigned long j, int numt, int nharm, int detrend_order, double psd[], double cn[], double wth[], double sinx[], double cosx[], double sinx_back[], double cosx_back[], double sinx_smallstep[], double cosx_smallstep[], double hat_matr[], double hat_hat[], double hat0[], double soln[], double chi0, double freq_zoom, double psdmin, double tone_control, double lambda0[], double lambda0_range[], int ifreq[]) {
+    double Trace,lambda;
+    // do a simple lomb-scargle, sin+cos fit
+    psd[j] = do_lomb(numt,detrend_order,cn,sinx,cosx,wth);
+    if (psd[j]>state->psd0max && state->psdmax==0) {
+        state->psd0max = psd[j];
+        copy_sincos(numt,sinx,cosx,state->sinx2,state->cosx2);
+        state->jmax = j;
+    }
+    // refine the fit around significant sin+cos fits
+    if (psd[j]>(double)psdmin) {
+        // first let the frequency vary slightly
+        do_lomb_zoom(numt,detrend_order, cn, sinx, cosx, state->sinx1, state->cosx1, sinx_back, cosx_back, sinx_smallstep, cosx_smallstep, wth, freq_zoom, &state->ifr);
+        lambda = *lambda0;
+        // now fit a multi-harmonic model with generalized cross-validation to avoid over-fitting
+        psd[j] = refine_psd(numt,nharm,detrend_order,hat_matr,hat0,hat_hat,state->sinx1,state->cosx1,wth,cn,soln,&lambda,lambda0_range,chi0,tone_control,&Trace,0,state->scratch);
+        if (psd[j]>state->psdmax) {
+            copy_sincos(numt,state->sinx1,state->cosx1,state->sinx2,state->cosx2);
+            state->psdmax=psd[j];
+            *ifreq = state->ifr;
+            state->jmax = j;
+        }
+    }
+}
+
+static inline void finish_scan(scan_state *state, int numt, int nharm, int detrend_order, double psd[], double cn[], double wth[], double hat_matr[], double hat_hat[], double hat0[], double soln[], double chi0, double tone_control, double lambda0[], double lambda0_range[], double Tr[]) {
+    // finally, rerun at the best-fit period so we get some statistics
+    psd[state->jmax] = refine_psd(numt,nharm,detrend_order,hat_matr,hat0,hat_hat,state->sinx2,state->cosx2,wth,cn,soln,lambda0,lambda0_range,chi0,tone_control,Tr,1,state->scratch);
+    free(state->sinx1);
+}
+
+// Returns 0 on success, or -1 if the scratch buffers cannot be allocated
+int lomb_scargle(int numt, int numf, int nharm, int detrend_order,
+                 double psd[], double cn[], double wth[], double sinx[],
+                 double cosx[], double sinx_step[], double cosx_step[],
+                 double sinx_back[], double cosx_back[],
+                 double sinx_smallstep[], double cosx_smallstep[],
+                 double hat_matr[], double hat_hat[],
+                 double hat0[], double soln[], double chi0,
+                 double freq_zoom, double psdmin, double tone_control,
+                 double lambda0[], double lambda0_range[],
+                 double Tr[], int ifreq[])
 {
-  int i,k,npar=2*(int)nharm,ifr=(int)(freq_zoom)/2;
   unsigned long j;
-  unsigned long jmax=0;
-  *ifreq = ifr;
-  double psdmax=0.,psd0max=0.,Trace,sinx1[numt],cosx1[numt],sinx2[numt],cosx2[numt],lambda,px,pxmax;
+  scan_state state;
+  if (init_scan(&state, numt, freq_zoom) != 0) return -1;
+  *ifreq = state.ifr;
+  for (j=0;j<numf;j++) {
+      scan_frequency(&state, j, numt, nharm, detrend_order, psd, cn, wth, sinx, cosx, sinx_back, cosx_back, sinx_smallstep, cosx_smallstep, hat_matr, hat_hat, hat0, soln, chi0, freq_zoom, psdmin, tone_control, lambda0, lambda0_range, ifreq);
+      update_sincos(numt, sinx_step, cosx_step, sinx, cosx, 0);
+  }
+  finish_scan(&state, numt, nharm, detrend_order, psd, cn, wth, hat_matr, hat_hat, hat0, soln, chi0, tone_control, lambda0, lambda0_range, Tr);
+  return 0;
+}
+
+// Same as lomb_scargle, but only considers the (arbitrary) frequencies in
+// freqs[0..ncand-1], e.g. candidate peaks of an approximate periodogram; tt is
+// 2*pi*time and the sines/cosines are computed directly for each frequency.
+int lomb_scargle_candidates(int numt, int ncand, int nharm, int detrend_order,
+                            double freqs[], double psd[], double cn[],
+                            double wth[], double tt[], double sinx_back[],
+                            double cosx_back[], double sinx_smallstep[],
+                            double cosx_smallstep[], double hat_matr[],
+                            double hat_hat[], double hat0[], double soln[],
+                            double chi0, double freq_zoom, double psdmin,
+                            double tone_control, double lambda0[],
+                            double lambda0_range[], double Tr[], int ifreq[])
+{
+  int i;
+  unsigned long j;
+  scan_state state;
+  double *sinx=malloc(2*(size_t)numt*sizeof(double)),*cosx;
+  if (sinx == NULL) return -1;
+  cosx = sinx + numt;
+  if (init_scan(&state, numt, freq_zoom) != 0) {
+      free(sinx);
+      return -1;
+  }
+  *ifreq = state.ifr;
+  for (j=0;j<ncand;j++) {
+      for (i=0;i<numt;i++) {
+          sinx[i] = sin(tt[i]*freqs[j])*wth[i];
+          cosx[i] = cos(tt[i]*freqs[j])*wth[i];
+      }
+      scan_frequency(&state, j, numt, nharm, detrend_order, psd, cn, wth, sinx, cosx, sinx_back, cosx_back, sinx_smallstep, cosx_smallstep, hat_matr, hat_hat, hat0, soln, chi0, freq_zoom, psdmin, tone_control, lambda0, lambda0_range, ifreq);
+  }
+  finish_scan(&state, numt, nharm, detrend_order, psd, cn, wth, hat_matr, hat_hat, hat0, soln, chi0, tone_control, lambda0, lambda0_range, Tr);
+  free(sinx);
+  return 0;
+}
+
+// Only the simple sin+cos periodogram of lomb_scargle (no zoom or refinement)
+// on the grid of numf frequencies starting at the frequency of sinx/cosx,
+// which are advanced by the steps sinx_step/cosx_step
+void lomb_scargle_psd(int numt, int numf, int detrend_order, double psd[],
+                      double cn[], double wth[], double sinx[], double cosx[],
+                      double sinx_step[], double cosx_step[]) {
+  unsigned long j;
   for (j=0;j<numf;j++) {
-      // do a simple lomb-scargle, sin+cos fit
       psd[j] = do_lomb(numt,detrend_order,cn,sinx,cosx,wth);
-      if (psd[j]>psd0max && psdmax==0) {
-          psd0max = psd[j];
-          copy_sincos(numt,sinx,cosx,sinx2,cosx2);
-          jmax = j;
+      update_sincos(numt, sinx_step, cosx_step, sinx, cosx, 0);
+  }
+}
+
+// Single-precision version of lomb_scargle_psd. The sums of do_lomb and the
+// update of the (float) sin/cos tables are fused into a single pass over the
+// times; each sum is split into LOMB_LANES float partial sums (over every
+// LOMB_LANES-th time), so that the pass can be vectorized, which are added to
+// double precision totals every LOMB_BLOCK times. The rounding error of the
+// float sums is thus bounded by LOMB_BLOCK / LOMB_LANES terms.
+#define LOMB_LANES 8
+#define LOMB_BLOCK 256
+
+// Add the products of times k..k+m-1 to the partial sums acc (of cs, c2, sh,
+// ch, and of st, ct for the first two detrending terms w0, w1), then step the
+// sin/cos tables
+static inline void lomb_block_float(int k, int m, float *restrict cn, float *restrict w0, float *restrict w1, float *restrict sinx, float *restrict cosx, float *restrict sinx_step, float *restrict cosx_step, float *restrict acc) {
+    int l;
+    float s, c;
+    // Pointers to the current LOMB_LANES times (rather than indices k+l,
+    // which -fwrapv prevents from being vectorized)
+    float *end = cn + k + m;
+    for (cn+=k,w0+=k,w1+=k,sinx+=k,cosx+=k,sinx_step+=k,cosx_step+=k; cn<end;
+         cn+=LOMB_LANES,w0+=LOMB_LANES,w1+=LOMB_LANES,sinx+=LOMB_LANES,
+         cosx+=LOMB_LANES,sinx_step+=LOMB_LANES,cosx_step+=LOMB_LANES) {
+        for (l=0;l<LOMB_LANES;l++) {
+            s = sinx[l]; c = cosx[l];
+            acc[l] += c*s;
+            acc[LOMB_LANES+l] += c*c;
+            acc[2*LOMB_LANES+l] += s*cn[l];
+            acc[3*LOMB_LANES+l] += c*cn[l];
+            acc[4*LOMB_LANES+l] += s*w0[l];
+            acc[5*LOMB_LANES+l] += c*w0[l];
+            acc[6*LOMB_LANES+l] += s*w1[l];
+            acc[7*LOMB_LANES+l] += c*w1[l];
+            sinx[l] = cosx_step[l]*s + sinx_step[l]*c;
+            cosx[l] = cosx_step[l]*c - sinx_step[l]*s;
+        }
+    }
+}
+
+void lomb_scargle_psd_float(int numt, int numf, int detrend_order, double psd[],
+                            float cn[], float wth[], float sinx[], float cosx[],
+                            float sinx_step[], float cosx_step[]) {
+  unsigned long j;
+  int i, k, l, m, n2;
+  float *w1 = wth + (detrend_order > 0 ? numt : 0);
+  float acc[8*LOMB_LANES], s, c;
+  double sum[8];
+  double cs,c2,s2,sh,ch,st,ct,cst,st0,ct0,detm;
+  int nfull = numt - numt % LOMB_LANES;
+  for (j=0;j<numf;j++) {
+      // Higher detrending terms, from the tables before they are stepped
+      for (st=0,ct=0,cst=0,i=2;i<=detrend_order;i++) {
+          n2 = numt*i;
+          for (st0=0,ct0=0,k=0;k<numt;k++) {
+              st0 += (double)sinx[k]*wth[k + n2];
+              ct0 += (double)cosx[k]*wth[k + n2];
+          }
+          st += st0*st0; ct += ct0*ct0; cst += st0*ct0;
       }
-      // refine the fit around significant sin+cos fits
-      if (psd[j]>(double)psdmin) {
-          // first let the frequency vary slightly
-          px = do_lomb_zoom(numt,detrend_order, cn, sinx, cosx, sinx1, cosx1, sinx_back, cosx_back, sinx_smallstep, cosx_smallstep, wth, freq_zoom, &ifr);
-          lambda = *lambda0;
-          // now fit a multi-harmonic model with generalized cross-validation to avoid over-fitting
-          psd[j] = refine_psd(numt,nharm,detrend_order,hat_matr,hat0,hat_hat,sinx1,cosx1,wth,cn,soln,&lambda,lambda0_range,chi0,tone_control,&Trace,0);
-          if (psd[j]>psdmax) {
-              copy_sincos(numt,sinx1,cosx1,sinx2,cosx2);
-              psdmax=psd[j];
-              *ifreq = ifr;
-              jmax = j;
+      for (i=0;i<8;i++) sum[i] = 0.;
+      for (k=0;k<nfull;k+=LOMB_BLOCK) {
+          m = nfull - k < LOMB_BLOCK ? nfull - k : LOMB_BLOCK;
+          for (i=0;i<8*LOMB_LANES;i++) acc[i] = 0.;
+          lomb_block_float(k, m, cn, wth, w1, sinx, cosx, sinx_step, cosx_step, acc);
+          for (i=0;i<8;i++) {
+              for (l=0;l<LOMB_LANES;l++) sum[i] += acc[i*LOMB_LANES+l];
           }
       }
-      update_sincos(numt, sinx_step, cosx_step, sinx, cosx, 0);
+      for (k=nfull;k<numt;k++) {
+          s = sinx[k]; c = cosx[k];
+          sum[0] += (double)c*s; sum[1] += (double)c*c;
+          sum[2] += (double)s*cn[k]; sum[3] += (double)c*cn[k];
+          sum[4] += (double)s*wth[k]; sum[5] += (double)c*wth[k];
+          sum[6] += (double)s*w1[k]; sum[7] += (double)c*w1[k];
+          sinx[k] = cosx_step[k]*s + sinx_step[k]*c;
+          cosx[k] = cosx_step[k]*c - sinx_step[k]*s;
+      }
+      cs = sum[0]; c2 = sum[1]; sh = sum[2]; ch = sum[3];
+      st += sum[4]*sum[4]; ct += sum[5]*sum[5]; cst += sum[4]*sum[5];
+      if (detrend_order > 0) {
+          st += sum[6]*sum[6]; ct += sum[7]*sum[7]; cst += sum[6]*sum[7];
+      }
+      cs -= cst; s2 = 1-c2-st; c2 -= ct;
+      detm = c2*s2 - cs*cs;
+      psd[j] = 0.;
+      if (detm>0) psd[j] = ( c2*sh*sh - 2.*cs*ch*sh + s2*ch*ch ) / detm;
   }
-  // finally, rerun at the best-fit period so we get some statistics
-  psd[jmax] = refine_psd(numt,nharm,detrend_order,hat_matr,hat0,hat_hat,sinx2,cosx2,wth,cn,soln,lambda0,lambda0_range,chi0,tone_control,Tr,1);
 }
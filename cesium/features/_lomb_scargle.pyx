@@ -1,6 +1,14 @@
 from _lomb_scargle cimport lomb_scargle as _lomb_scargle
+from _lomb_scargle cimport (lomb_scargle_candidates as
+                            _lomb_scargle_candidates)
+from _lomb_scargle cimport lomb_scargle_psd as _lomb_scargle_psd
+from _lomb_scargle cimport (lomb_scargle_psd_float as
+                            _lomb_scargle_psd_float)
 
+cimport cython
+from cython cimport floating
 cimport numpy as cnp
+from cython.parallel cimport prange
 import numpy as np
 
 def lomb_scargle(int numt, int numf, int nharm, int detrend_order,
@@ -19,11 +27,139 @@ def lomb_scargle(int numt, int numf, int nharm, int detrend_order,
 
     assert wth.dtype == np.double
 
-    _lomb_scargle(numt, numf, nharm, detrend_order, &psd[0], &cn[0],
-                  <double*>(wth.data), &sinx[0], &cosx[0], &sinx_step[0],
-                  &cosx_step[0], &sinx_back[0], &cosx_back[0],
-                  &sinx_smallstep[0], &cosx_smallstep[0], &hat_matr[0, 0],
-                  &hat_hat[0, 0], &hat0[0, 0],
-                  &soln[0], chi0, freq_zoom, psdmin, tone_control,
-                  <double*>(lambda0.data), &lambda0_range[0],
-                  <double*>(Tr.data), <int*>(ifreq.data))
+    cdef double *wth_data = <double*>(wth.data)
+    cdef double *lambda0_data = <double*>(lambda0.data)
+    cdef double *Tr_data = <double*>(Tr.data)
+    cdef int *ifreq_data = <int*>(ifreq.data)
+    cdef int status
+
+    # The frequency scan, zoom and regularized multi-harmonic refinement only
+    # touch the buffers above, so other threads may run in the meantime
+    with nogil:
+        status = _lomb_scargle(numt, numf, nharm, detrend_order, &psd[0],
+                               &cn[0], wth_data, &sinx[0], &cosx[0],
+                               &sinx_step[0], &cosx_step[0], &sinx_back[0],
+                               &cosx_back[0], &sinx_smallstep[0],
+                               &cosx_smallstep[0], &hat_matr[0, 0],
+                               &hat_hat[0, 0], &hat0[0, 0], &soln[0], chi0,
+                               freq_zoom, psdmin, tone_control, lambda0_data,
+                               &lambda0_range[0], Tr_data, ifreq_data)
+    if status != 0:
+        raise MemoryError()
+
+
+def lomb_scargle_candidates(int numt, int nharm, int detrend_order,
+                            double[:] freqs, double[:] psd, double[:] cn,
+                            cnp.ndarray wth, double[:] tt,
+                            double[:] sinx_back, double[:] cosx_back,
+                            double[:] sinx_smallstep,
+                            double[:] cosx_smallstep, double[:, :] hat_matr,
+                            double[:, :] hat_hat, double[:, :] hat0,
+                            double[:] soln, double chi0, double freq_zoom,
+                            double psdmin, double tone_control,
+                            cnp.ndarray[dtype=double, ndim=0] lambda0,
+                            double[:] lambda0_range,
+                            cnp.ndarray[dtype=double, ndim=0] Tr,
+                            cnp.ndarray[dtype=cnp.int32_t, ndim=0] ifreq):
+    """Run the zoom and multi-harmonic refinement of `lomb_scargle` only at
+    the (grid) frequencies `freqs`, e.g. the peaks of an approximate
+    periodogram; `psd` receives one value per candidate frequency.
+    """
+    assert wth.dtype == np.double
+
+    cdef int ncand = freqs.shape[0]
+    cdef double *wth_data = <double*>(wth.data)
+    cdef double *lambda0_data = <double*>(lambda0.data)
+    cdef double *Tr_data = <double*>(Tr.data)
+    cdef int *ifreq_data = <int*>(ifreq.data)
+    cdef int status
+
+    with nogil:
+        status = _lomb_scargle_candidates(
+            numt, ncand, nharm, detrend_order, &freqs[0], &psd[0], &cn[0],
+            wth_data, &tt[0], &sinx_back[0], &cosx_back[0],
+            &sinx_smallstep[0], &cosx_smallstep[0], &hat_matr[0, 0],
+            &hat_hat[0, 0], &hat0[0, 0], &soln[0], chi0, freq_zoom, psdmin,
+            tone_control, lambda0_data, &lambda0_range[0], Tr_data,
+            ifreq_data)
+    if status != 0:
+        raise MemoryError()
+
+
+def lomb_scargle_psd(int numt, int numf, int detrend_order, double[:] psd,
+                     floating[:] cn, cnp.ndarray wth, floating[:] sinx,
+                     floating[:] cosx, floating[:] sinx_step,
+                     floating[:] cosx_step):
+    """Evaluate only the single-harmonic periodogram of the `lomb_scargle`
+    scan at `numf` frequencies, starting at the frequency of `sinx`/`cosx`
+    (which are modified) and advancing by the steps `sinx_step`/`cosx_step`.
+
+    All arrays except `psd` are either double or single precision; in single
+    precision, the sums over the times are accumulated in double precision
+    from vectorized float partial sums of at most 32 terms.
+    """
+    if floating is float:
+        assert wth.dtype == np.float32
+    else:
+        assert wth.dtype == np.double
+
+    cdef floating *wth_data = <floating*>(wth.data)
+
+    with nogil:
+        if floating is float:
+            _lomb_scargle_psd_float(numt, numf, detrend_order, &psd[0],
+                                    &cn[0], wth_data, &sinx[0], &cosx[0],
+                                    &sinx_step[0], &cosx_step[0])
+        else:
+            _lomb_scargle_psd(numt, numf, detrend_order, &psd[0], &cn[0],
+                              wth_data, &sinx[0], &cosx[0], &sinx_step[0],
+                              &cosx_step[0])
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def lomb_scargle_batch(int[::1] numt, int[::1] numf,
+                       cnp.int64_t[::1] t_offsets, cnp.int64_t[::1] f_offsets,
+                       int nharm, int detrend_order,
+                       double[::1] psd, double[::1] cn, double[::1] wth,
+                       double[::1] sinx, double[::1] cosx,
+                       double[::1] sinx_step, double[::1] cosx_step,
+                       double[::1] sinx_back, double[::1] cosx_back,
+                       double[::1] sinx_smallstep,
+                       double[::1] cosx_smallstep, double[::1] hat_matr,
+                       double[:, :, ::1] hat_hat, double[:, :, ::1] hat0,
+                       double[:, ::1] soln, double[::1] chi0,
+                       double freq_zoom, double[::1] psdmin,
+                       double tone_control, double[::1] lambda0,
+                       double[:, ::1] lambda0_range, double[::1] Tr,
+                       int[::1] ifreq, int n_jobs=1):
+    """Run the Lomb-Scargle frequency scan for many series at once.
+
+    Per-series inputs are concatenated along their time (or frequency) axis
+    and located via `t_offsets`/`f_offsets`; `wth` and `hat_matr` are
+    concatenated blocks of shape (detrend_order + 1, numt[i]) and
+    (2 * nharm, numt[i]), respectively. Series are distributed over `n_jobs`
+    threads with the GIL released.
+    """
+    cdef Py_ssize_t i
+    cdef Py_ssize_t nseries = numt.shape[0]
+    cdef int dord1 = detrend_order + 1, npar = 2 * nharm
+    cdef int n_failed = 0
+
+    for i in prange(nseries, nogil=True, schedule='dynamic',
+                    num_threads=n_jobs):
+        # (Reduction) number of series whose scratch buffers could not be
+        # allocated
+        n_failed += _lomb_scargle(
+            numt[i], numf[i], nharm, detrend_order, &psd[f_offsets[i]],
+            &cn[t_offsets[i]], &wth[dord1 * t_offsets[i]],
+            &sinx[t_offsets[i]], &cosx[t_offsets[i]],
+            &sinx_step[t_offsets[i]], &cosx_step[t_offsets[i]],
+            &sinx_back[t_offsets[i]], &cosx_back[t_offsets[i]],
+            &sinx_smallstep[t_offsets[i]], &cosx_smallstep[t_offsets[i]],
+            &hat_matr[npar * t_offsets[i]], &hat_hat[i, 0, 0],
+            &hat0[i, 0, 0], &soln[i, 0], chi0[i], freq_zoom, psdmin[i],
+            tone_control, &lambda0[i], &lambda0_range[i, 0], &Tr[i],
+            &ifreq[i]) != 0
+    if n_failed:
+        raise MemoryError()
@@ -0,0 +1,122 @@
+"""Symmetric positive definite tridiagonal systems for `qso_model`.
+
+Matrices are stored in upper banded form (cf. `scipy.linalg.cholesky_banded`):
+``ab[0, 1:]`` is the superdiagonal and ``ab[1, :]`` the diagonal.
+"""
+cimport cython
+from libc.math cimport log, sqrt
+import numpy as np
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef double _tridiag_cholesky(int n, const double[:, :] ab,
+                              const double[:, :] rhs, double[:, :] chol,
+                              double[:, :] x, double[:, :] inv_diag,
+                              int start) nogil:
+    """Cholesky factorization, solution of each right-hand side, inverse
+    diagonal/superdiagonal and log-determinant of the system in columns
+    `start:start + n`; returns the log-determinant.
+    """
+    cdef int i, j, k
+    cdef double logdet = 0.
+
+    # Factorization A = U^T U, with U upper bidiagonal
+    chol[0, start] = 0.
+    chol[1, start] = sqrt(ab[1, start])
+    logdet += log(chol[1, start])
+    for j in range(1, n):
+        k = start + j
+        chol[0, k] = ab[0, k] / chol[1, k - 1]
+        chol[1, k] = sqrt(ab[1, k] - chol[0, k] * chol[0, k])
+        logdet += log(chol[1, k])
+
+    # Forward (U^T y = b) and back (U x = y) substitution
+    for i in range(rhs.shape[0]):
+        x[i, start] = rhs[i, start] / chol[1, start]
+        for j in range(1, n):
+            k = start + j
+            x[i, k] = (rhs[i, k] - chol[0, k] * x[i, k - 1]) / chol[1, k]
+        x[i, start + n - 1] /= chol[1, start + n - 1]
+        for j in range(n - 2, -1, -1):
+            k = start + j
+            x[i, k] = (x[i, k] - chol[0, k + 1] * x[i, k + 1]) / chol[1, k]
+
+    # Diagonal and superdiagonal of A^-1 (cf. `qso_model.chol_inverse_diag`)
+    k = start + n - 1
+    inv_diag[1, k] = 1. / chol[1, k]**2
+    inv_diag[0, k] = (-chol[0, k] * inv_diag[1, k] / chol[1, k - 1]
+                      if n > 1 else 0.)
+    for j in range(n - 2, -1, -1):
+        k = start + j
+        inv_diag[1, k] = ((1. / chol[1, k] - chol[0, k + 1] * inv_diag[0, k + 1])
+                          / chol[1, k])
+        inv_diag[0, k] = (-chol[0, k] * inv_diag[1, k] / chol[1, k - 1]
+                          if j > 0 else 0.)
+
+    return 2. * logdet
+
+
+def tridiag_cholesky(ab, rhs=None):
+    """Factor a symmetric positive definite tridiagonal matrix and use the
+    factorization in the same pass to solve linear systems and compute the
+    log-determinant and the tridiagonal part of the inverse.
+
+    Parameters
+    ----------
+    ab : (2, n) array
+        Matrix in upper banded form.
+    rhs : (k, n) array, optional
+        Right-hand sides.
+
+    Returns
+    -------
+    chol : (2, n) array
+        Cholesky factor in upper banded form (cf. `cholesky_banded`).
+    x : (k, n) array
+        Solutions of the linear systems.
+    logdet : float
+        Log-determinant of the matrix.
+    inv_diag : (2, n) array
+        Diagonal and superdiagonal of the inverse matrix, in upper banded
+        form.
+    """
+    n = ab.shape[1]
+    offsets = np.array([0, n])
+    chol, x, logdet, inv_diag = tridiag_cholesky_batch(ab, rhs, offsets)
+    return chol, x, logdet[0], inv_diag
+
+
+def tridiag_cholesky_batch(ab, rhs, offsets):
+    """`tridiag_cholesky` for many independent tridiagonal systems at once.
+
+    The systems are concatenated along the second axis of `ab` and `rhs`;
+    system `i` occupies columns `offsets[i]:offsets[i + 1]`. Returns the
+    concatenated outputs of `tridiag_cholesky`, with one log-determinant per
+    system. The computation runs without the GIL.
+    """
+    cdef const double[:, :] ab_view = np.ascontiguousarray(ab,
+                                                          dtype='float64')
+    total = ab_view.shape[1]
+    if rhs is None:
+        rhs = np.zeros((0, total))
+    cdef const double[:, :] rhs_view = np.ascontiguousarray(
+        np.atleast_2d(rhs), dtype='float64')
+    cdef long[:] offsets_view = np.asarray(offsets, dtype='int_')
+    chol = np.empty((2, total))
+    x = np.empty((rhs_view.shape[0], total))
+    inv_diag = np.empty((2, total))
+    logdet = np.empty(len(offsets_view) - 1)
+    cdef double[:, :] chol_view = chol, x_view = x, inv_view = inv_diag
+    cdef double[:] logdet_view = logdet
+    cdef int i, n
+
+    with nogil:
+        for i in range(offsets_view.shape[0] - 1):
+            n = offsets_view[i + 1] - offsets_view[i]
+            if n > 0:
+                logdet_view[i] = _tridiag_cholesky(n, ab_view, rhs_view,
+                                                   chol_view, x_view,
+                                                   inv_view, offsets_view[i])
+    return chol, x, logdet, inv_diag
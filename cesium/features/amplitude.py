@@ -1,11 +1,38 @@
 import numpy as np
 
 
+# Flux percentiles needed by the features in `dask_feature_graph`: the
+# extrema, the median, 5/95 and the central 20/35/50/65/80% ranges
+FLUX_PERCENTILES = (0., 5., 10., 17.5, 25., 32.5, 40., 50., 60., 67.5, 75.,
+                    82.5, 90., 95., 100.)
+
+
 def amplitude(x):
     """Half the difference between the maximum and minimum magnitude."""
     return (np.max(x) - np.min(x)) / 2.0
 
 
+def flux_quantiles(x, percentiles=FLUX_PERCENTILES, base=10., exponent=-0.4):
+    """Percentiles of the linear-scale values of log-scaled data.
+
+    The data is converted to linear scale once and all percentiles are
+    computed with a single (partial) sort, so that the flux percentile
+    features can share the result.
+
+    Assumes data is log-scaled; by default we assume inputs are scaled as
+    x=10^(-0.4*y), corresponding to units of magnitudes.
+
+    Returns
+    -------
+    dict
+        Dictionary mapping each of `percentiles` to the corresponding
+        percentile of the linear-scale data.
+    """
+    linear_scale_data = base ** (exponent * x)
+    return dict(zip(percentiles, np.percentile(linear_scale_data,
+                                               percentiles)))
+
+
 # TODO old comment did not match code; is this the quantity we want to compute?
 def percent_amplitude(x, base=10., exponent=-0.4):
     """Returns the largest distance from the median value, measured
@@ -15,10 +42,19 @@ def percent_amplitude(x, base=10., exponent=-0.4):
     x=10^(-0.4*y), corresponding to units of magnitudes. Computations are
     performed on the corresponding linear-scale values.
     """
-    linear_scale_data = base ** (exponent * x)
-    y_max = np.max(linear_scale_data)
-    y_min = np.min(linear_scale_data)
-    y_med = np.median(linear_scale_data)
+    return get_percent_amplitude(flux_quantiles(x, [0, 50, 100], base,
+                                                exponent))
+
+
+def get_percent_amplitude(flux_quantiles):
+    """Returns the largest distance from the median value, measured
+    as a percentage of the median.
+
+    Computed from the output of `flux_quantiles`.
+    """
+    y_max = flux_quantiles[100]
+    y_min = flux_quantiles[0]
+    y_med = flux_quantiles[50]
     return max(abs((y_max - y_med) / y_med), abs((y_med - y_min) / y_med))
 
 
@@ -32,8 +68,17 @@ def percent_difference_flux_percentile(x, base=10., exponent=-0.4):
     x=10^(-0.4*y), corresponding to units of magnitudes. Computations are
     performed on the corresponding linear-scale values.
     """
-    linear_scale_data = base ** (exponent * x)
-    y_95, y_50, y_5 = np.percentile(linear_scale_data, [95, 50, 5])
+    return get_percent_difference_flux_percentile(
+        flux_quantiles(x, [95, 50, 5], base, exponent))
+
+
+def get_percent_difference_flux_percentile(flux_quantiles):
+    """Difference between the 95th and 5th percentiles of the data, expressed
+    as a percentage of the median value.
+
+    Computed from the output of `flux_quantiles`.
+    """
+    y_95, y_50, y_5 = flux_quantiles[95], flux_quantiles[50], flux_quantiles[5]
     return (y_95 - y_5) / y_50
 
 
@@ -45,7 +90,18 @@ def flux_percentile_ratio(x, percentile_range, base=10., exponent=-0.4):
     x=10^(-0.4*y), corresponding to units of magnitudes. Computations are
     performed on the corresponding linear-scale values.
     """
-    linear_scale_data = base ** (exponent * x)
-    y_high, y_low, y_95, y_5 = np.percentile(linear_scale_data,
-            [50 + percentile_range / 2., 50 - percentile_range / 2., 95, 5])
-    return (y_high - y_low) / (y_95 - y_5)
+    return get_flux_percentile_ratio(
+        flux_quantiles(x, [50 + percentile_range / 2.,
+                           50 - percentile_range / 2., 95, 5], base, exponent),
+        percentile_range)
+
+
+def get_flux_percentile_ratio(flux_quantiles, percentile_range):
+    """A ratio of ((50+x) flux percentile - (50-x) flux percentile) /
+    (95 flux percentile - 5 flux percentile), where x = percentile_range/2.
+
+    Computed from the output of `flux_quantiles`.
+    """
+    y_high = flux_quantiles[50 + percentile_range / 2.]
+    y_low = flux_quantiles[50 - percentile_range / 2.]
+    return (y_high - y_low) / (flux_quantiles[95] - flux_quantiles[5])
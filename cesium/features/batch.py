@@ -0,0 +1,345 @@
+"""Vectorized versions of the cheap General and Cadence/Error features.
+
+Collections of time series are packed into NaN-padded 2-D arrays (one row per
+series, see `pack_rows`) and each feature is computed for the whole batch with
+a handful of NumPy reductions along axis 1, rather than by one dask task per
+series and feature. The features are organized as a dask graph,
+`batch_feature_graph`, analogous to `graphs.dask_feature_graph`; all inputs
+are assumed to be finite, since NaN marks padding.
+
+Single-precision (float32) inputs are packed and processed in single
+precision, which halves the memory traffic of these memory-bound
+reductions; sums over the values of each row (means, moments, weighted
+averages) are nevertheless accumulated in double precision.
+"""
+import numpy as np
+
+from .graphs import (CADENCE_FEATS, GENERAL_FEATS, compile_feature_plan,
+                     dask_feature_graph, execute_feature_plan)
+
+
+__all__ = ['BATCH_FEATS', 'batch_feature_graph', 'pack_rows',
+           'generate_batch_features']
+
+
+def pack_rows(arrays, dtype='float64'):
+    """Pack a list of 1-d arrays into a 2-d array, padding with NaN."""
+    lengths = [len(x) for x in arrays]
+    out = np.full((len(arrays), max(lengths, default=0)), np.nan, dtype=dtype)
+    for row, x, n in zip(out, arrays, lengths):
+        row[:n] = x
+    return out
+
+
+def count(x):
+    """Number of (non-padding) values in each row."""
+    return np.sum(~np.isnan(x), axis=1)
+
+
+def sort_rows(x):
+    """Sort each row; padding values end up at the end of each row."""
+    return np.sort(x, axis=1)
+
+
+def sorted_percentile(x_sorted, q):
+    """Percentiles `q` of each row of a sorted (padded) 2-d array, with the
+    same linear interpolation as `np.percentile`. For array_like `q`, returns
+    an array of shape (len(q), n_rows).
+    """
+    n = count(x_sorted)
+    rows = np.arange(len(x_sorted))
+    index = np.multiply.outer(np.asarray(q, dtype='float64') / 100., n - 1)
+    below = np.floor(index).astype(int)
+    above = np.minimum(below + 1, np.maximum(n - 1, 0))
+    weights_above = index - below
+    return (x_sorted[rows, below] * (1. - weights_above)
+            + x_sorted[rows, above] * weights_above)
+
+
+def nanmedian_rows(x):
+    """Median of each row, ignoring padding."""
+    return sorted_percentile(sort_rows(x), 50.)
+
+
+def diff_rows(x):
+    """Differences between consecutive values in each row."""
+    return np.diff(x, axis=1)
+
+
+def flux(x, base=10., exponent=-0.4):
+    """Linear-scale values for log-scaled data; see `amplitude.py`."""
+    return base ** (exponent * x)
+
+
+def amplitude(x):
+    """Half the difference between the maximum and minimum magnitude."""
+    return (np.nanmax(x, axis=1) - np.nanmin(x, axis=1)) / 2.0
+
+
+def percent_amplitude(flux, flux_sorted):
+    """Largest distance from the median flux as a fraction of the median; see
+    `amplitude.percent_amplitude`.
+    """
+    y_max = np.nanmax(flux, axis=1)
+    y_min = np.nanmin(flux, axis=1)
+    y_med = sorted_percentile(flux_sorted, 50.)
+    return np.maximum(abs((y_max - y_med) / y_med),
+                      abs((y_med - y_min) / y_med))
+
+
+def percent_difference_flux_percentile(flux_sorted):
+    """Difference between the 95th and 5th flux percentiles as a fraction of
+    the median; see `amplitude.percent_difference_flux_percentile`.
+    """
+    y_95, y_50, y_5 = sorted_percentile(flux_sorted, [95, 50, 5])
+    return (y_95 - y_5) / y_50
+
+
+def flux_percentile_ratio(flux_sorted, percentile_range):
+    """Ratio of the central `percentile_range` and 5-95 flux percentile
+    ranges; see `amplitude.flux_percentile_ratio`.
+    """
+    y_high, y_low, y_95, y_5 = sorted_percentile(flux_sorted,
+            [50 + percentile_range / 2., 50 - percentile_range / 2., 95, 5])
+    return (y_high - y_low) / (y_95 - y_5)
+
+
+def max_slope(t, x):
+    """Largest rate of change in the observed data."""
+    slopes = np.diff(x, axis=1) / np.diff(t, axis=1)
+    return np.nanmax(np.abs(slopes), axis=1)
+
+
+def median_absolute_deviation(x, x_med):
+    """Median absolute deviation (from the median) of the observed values."""
+    return nanmedian_rows(np.abs(x - x_med[:, np.newaxis]))
+
+
+def weighted_average(x, e):
+    """Mean of observed values, weighted by measurement errors."""
+    w = 1. / e**2
+    return (np.nansum(x * w, axis=1, dtype='float64')
+            / np.nansum(w, axis=1, dtype='float64'))
+
+
+def percent_beyond_1_std(x, e, x_avg):
+    """Percentage of values more than 1 std. dev. from the weighted average."""
+    w = 1. / e**2
+    dists_from_mu = x - x_avg[:, np.newaxis]
+    std = np.sqrt(np.nansum(dists_from_mu**2 * w, axis=1, dtype='float64')
+                  / np.nansum(w, axis=1, dtype='float64'))
+    with np.errstate(invalid='ignore'):
+        beyond = np.abs(dists_from_mu) > std[:, np.newaxis]
+    return beyond.sum(axis=1) / count(x)
+
+
+def percent_close_to_median(x, x_med, window_frac=0.1):
+    """Percentage of values within window_frac*(max(x)-min(x)) of median."""
+    window = (np.nanmax(x, axis=1) - np.nanmin(x, axis=1)) * window_frac
+    with np.errstate(invalid='ignore'):
+        close = np.abs(x - x_med[:, np.newaxis]) < window[:, np.newaxis]
+    return close.sum(axis=1) / count(x)
+
+
+def skew(x):
+    """Skewness of each row (cf. `scipy.stats.skew`)."""
+    dev = x - nanmean_rows(x)[:, np.newaxis]
+    m2 = nanmean_rows(dev**2)
+    m3 = nanmean_rows(dev**3)
+    zero = (m2 == 0)
+    return np.where(zero, 0., m3 / np.where(zero, 1., m2)**1.5)
+
+
+def stetson_mean(x, weight=100., alpha=2., beta=2., tol=1.e-6, nmax=20):
+    """Iteratively weighted mean of each row; see `stetson.stetson_mean`.
+
+    All rows are iterated simultaneously; rows that have converged are
+    dropped from subsequent iterations.
+    """
+    mu = nanmedian_rows(x)
+    active = np.arange(len(x))
+    for i in range(nmax):
+        if len(active) == 0:
+            break
+        x_active = x[active]
+        resid = x_active - mu[active, np.newaxis]
+        resid_err = np.abs(resid) * np.sqrt(weight)
+        weight1 = weight / (1. + (resid_err / alpha)**beta)
+        weight1 /= nanmean_rows(weight1)[:, np.newaxis]
+        diff = nanmean_rows(x_active * weight1) - mu[active]
+        mu[active] += diff
+        converged = ((np.abs(diff) < tol * np.abs(mu[active]))
+                     | (np.abs(diff) < tol))
+        active = active[~converged]
+    return mu
+
+
+def _stetson_deltas(x, x0, dx):
+    n = count(x)
+    return (np.sqrt(n / (n - 1.))[:, np.newaxis] * (x - x0[:, np.newaxis])
+            / dx)
+
+
+def stetson_j(x, x0, dx=0.1):
+    """Robust variance statistic of each row; see `stetson.stetson_j`."""
+    p_k = _stetson_deltas(x, x0, dx)**2 - 1.
+    return nanmean_rows(np.sign(p_k) * np.sqrt(np.abs(p_k)))
+
+
+def stetson_k(x, x0, dx=0.1):
+    """Robust kurtosis statistic of each row; see `stetson.stetson_k`."""
+    delta_x = _stetson_deltas(x, x0, dx)
+    return (1. / 0.798 * nanmean_rows(np.abs(delta_x))
+            / np.sqrt(nanmean_rows(delta_x**2)))
+
+
+def cad_prob(cads, time):
+    """Percentile rank (cf. `scipy.stats.percentileofscore`) of `time`
+    minutes within the observed time lags of each row.
+    """
+    score = float(time) / (24.0 * 60.0)
+    with np.errstate(invalid='ignore'):
+        left = np.sum(cads < score, axis=1)
+        right = np.sum(cads <= score, axis=1)
+    return (right + left + (right > left)) * 50.0 / count(cads) / 100.0
+
+
+def double_to_single_step(cads):
+    """Ratios (t[i+2] - t[i]) / (t[i+1] - t[i]) for each row."""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (cads[:, 2:] + cads[:, :-2]) / (cads[:, 1:-1] - cads[:, :-2])
+
+
+def nanmean_rows(x):
+    """Mean of each row, ignoring padding (accumulated in double precision)."""
+    return np.nanmean(x, axis=1, dtype='float64')
+
+
+def nanstd_rows(x):
+    """Standard deviation of each row, ignoring padding (accumulated in double
+    precision).
+    """
+    return np.nanstd(x, axis=1, dtype='float64')
+
+
+def nanmax_rows(x):
+    """Maximum of each row, ignoring padding."""
+    return np.nanmax(x, axis=1)
+
+
+def nanmin_rows(x):
+    """Minimum of each row, ignoring padding."""
+    return np.nanmin(x, axis=1)
+
+
+def total_time(t):
+    """Time elapsed between the first and last observation of each row."""
+    return np.nanmax(t, axis=1) - np.nanmin(t, axis=1)
+
+
+batch_feature_graph = {
+    # Shared intermediate values
+    '_m_sorted': (sort_rows, 'm'),
+    '_m_median': (sorted_percentile, '_m_sorted', 50.),
+    '_m_weighted_average': (weighted_average, 'm', 'e'),
+    '_flux': (flux, 'm'),
+    '_flux_sorted': (sort_rows, '_flux'),
+    '_m_stetson_mean': (stetson_mean, 'm', 1. / 0.1**2),
+
+    'n_epochs': (count, 't'),
+    'avg_err': (nanmean_rows, 'e'),
+    'med_err': (nanmedian_rows, 'e'),
+    'std_err': (nanstd_rows, 'e'),
+    'total_time': (total_time, 't'),
+    'avgt': (nanmean_rows, 't'),
+    'cads': (diff_rows, 't'),
+    'cads_std': (nanstd_rows, 'cads'),
+    'mean': (nanmean_rows, 'm'),
+    'cads_avg': (nanmean_rows, 'cads'),
+    'cads_med': (nanmedian_rows, 'cads'),
+    'double_to_single_step': (double_to_single_step, 'cads'),
+    'avg_double_to_single_step': (nanmean_rows, 'double_to_single_step'),
+    'med_double_to_single_step': (nanmedian_rows, 'double_to_single_step'),
+    'std_double_to_single_step': (nanstd_rows, 'double_to_single_step'),
+
+    'amplitude': (amplitude, 'm'),
+    'maximum': (nanmax_rows, 'm'),
+    'max_slope': (max_slope, 't', 'm'),
+    'median': (sorted_percentile, '_m_sorted', 50.),
+    'median_absolute_deviation': (median_absolute_deviation, 'm',
+                                  '_m_median'),
+    'minimum': (nanmin_rows, 'm'),
+    'percent_amplitude': (percent_amplitude, '_flux', '_flux_sorted'),
+    'percent_beyond_1_std': (percent_beyond_1_std, 'm', 'e',
+                             '_m_weighted_average'),
+    'percent_close_to_median': (percent_close_to_median, 'm', '_m_median'),
+    'percent_difference_flux_percentile': (
+        percent_difference_flux_percentile, '_flux_sorted'),
+    'skew': (skew, 'm'),
+    'std': (nanstd_rows, 'm'),
+    'stetson_j': (stetson_j, 'm', '_m_stetson_mean'),
+    'stetson_k': (stetson_k, 'm', '_m_stetson_mean'),
+    'weighted_average': (weighted_average, 'm', 'e'),
+}
+# Parametrized features: same arguments as in the single-series graph
+for feature, task in dask_feature_graph.items():
+    if feature.startswith('cad_probs_'):
+        batch_feature_graph[feature] = (cad_prob, 'cads', task[2])
+    elif feature.startswith('flux_percentile_ratio_mid'):
+        batch_feature_graph[feature] = (flux_percentile_ratio, '_flux_sorted',
+                                        task[2])
+
+BATCH_FEATS = [feature for feature in CADENCE_FEATS + GENERAL_FEATS
+               if feature in batch_feature_graph]
+
+
+def generate_batch_features(t, m, e, features_to_use, dtype=None,
+                            raise_exceptions=True):
+    """Compute features for a batch of time series.
+
+    Parameters
+    ----------
+    t, m, e : list of array_like or 2-d array
+        Time, measurement and error values of each time series; lists of
+        arrays are packed into NaN-padded 2-d arrays with `pack_rows`.
+    features_to_use : list of str
+        Feature names; must be in `BATCH_FEATS`.
+    dtype : str, optional
+        Floating point type in which the values are packed and processed:
+        'float64' or 'float32'. Defaults to 'float32' if all values are single
+        precision (e.g., taken from `TimeSeries` created with
+        `dtype='float32'`), and 'float64' otherwise.
+    raise_exceptions : bool, optional
+        If True, exceptions during feature computation are raised immediately;
+        if False, the exception is returned as the value of the failed
+        feature (and of any features that depend on it). Defaults to True.
+
+    Returns
+    -------
+    dict
+        Dictionary with feature names as keys and arrays of feature values
+        (one per time series) as values.
+    """
+    if dtype is None:
+        dtype = ('float32' if all(_is_single(x) for x in (t, m, e))
+                 else 'float64')
+    inputs = {'t': _as_rows(t, dtype), 'm': _as_rows(m, dtype),
+              'e': _as_rows(e, dtype)}
+    graph = dict(batch_feature_graph, t=None, m=None, e=None)
+    plan = compile_feature_plan(graph, features_to_use)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        values = execute_feature_plan(plan, inputs, raise_exceptions)
+    return dict(zip(features_to_use, values))
+
+
+def _as_rows(x, dtype='float64'):
+    if isinstance(x, np.ndarray) and x.ndim == 2:
+        return x.astype(dtype)
+    return pack_rows(x, dtype)
+
+
+def _is_single(x):
+    """Whether a 2-d array or list of arrays is single precision."""
+    if isinstance(x, np.ndarray) and x.ndim == 2:
+        return x.dtype == np.float32
+    return all(np.asarray(x_i).dtype == np.float32 for x_i in x)
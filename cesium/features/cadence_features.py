@@ -2,8 +2,9 @@ import numpy as np
 import scipy.stats as stats
 
 
-__all__ = ['double_to_single_step', 'cad_prob', 'delta_t_hist',
-           'normalize_hist', 'find_sorted_peaks', 'peak_ratio', 'peak_bin']
+__all__ = ['CAD_PROB_TIMES', 'double_to_single_step', 'cad_prob', 'cad_probs',
+           'get_cad_prob', 'delta_t_hist', 'normalize_hist',
+           'find_sorted_peaks', 'peak_ratio', 'peak_bin']
 
 
 def double_to_single_step(cads):
@@ -12,6 +13,11 @@ def double_to_single_step(cads):
     return (cads[2:] + cads[:-2]) / (cads[1:-1] - cads[:-2])
 
 
+# Time lags (in minutes) of the `cad_probs_*` features in `dask_feature_graph`
+CAD_PROB_TIMES = (1, 10, 20, 30, 40, 50, 100, 500, 1000, 5000, 10000, 50000,
+                  100000, 500000, 1000000, 5000000, 10000000)
+
+
 def cad_prob(cads, time):
     """Given the observed distribution of time lags `cads`, compute the probability
     that the next observation occurs within `time` minutes of an arbitrary epoch.
@@ -19,16 +25,88 @@ def cad_prob(cads, time):
     return stats.percentileofscore(cads, float(time) / (24.0 * 60.0)) / 100.0
 
 
-def delta_t_hist(t, nbins=50, conv_oversample=50):
+def cad_probs(cads, times=CAD_PROB_TIMES):
+    """Compute `cad_prob` for several time lags at once.
+
+    `cads` is sorted once and the rank of each lag is found by binary search,
+    rather than rescanning `cads` for each lag as
+    `scipy.stats.percentileofscore` does (whose 'rank' definition is
+    reproduced exactly).
+
+    Returns
+    -------
+    dict
+        Dictionary mapping each of `times` to the corresponding probability.
+    """
+    cads_sorted = np.sort(cads)
+    n = len(cads_sorted)
+    scores = np.array([float(time) / (24.0 * 60.0) for time in times])
+    if n == 0:
+        return {time: 1.0 for time in times}
+    left = np.searchsorted(cads_sorted, scores, side='left')
+    right = np.searchsorted(cads_sorted, scores, side='right')
+    return {time: (r + l + (1 if r > l else 0)) * 50.0 / n / 100.0
+            for time, l, r in zip(times, left.tolist(), right.tolist())}
+
+
+def get_cad_prob(cad_probs, time):
+    """Given the observed distribution of time lags, the probability that the
+    next observation occurs within `time` minutes of an arbitrary epoch.
+
+    Computed from the output of `cad_probs`.
+    """
+    return cad_probs[time]
+
+
+def delta_t_hist(t, nbins=50, conv_oversample=50, method='auto'):
     """Build histogram of all possible |t_i - t_j|'s.
 
     For efficiency, we construct the histogram via a convolution of the PDF
     rather than by actually computing all the differences. For better accuracy
     we use a factor `conv_oversample` more bins when performing the convolution
     and then aggregate the result to have `nbins` total values.
+
+    Parameters
+    ----------
+    t : array_like
+        Array of times.
+    nbins : int, optional
+        Number of bins of the output histogram, which spans the range from 0 to
+        `max(t) - min(t)`. Defaults to 50.
+    conv_oversample : int, optional
+        Oversampling factor of the histogram of `t` that is convolved with
+        itself. Defaults to 50.
+    method : {'auto', 'direct', 'fft', 'exact'}, optional
+        How to compute the histogram:
+            - 'direct': direct convolution (`np.convolve`), which is
+              O(`(conv_oversample * nbins)**2`)
+            - 'fft': the same convolution by FFT, which is
+              O(`conv_oversample * nbins * log(conv_oversample * nbins)`);
+              the result is rounded to the (integer) exact convolution
+            - 'exact': histogram of all pairwise differences, which does not
+              depend on `conv_oversample` but is O(`len(t)**2`) in time and
+              memory, so is only suitable for short time series
+            - 'auto': 'fft', or 'direct' if there are at most 128
+              (oversampled) bins
+        Defaults to 'auto'.
     """
+    if method == 'exact':
+        t = np.asarray(t)
+        i, j = np.triu_indices(len(t), 1)
+        return np.histogram(np.abs(t[j] - t[i]), bins=nbins,
+                            range=(0, np.max(t) - np.min(t)))[0]
+
     f, x = np.histogram(t, bins=conv_oversample * nbins)
-    g = np.convolve(f, f[::-1])[len(f) - 1:]  # Discard negative domain
+    if method == 'auto':
+        method = 'fft' if len(f) > 128 else 'direct'
+    if method == 'fft':
+        # Autocorrelation via FFT, zero-padded to avoid wrap-around
+        power = np.abs(np.fft.rfft(f, 2 * len(f))) ** 2
+        g = np.rint(np.fft.irfft(power, 2 * len(f))[:len(f)]).astype(f.dtype)
+    elif method == 'direct':
+        g = np.convolve(f, f[::-1])[len(f) - 1:]  # Discard negative domain
+    else:
+        raise ValueError("Unknown method '{}'.".format(method))
     g[0] -= len(t)  # First bin is double-counted because of i=j terms
     hist = g.reshape((-1, conv_oversample)).sum(axis=1)  # Combine bins
     return hist
@@ -48,24 +126,51 @@ def find_sorted_peaks(x):
     (arbitrarily) choose the first index in the sequence of equal values as the
     peak.
     Returns a list of tuples (i, x[i]) of peak indices i and values x[i],
-    sorted in decreasing order by peak value.
+    sorted in decreasing order by peak value (and by increasing index for
+    equal values). For a 2-d array, each row is treated as a separate array
+    and a list of such lists is returned.
+
+    Plateaus of equal values are first compressed into runs, so that each run
+    can be compared with the values before and after it by vectorized
+    operations on the whole (batch of) array(s).
     """
-    peak_inds = []
-    nbins = len(x)
-    for i in range(nbins):
-        if i == 0 or x[i] > x[i - 1]:  # Increasing from left
-            if i == nbins - 1 or x[i] > x[i + 1]:  # Increasing from right
-                peak_inds.append(i)
-            elif x[i] == x[i + 1]:  # Tied; check the next non-equal value
-                for j in range(i + 1, nbins):
-                    if x[j] != x[i]:
-                        if x[j] < x[i]:
-                            peak_inds.append(i)
-                        break
-                if j == nbins - 1 and x[i] == x[j]:  # Reached the end
-                    peak_inds.append(i)
-    sorted_peak_inds = sorted(peak_inds, key=lambda i: x[i], reverse=True)
-    return list(zip(sorted_peak_inds, x[sorted_peak_inds]))
+    x = np.asarray(x)
+    values = x.ravel()
+    n = x.shape[-1] if x.size else 0
+    if n == 0:
+        return [[] for row in x] if x.ndim == 2 else []
+
+    # Compress runs of equal values (within each row); a run is then a peak
+    # if it is greater than the neighboring runs
+    run_start = np.empty(len(values), dtype=bool)
+    run_start[0] = True
+    np.not_equal(values[1:], values[:-1], out=run_start[1:])
+    if x.ndim == 2:
+        run_start[::n] = True
+    starts = np.flatnonzero(run_start)
+    run_values = values[starts]
+    first = np.empty(len(starts), dtype=bool)
+    last = np.empty(len(starts), dtype=bool)
+    first[0] = last[-1] = True
+    with np.errstate(invalid='ignore'):
+        np.greater(run_values[1:], run_values[:-1], out=first[1:])
+        np.greater(run_values[:-1], run_values[1:], out=last[:-1])
+    if x.ndim == 2:
+        row_start = (starts % n == 0)
+        first |= row_start
+        last[:-1] |= row_start[1:]
+    peak_inds = starts[first & last]
+
+    # Sort by decreasing value, then by increasing index
+    if x.ndim != 2:
+        peak_inds = peak_inds[np.argsort(-values[peak_inds], kind='mergesort')]
+        return list(zip(peak_inds.tolist(), values[peak_inds]))
+    peak_rows = peak_inds // n
+    order = np.lexsort((peak_inds, -values[peak_inds], peak_rows))
+    peak_inds, peak_rows = peak_inds[order], peak_rows[order]
+    bounds = np.searchsorted(peak_rows, np.arange(len(x) + 1))
+    return [list(zip((peak_inds[i:j] % n).tolist(), values[peak_inds[i:j]]))
+            for i, j in zip(bounds[:-1], bounds[1:])]
 
 
 def peak_ratio(peaks, i, j):
@@ -1,18 +1,21 @@
+from functools import partial
 import numpy as np
+from dask.core import get_dependencies, ishashable, istask, toposort
 
-from .cadence_features import (cad_prob, delta_t_hist, double_to_single_step,
-                               normalize_hist, find_sorted_peaks, peak_bin,
-                               peak_ratio)
+from .cadence_features import (cad_probs, get_cad_prob, delta_t_hist,
+                               double_to_single_step, normalize_hist,
+                               find_sorted_peaks, peak_bin, peak_ratio)
 
 from .common_functions import (maximum, median, max_slope,
                                median_absolute_deviation, minimum,
                                percent_beyond_1_std, percent_close_to_median,
                                skew, std, weighted_average)
-from .amplitude import (amplitude, percent_amplitude, flux_percentile_ratio,
-                        percent_difference_flux_percentile)
+from .amplitude import (amplitude, flux_quantiles, get_percent_amplitude,
+                        get_flux_percentile_ratio,
+                        get_percent_difference_flux_percentile)
 from .qso_model import (qso_fit, get_qso_log_chi2_qsonu,
                         get_qso_log_chi2nuNULL_chi2nu)
-from .stetson import (stetson_j, stetson_k)
+from .stetson import stetson_mean, get_stetson_j, get_stetson_k
 
 from .lomb_scargle import (lomb_scargle_model, get_lomb_frequency,
                            get_lomb_amplitude, get_lomb_rel_phase,
@@ -24,7 +27,9 @@ from .lomb_scargle_fast import lomb_scargle_fast_period
 from .num_alias import num_alias
 from .periodic_model import (periodic_model, get_max_delta_mags,
                              get_min_delta_mags, get_model_phi1_phi2)
-from .period_folding import (period_folding, get_fold2P_slope_percentile,
+from .period_folding import (period_folding, period_folded_fit,
+                             period_folded_slopes,
+                             get_fold2P_slope_percentile,
                              get_medperc90_2p_p, p2p_model,
                              get_p2p_scatter_2praw, get_p2p_scatter_over_mad,
                              get_p2p_scatter_pfold_over_mad,
@@ -33,7 +38,9 @@ from .scatter_res_raw import scatter_res_raw
 
 
 __all__ = ['CADENCE_FEATS', 'GENERAL_FEATS', 'LOMB_SCARGLE_FEATS',
-           'generate_dask_graph', 'feature_categories', 'dask_feature_graph']
+           'generate_dask_graph', 'feature_graph_options',
+           'compile_feature_plan', 'execute_feature_plan',
+           'feature_categories', 'dask_feature_graph']
 
 feature_categories = {
     'Cadence/Error': [
@@ -109,23 +116,24 @@ dask_feature_graph = {
     'mean': (np.mean, 'm'),
     'cads_avg': (np.mean, 'cads'),
     'cads_med': (np.median, 'cads'),
-    'cad_probs_1': (cad_prob, 'cads', 1),
-    'cad_probs_10': (cad_prob, 'cads', 10),
-    'cad_probs_20': (cad_prob, 'cads', 20),
-    'cad_probs_30': (cad_prob, 'cads', 30),
-    'cad_probs_40': (cad_prob, 'cads', 40),
-    'cad_probs_50': (cad_prob, 'cads', 50),
-    'cad_probs_100': (cad_prob, 'cads', 100),
-    'cad_probs_500': (cad_prob, 'cads', 500),
-    'cad_probs_1000': (cad_prob, 'cads', 1000),
-    'cad_probs_5000': (cad_prob, 'cads', 5000),
-    'cad_probs_10000': (cad_prob, 'cads', 10000),
-    'cad_probs_50000': (cad_prob, 'cads', 50000),
-    'cad_probs_100000': (cad_prob, 'cads', 100000),
-    'cad_probs_500000': (cad_prob, 'cads', 500000),
-    'cad_probs_1000000': (cad_prob, 'cads', 1000000),
-    'cad_probs_5000000': (cad_prob, 'cads', 5000000),
-    'cad_probs_10000000': (cad_prob, 'cads', 10000000),
+    '_cad_probs': (cad_probs, 'cads'),
+    'cad_probs_1': (get_cad_prob, '_cad_probs', 1),
+    'cad_probs_10': (get_cad_prob, '_cad_probs', 10),
+    'cad_probs_20': (get_cad_prob, '_cad_probs', 20),
+    'cad_probs_30': (get_cad_prob, '_cad_probs', 30),
+    'cad_probs_40': (get_cad_prob, '_cad_probs', 40),
+    'cad_probs_50': (get_cad_prob, '_cad_probs', 50),
+    'cad_probs_100': (get_cad_prob, '_cad_probs', 100),
+    'cad_probs_500': (get_cad_prob, '_cad_probs', 500),
+    'cad_probs_1000': (get_cad_prob, '_cad_probs', 1000),
+    'cad_probs_5000': (get_cad_prob, '_cad_probs', 5000),
+    'cad_probs_10000': (get_cad_prob, '_cad_probs', 10000),
+    'cad_probs_50000': (get_cad_prob, '_cad_probs', 50000),
+    'cad_probs_100000': (get_cad_prob, '_cad_probs', 100000),
+    'cad_probs_500000': (get_cad_prob, '_cad_probs', 500000),
+    'cad_probs_1000000': (get_cad_prob, '_cad_probs', 1000000),
+    'cad_probs_5000000': (get_cad_prob, '_cad_probs', 5000000),
+    'cad_probs_10000000': (get_cad_prob, '_cad_probs', 10000000),
     'double_to_single_step': (double_to_single_step, 'cads'),
     'avg_double_to_single_step': (np.mean, 'double_to_single_step'),
     'med_double_to_single_step': (np.median, 'double_to_single_step'),
@@ -148,25 +156,34 @@ dask_feature_graph = {
 
     # Standalone features (disconnected nodes)
     'amplitude': (amplitude, 'm'),
-    'flux_percentile_ratio_mid20': (flux_percentile_ratio, 'm', 20),
-    'flux_percentile_ratio_mid35': (flux_percentile_ratio, 'm', 35),
-    'flux_percentile_ratio_mid50': (flux_percentile_ratio, 'm', 50),
-    'flux_percentile_ratio_mid65': (flux_percentile_ratio, 'm', 65),
-    'flux_percentile_ratio_mid80': (flux_percentile_ratio, 'm', 80),
+    # All flux percentile features share one sort of the linear-scale data
+    '_flux_quantiles': (flux_quantiles, 'm'),
+    'flux_percentile_ratio_mid20': (get_flux_percentile_ratio,
+                                    '_flux_quantiles', 20),
+    'flux_percentile_ratio_mid35': (get_flux_percentile_ratio,
+                                    '_flux_quantiles', 35),
+    'flux_percentile_ratio_mid50': (get_flux_percentile_ratio,
+                                    '_flux_quantiles', 50),
+    'flux_percentile_ratio_mid65': (get_flux_percentile_ratio,
+                                    '_flux_quantiles', 65),
+    'flux_percentile_ratio_mid80': (get_flux_percentile_ratio,
+                                    '_flux_quantiles', 80),
     'maximum': (maximum, 'm'),
     'max_slope': (max_slope, 't', 'm'),
     'median': (median, 'm'),
     'median_absolute_deviation': (median_absolute_deviation, 'm'),
     'minimum': (minimum, 'm'),
-    'percent_amplitude': (percent_amplitude, 'm'),
+    'percent_amplitude': (get_percent_amplitude, '_flux_quantiles'),
     'percent_beyond_1_std': (percent_beyond_1_std, 'm', 'e'),
     'percent_close_to_median': (percent_close_to_median, 'm'),
     'percent_difference_flux_percentile': (
-        percent_difference_flux_percentile, 'm'),
+        get_percent_difference_flux_percentile, '_flux_quantiles'),
     'skew': (skew, 'm'),
     'std': (std, 'm'),
-    'stetson_j': (stetson_j, 'm'),
-    'stetson_k': (stetson_k, 'm'),
+    # Same weight as `stetson_j`/`stetson_k` with the default `dx`
+    '_stetson_mean': (stetson_mean, 'm', 1. / 0.1**2),
+    'stetson_j': (get_stetson_j, 'm', '_stetson_mean'),
+    'stetson_k': (get_stetson_k, 'm', '_stetson_mean'),
     'weighted_average': (weighted_average, 'm', 'e'),
 
     # QSO model features
@@ -178,7 +195,9 @@ dask_feature_graph = {
     # Fast Lomb-Scargle from Gatspy
     'period_fast': (lomb_scargle_fast_period, 't', 'm', 'e'),
 
-    '_lomb_model': (lomb_scargle_model, 't', 'm', 'e'),
+    # No feature uses the model uncertainties, so they are not computed
+    '_lomb_model': (partial(lomb_scargle_model, model_error=False),
+                    't', 'm', 'e'),
     # These could easily be programmatically generated, but this is more readable
     'freq1_freq': (get_lomb_frequency, '_lomb_model', 1),
     'freq2_freq': (get_lomb_frequency, '_lomb_model', 2),
@@ -224,15 +243,21 @@ dask_feature_graph = {
     'scatter_res_raw': (scatter_res_raw, 't', 'm', 'e', '_lomb_model'),
 
     '_periodic_model': (periodic_model, '_lomb_model'),
-    '_period_folded_model': (period_folding, 't', 'm', 'e', '_lomb_model'),
+    # The 2P fit is shared by the folded slopes, which only need the 2P fit,
+    # and the 2P residuals, which also need the residual frequencies
+    '_period_folded_fit': (period_folded_fit, 't', 'm', 'e', '_lomb_model'),
+    '_period_folded_model': (period_folding, 't', 'm', 'e', '_lomb_model',
+                             0.05, True, '_period_folded_fit'),
+    '_period_folded_slopes': (period_folded_slopes, 't', 'm', 'e',
+                              '_lomb_model', 0.05, '_period_folded_fit'),
 
     'freq_model_max_delta_mags': (get_max_delta_mags, '_periodic_model'),
     'freq_model_min_delta_mags': (get_min_delta_mags, '_periodic_model'),
     'freq_model_phi1_phi2': (get_model_phi1_phi2, '_periodic_model'),
     'fold2P_slope_10percentile': (get_fold2P_slope_percentile,
-                                  '_period_folded_model', 10),
+                                  '_period_folded_slopes', 10),
     'fold2P_slope_90percentile': (get_fold2P_slope_percentile,
-                                  '_period_folded_model', 90),
+                                  '_period_folded_slopes', 90),
     'medperc90_2p_p': (get_medperc90_2p_p, '_period_folded_model'),
 
     '_p2p_model': (p2p_model, 't', 'm', 'freq1_freq'),
@@ -249,6 +274,133 @@ def generate_dask_graph(t, m, e):
     return full_graph
 
 
+def feature_graph_options(periodic_model_engine='fmin',
+                          rescan_residual_freqs=True):
+    """Graph entries selecting alternative implementations of built-in
+    features.
+
+    The returned dictionary overrides the corresponding entries of
+    `dask_feature_graph` when passed as (part of) the `custom_functions` dask
+    graph of `featurize_time_series` (or `featurize_single_ts`, etc.); it is
+    empty for the default options.
+
+    Parameters
+    ----------
+    periodic_model_engine : {'fmin', 'analytic'}, optional
+        Engine used to locate the extrema of the Lomb-Scargle model for the
+        `freq_model_*` features (see `periodic_model`). Defaults to 'fmin'.
+    rescan_residual_freqs : bool, optional
+        Whether the residual frequencies of the model at twice the period for
+        `medperc90_2p_p` are searched for over the full frequency grid, or
+        the frequencies of the Lomb-Scargle model are reused, which is much
+        faster (see `period_folding`). Defaults to True.
+
+    Returns
+    -------
+    dict
+        dask graph entries to be passed as `custom_functions`.
+    """
+    options = {}
+    if periodic_model_engine not in ('fmin', 'analytic'):
+        raise ValueError("Unknown engine '{}'.".format(periodic_model_engine))
+    if periodic_model_engine != 'fmin':
+        options['_periodic_model'] = (partial(periodic_model,
+                                              engine=periodic_model_engine),
+                                      '_lomb_model')
+    if not rescan_residual_freqs:
+        options['_period_folded_model'] = (period_folding, 't', 'm', 'e',
+                                           '_lomb_model', 0.05, False,
+                                           '_period_folded_fit')
+    return options
+
+
+def compile_feature_plan(graph, features_to_use):
+    """Compile the tasks of a dask graph needed to compute `features_to_use`.
+
+    The transitive dependencies of `features_to_use` are collected and
+    topologically sorted once, so that the same plan can be executed for many
+    time series (see `execute_feature_plan`) without copying the graph or
+    invoking the dask scheduler for each of them.
+
+    Parameters
+    ----------
+    graph : dict
+        dask graph, e.g. the output of `generate_dask_graph`; the values of
+        non-task entries (such as 't', 'm' and 'e') are placeholders that
+        are supplied as inputs when the plan is executed.
+    features_to_use : list of str
+        Keys of `graph` to be computed.
+
+    Returns
+    -------
+    (list, list)
+        List of `(key, function, args)` tasks in execution order, where each
+        argument is a pair `(is_key, arg)`, and the list of features to
+        return.
+    """
+    needed = set()
+    stack = list(features_to_use)
+    while stack:
+        key = stack.pop()
+        if key not in needed:
+            needed.add(key)
+            stack.extend(get_dependencies(graph, key))
+    subgraph = {key: graph[key] for key in needed}
+
+    tasks = []
+    for key in toposort(subgraph):
+        task = subgraph[key]
+        if istask(task):
+            args = [(ishashable(arg) and arg in graph, arg) for arg in task[1:]]
+            tasks.append((key, task[0], args))
+    return tasks, list(features_to_use)
+
+
+def execute_feature_plan(plan, inputs, raise_exceptions=True):
+    """Execute a plan compiled by `compile_feature_plan`.
+
+    Parameters
+    ----------
+    plan : (list, list)
+        Output of `compile_feature_plan`.
+    inputs : dict
+        Values of the non-task entries of the graph, e.g. 't', 'm', 'e'.
+    raise_exceptions : bool, optional
+        If True, exceptions are raised immediately; if False, the exception
+        is stored as the value of the failed task (and passed on to any
+        dependent tasks), as with `dask.get(..., raise_exception=...)`.
+
+    Returns
+    -------
+    list
+        Values of the planned features.
+    """
+    tasks, features_to_use = plan
+    values = dict(inputs)
+    for key, func, args in tasks:
+        try:
+            values[key] = func(*[values[arg] if is_key else
+                                 _evaluate_arg(arg, values)
+                                 for is_key, arg in args])
+        except Exception as e:
+            if raise_exceptions:
+                raise
+            values[key] = e
+    return [values[feature] for feature in features_to_use]
+
+
+def _evaluate_arg(arg, values):
+    """Evaluate a (possibly nested) task argument as dask would."""
+    if istask(arg):
+        return arg[0](*[_evaluate_arg(a, values) for a in arg[1:]])
+    elif isinstance(arg, list):
+        return [_evaluate_arg(a, values) for a in arg]
+    elif ishashable(arg) and arg in values:
+        return values[arg]
+    else:
+        return arg
+
+
 extra_feature_docs = {
     'n_epochs': 'Total number of observed values.',
     'avg_err': 'Mean of the error estimates.',
@@ -286,6 +438,7 @@ feature_tags = {
     'mean': ['Astronomy', 'General'],
     'cads_avg': ['Astronomy', 'General', 'Cadence'],
     'cads_med': ['Astronomy', 'General', 'Cadence'],
+    '_cad_probs': ['Astronomy', 'General', 'Cadence'],
     'cad_probs_1': ['Astronomy', 'General', 'Cadence'],
     'cad_probs_10': ['Astronomy', 'General', 'Cadence'],
     'cad_probs_20': ['Astronomy', 'General', 'Cadence'],
@@ -325,6 +478,7 @@ feature_tags = {
 
     # Standalone features (disconnected nodes)
     'amplitude': ['Astronomy', 'General'],
+    '_flux_quantiles': ['Astronomy'],
     'flux_percentile_ratio_mid20': ['Astronomy'],
     'flux_percentile_ratio_mid35': ['Astronomy'],
     'flux_percentile_ratio_mid50': ['Astronomy'],
@@ -341,6 +495,7 @@ feature_tags = {
     'percent_difference_flux_percentile': ['Astronomy', 'General'],
     'skew': ['Astronomy', 'General'],
     'std': ['Astronomy', 'General'],
+    '_stetson_mean': ['Astronomy', 'General'],
     'stetson_j': ['Astronomy', 'General'],
     'stetson_k': ['Astronomy', 'General'],
     'weighted_average': ['Astronomy', 'General'],
@@ -399,7 +554,9 @@ feature_tags = {
     'scatter_res_raw': ['Astronomy', 'Periodic', 'Lomb-Scargle'],
 
     '_periodic_model': ['Astronomy', 'Periodic', 'Lomb-Scargle'],
+    '_period_folded_fit': ['Astronomy', 'Periodic', 'Lomb-Scargle'],
     '_period_folded_model': ['Astronomy', 'Periodic', 'Lomb-Scargle'],
+    '_period_folded_slopes': ['Astronomy', 'Periodic', 'Lomb-Scargle'],
 
     'freq_model_max_delta_mags': ['Astronomy', 'Periodic', 'Lomb-Scargle'],
     'freq_model_min_delta_mags': ['Astronomy', 'Periodic', 'Lomb-Scargle'],
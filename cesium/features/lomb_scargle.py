@@ -1,9 +1,29 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import partial
 import numpy as np
 import scipy.stats as stats
-from ._lomb_scargle import lomb_scargle
+from ._lomb_scargle import (lomb_scargle, lomb_scargle_batch,
+                            lomb_scargle_candidates, lomb_scargle_psd)
+from .lomb_scargle_fast import fast_periodogram, uniform_periodogram
 
 
-def lomb_scargle_model(time, signal, error, sys_err=0.05, nharm=8, nfreq=3, tone_control=5.0):
+# Approximate periodograms used to select candidate frequencies; each is called
+# as `periodogram(time, cn, wth, f0, df, numf)` (see `fast_periodogram`)
+PERIODOGRAM_BACKENDS = {'fft': fast_periodogram,
+                        'uniform': uniform_periodogram}
+
+# Maximum deviation of the times from an evenly spaced grid, relative to the
+# sampling interval, for the 'uniform' backend to be selected automatically
+UNIFORM_SAMPLING_TOL = 1e-6
+
+
+def lomb_scargle_model(time, signal, error, sys_err=0.05, nharm=8, nfreq=3, tone_control=5.0,
+                       backend='auto', n_candidates=50, model_error=True,
+                       fmax=33., oversampling=1.25, decimation=None,
+                       dtype=None):
     """Simultaneous fit of a sum of sinusoids by weighted least squares:
            y(t) = Sum_k Ck*t^k + Sum_i Sum_j A_ij sin(2*pi*j*fi*(t-t0)+phi_j),
            i=[1,nfreq], j=[1,nharm]
@@ -25,6 +45,32 @@ def lomb_scargle_model(time, signal, error, sys_err=0.05, nharm=8, nfreq=3, tone
     nfreq : int
         Number of frequencies to fit.
 
+    backend : str or callable, optional
+        Periodogram used to search the frequency grid; see `fit_lomb_scargle`.
+
+    n_candidates : int, optional
+        Number of periodogram peaks refined by non-'scan' backends.
+
+    model_error : bool, optional
+        Whether to compute the uncertainties 'model_error' and 'trend_error'
+        of each fit; see `fit_lomb_scargle`.
+
+    fmax : float, optional
+        Highest frequency searched.
+
+    oversampling : float, optional
+        Number of grid frequencies per 1 / (max(time) - min(time)).
+
+    decimation : int, optional
+        Decimation factor of the coarse grid of the 'coarse' backend; see
+        `fit_lomb_scargle`.
+
+    dtype : str, optional
+        Floating point type of the periodogram scan; see `fit_lomb_scargle`.
+        Defaults to 'float32' if `time`, `signal` and `error` are all single
+        precision, and 'float64' otherwise. The fit itself is always computed
+        in double precision.
+
     Returns
     -------
     dict
@@ -35,6 +81,11 @@ def lomb_scargle_model(time, signal, error, sys_err=0.05, nharm=8, nfreq=3, tone
 
     """
 
+    if dtype is None:
+        dtype = _scan_dtype(time, signal, error)
+    time, signal, error = [np.asarray(x, dtype='float64')
+                           for x in (time, signal, error)]
+
     dy0 = np.sqrt(error**2 + sys_err**2)
 
     wt = 1. / dy0**2
@@ -43,11 +94,7 @@ def lomb_scargle_model(time, signal, error, sys_err=0.05, nharm=8, nfreq=3, tone
 
     chi0 = np.dot(signal**2, wt)
 
-# TODO parametrize?
-    f0 = 1. / max(time)
-    df = 0.8 / max(time) # 20120202 :    0.1/Xmax
-    fmax = 33. #pre 20120126: 10. # 25
-    numf = int((fmax - f0) / df) # TODO !!! this is off by 1 point, fix?
+    f0, df, numf = _frequency_grid(time, fmax, oversampling)
 
     model_dict = {'freq_fits' : []}
     lambda0_range = [-np.log10(len(time)), 8] # these numbers "fix" the strange-amplitude effect
@@ -55,12 +102,16 @@ def lomb_scargle_model(time, signal, error, sys_err=0.05, nharm=8, nfreq=3, tone
         if i == 0:
             fit = fit_lomb_scargle(time, signal, dy0, f0, df, numf,
                     tone_control=tone_control, lambda0_range=lambda0_range,
-                    nharm=nharm, detrend_order=1)
+                    nharm=nharm, detrend_order=1, backend=backend,
+                    n_candidates=n_candidates, model_error=model_error,
+                    decimation=decimation, dtype=dtype)
             model_dict['trend'] = fit['trend_coef'][1]
         else:
             fit = fit_lomb_scargle(time, signal, dy0, f0, df, numf,
                     tone_control=tone_control, lambda0_range=lambda0_range,
-                    nharm=nharm, detrend_order=0)
+                    nharm=nharm, detrend_order=0, backend=backend,
+                    n_candidates=n_candidates, model_error=model_error,
+                    decimation=decimation, dtype=dtype)
         model_dict['freq_fits'].append(fit)
         signal -= fit['model']
         model_dict['freq_fits'][-1]['resid'] = signal.copy()
@@ -77,6 +128,83 @@ def lomb_scargle_model(time, signal, error, sys_err=0.05, nharm=8, nfreq=3, tone
     return model_dict
 
 
+def lomb_scargle_model_batch(times, signals, errors, sys_err=0.05, nharm=8,
+                             nfreq=3, tone_control=5.0, n_jobs=None,
+                             model_error=True, fmax=33., oversampling=1.25):
+    """Batched version of `lomb_scargle_model` for many (ragged) time series.
+
+    Each of the `nfreq` passes runs the frequency scans of all series in a
+    single call to the C extension (see `fit_lomb_scargle_batch`), which
+    avoids the per-series overhead for large collections of short series. All
+    values are converted to (and fitted in) double precision.
+
+    Parameters
+    ----------
+    times, signals, errors : list of array_like
+        Time, data, and measurement error values for each time series.
+
+    n_jobs : int, optional
+        Number of threads used for the frequency scans; defaults to the
+        number of available CPUs.
+
+    See `lomb_scargle_model` for the remaining parameters.
+
+    Returns
+    -------
+    list of dict
+        Output of `lomb_scargle_model` for each time series.
+    """
+    times, signals, errors = [[np.asarray(x, dtype='float64') for x in xs]
+                              for xs in (times, signals, errors)]
+    dy0s = [np.sqrt(error**2 + sys_err**2) for error in errors]
+    wts = [1. / dy0**2 for dy0 in dy0s]
+    times = [time.copy() - min(time) for time in times]
+    signals = [signal.copy() for signal in signals]
+    chi0s = [np.dot(signal**2, wt) for signal, wt in zip(signals, wts)]
+
+    f0, df, numf = zip(*[_frequency_grid(time, fmax, oversampling)
+                         for time in times])
+    lambda0_range = [[-np.log10(len(time)), 8] for time in times]
+
+    model_dicts = [{'freq_fits': []} for time in times]
+    for i in range(nfreq):
+        fits = fit_lomb_scargle_batch(times, signals, dy0s, f0, df, numf,
+                                      tone_control=tone_control,
+                                      lambda0_range=lambda0_range,
+                                      nharm=nharm,
+                                      detrend_order=1 if i == 0 else 0,
+                                      n_jobs=n_jobs, model_error=model_error)
+        for model_dict, fit, signal, wt, chi0 in zip(model_dicts, fits,
+                                                     signals, wts, chi0s):
+            if i == 0:
+                model_dict['trend'] = fit['trend_coef'][1]
+            model_dict['freq_fits'].append(fit)
+            signal -= fit['model']
+            fit['resid'] = signal.copy()
+            if i == 0:
+                model_dict['varrat'] = np.dot(signal**2, wt) / chi0
+
+    for model_dict, f0_i, df_i, numf_i in zip(model_dicts, f0, df, numf):
+        model_dict['nfreq'] = nfreq
+        model_dict['nharm'] = nharm
+        model_dict['chi2'] = model_dict['freq_fits'][-1]['chi2']
+        model_dict['f0'] = f0_i
+        model_dict['df'] = df_i
+        model_dict['numf'] = numf_i
+
+    return model_dicts
+
+
+def _frequency_grid(time, fmax=33., oversampling=1.25):
+    """Frequency grid (f0, df, numf) up to `fmax` searched for a series with
+    min(time)==0, with `oversampling` frequencies per 1 / max(time).
+    """
+    f0 = 1. / max(time)
+    df = (1. / oversampling) / max(time) # 20120202 :    0.1/Xmax
+    numf = int((fmax - f0) / df) # TODO !!! this is off by 1 point, fix?
+    return f0, df, numf
+
+
 def lprob2sigma(lprob):
     """Translate a log_e(probability) to units of Gaussian sigmas."""
     if lprob > -36.:
@@ -89,7 +217,9 @@ def lprob2sigma(lprob):
 
 
 def fit_lomb_scargle(time, signal, error, f0, df, numf, nharm=8, psdmin=6., detrend_order=0,
-         freq_zoom=10., tone_control=5., lambda0=1., lambda0_range=[-8,6]):
+         freq_zoom=10., tone_control=5., lambda0=1., lambda0_range=[-8,6],
+         backend='auto', n_candidates=50, model_error=True, decimation=None,
+         dtype='float64'):
     """Calls C implementation of Lomb Scargle sinusoid fitting, which fits a
     single frequency with nharm harmonics to the data. Called repeatedly by
     lomb_scargle_model in order to produce a fit with multiple distinct
@@ -132,77 +262,597 @@ def fit_lomb_scargle(time, signal, error, f0, df, numf, nharm=8, psdmin=6., detr
     lambda0_range : [float, float]
         Allowable range for log10 of regularization parameter
 
+    backend : str or callable
+        'scan' evaluates the single-harmonic periodogram at every grid point
+        and refines all values above `psdmin`, in O(N * numf). Otherwise, an
+        approximate periodogram (a key of `PERIODOGRAM_BACKENDS`, e.g. 'fft',
+        or a function with the signature of `fast_periodogram`) is computed
+        first and only its `n_candidates` highest peaks (and their
+        neighbours) are refined, which is much faster for large `numf`.
+        'auto' (default) uses the exact FFT-based periodogram 'uniform' if
+        the times are evenly spaced (within `UNIFORM_SAMPLING_TOL`), the
+        grid has more than `n_candidates` frequencies and does not extend
+        beyond the Nyquist frequency (where the periodogram of evenly sampled
+        data has many equally high aliased peaks), and otherwise 'scan'.
+
+    n_candidates : int
+        Number of periodogram peaks to refine for non-'scan' backends.
+
+    model_error : bool
+        Whether to compute the uncertainties of the model and trend values at
+        each time ('model_error' and 'trend_error'); these take O(N * npar^2)
+        operations, and are omitted from the output if False.
+
+    decimation : int
+        For the 'coarse' backend (see `coarse_to_fine_periodogram`), the
+        periodogram is first scanned on every `decimation`-th grid frequency,
+        and only the surroundings of its `n_candidates` highest peaks are
+        scanned at full resolution. Defaults to the number of grid points per
+        1 / max(time) (rounded down), the approximate width of the peaks.
+
+    dtype : str
+        Floating point type of the single-harmonic periodogram of the 'scan'
+        and 'coarse' backends: 'float64' (default) or 'float32', which is
+        several times faster (see `scan_periodogram`). In single precision,
+        the 'scan' backend evaluates the periodogram at all grid frequencies
+        and then refines the fit (in double precision) at the same
+        frequencies as the double precision scan, i.e. where the
+        periodogram exceeds `psdmin`.
+
     Returns
     -------
     dict
         Dictionary describing various parameters of the multiharmonic fit at
         the best-fit frequency
     """
-    ntime = len(time)
-
 # For some reason we round this to the nearest even integer
     freq_zoom = round(freq_zoom/2.)*2.
 
-# Polynomial terms
-    coef = np.zeros(detrend_order + 1, dtype='float64')
-    norm = np.zeros(detrend_order + 1, dtype='float64')
+    time, signal, error = [np.asarray(x, dtype='float64')
+                           for x in (time, signal, error)]
+    if backend == 'auto':
+        if (numf > n_candidates and _is_evenly_spaced(time)
+                and f0 + df * (numf - 1) <= _nyquist_frequency(time)):
+            backend = 'uniform'
+        else:
+            backend = 'scan'
 
-    wth0 = 1. / error
-    s0 = np.dot(wth0, wth0)
-    wth0 /= np.sqrt(s0)
+    fit = _setup_fit(time, signal, error, f0, df, nharm, psdmin,
+                     detrend_order, freq_zoom, lambda0, lambda0_range)
+    ntime = fit['ntime']
+    npar = 2*nharm
+    fit['hat_matr'] = np.zeros((npar,ntime),dtype='float64')
+    fit['hat0'] = np.zeros((npar,detrend_order+1),dtype='float64')
+    fit['hat_hat'] = np.zeros((npar,npar),dtype='float64')
+    fit['soln'] = np.zeros(npar,dtype='float64')
+    fit['psd'] = np.zeros(numf,dtype='float64')
+    fit['Tr'] = np.array(0., dtype='float64')
+    fit['ifreq'] = np.array(0, dtype='int32')
+
+    single_scan = backend == 'scan' and np.dtype(dtype) == np.float32
+    if single_scan:
+        fit['psd'] = scan_periodogram(time, fit['cn'], fit['wth'], f0, df,
+                                      numf, dtype=dtype)
+        # Frequencies at which the double precision scan would refine the
+        # fit, with a margin for rounding errors, and its fallback maximum
+        margin = 1e-4 * fit['psd'].max()
+        candidates = np.union1d(
+            np.flatnonzero(fit['psd'] > fit['psdmin'] - margin),
+            [fit['psd'].argmax()])
+    elif backend != 'scan':
+        periodogram = PERIODOGRAM_BACKENDS.get(backend, backend)
+        if backend == 'coarse':
+            if decimation is None:
+                decimation = max(1, int(1. / (df * max(time)) + 1e-6))
+            periodogram = partial(coarse_to_fine_periodogram,
+                                  decimation=decimation,
+                                  n_peaks=n_candidates, dtype=dtype)
+        fit['psd'] = np.asarray(periodogram(time, fit['cn'], fit['wth'], f0,
+                                            df, numf), dtype='float64')
+        candidates = _select_candidates(fit['psd'], n_candidates)
+    if backend != 'scan' or single_scan:
+        psd = np.zeros(len(candidates), dtype='float64')
+        lomb_scargle_candidates(ntime, nharm, detrend_order,
+                f0 + df * candidates, psd, fit['cn'], fit['wth'],
+                2. * np.pi * time, fit['sinx_back'], fit['cosx_back'],
+                fit['sinx_smallstep'], fit['cosx_smallstep'],
+                fit['hat_matr'], fit['hat_hat'], fit['hat0'], fit['soln'],
+                fit['chi0'], freq_zoom, fit['psdmin'], tone_control,
+                fit['lambda0'], fit['lambda0_range'], fit['Tr'], fit['ifreq'])
+        fit['psd'][candidates] = psd
+        return _summarize_fit(fit, time, f0, df, nharm, detrend_order,
+                              freq_zoom, model_error,
+                              j=candidates[psd.argmax()])
+
+    lomb_scargle(ntime, numf, nharm, detrend_order, fit['psd'], fit['cn'],
+            fit['wth'], fit['sinx'], fit['cosx'], fit['sinx_step'],
+            fit['cosx_step'], fit['sinx_back'], fit['cosx_back'],
+            fit['sinx_smallstep'], fit['cosx_smallstep'], fit['hat_matr'],
+            fit['hat_hat'], fit['hat0'], fit['soln'], fit['chi0'], freq_zoom,
+            fit['psdmin'], tone_control, fit['lambda0'],
+            fit['lambda0_range'], fit['Tr'], fit['ifreq'])
+
+    return _summarize_fit(fit, time, f0, df, nharm, detrend_order, freq_zoom,
+                          model_error)
+
+
+def fit_lomb_scargle_batch(times, signals, errors, f0, df, numf, nharm=8,
+                           psdmin=6., detrend_order=0, freq_zoom=10.,
+                           tone_control=5., lambda0=1., lambda0_range=[-8,6],
+                           n_jobs=None, model_error=True):
+    """Batched version of `fit_lomb_scargle` for many (ragged) time series.
+
+    The frequency scans for all series are performed in a single call to the
+    C extension, which releases the GIL and distributes the series over a
+    pool of `n_jobs` threads.
 
-    cn = signal * wth0
-    coef[0] = np.dot(cn,wth0)
-    cn0 = coef[0]
-    norm[0] = 1.
-    cn -= coef[0] * wth0
-    vcn = 1.
+    Parameters
+    ----------
+    times, signals, errors : list of array_like
+        Time, data, and measurement error values for each time series.
 
-    # np.sin's and cosin's for later
+    f0, df, numf : scalar or array_like
+        Frequency grid parameters (see `fit_lomb_scargle`); either a single
+        value shared by all series or one value per series.
+
+    lambda0_range : (2,) or (n_series, 2) array_like
+        Allowable range for log10 of regularization parameter, either shared
+        or per series.
+
+    n_jobs : int, optional
+        Number of threads used for the frequency scans; defaults to the
+        number of available CPUs.
+
+    See `fit_lomb_scargle` for the remaining parameters.
+
+    Returns
+    -------
+    list of dict
+        Output of `fit_lomb_scargle` for each time series.
+    """
+    nseries = len(times)
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+    freq_zoom = round(freq_zoom/2.)*2.
+    f0 = np.broadcast_to(f0, nseries)
+    df = np.broadcast_to(df, nseries)
+    numf = np.broadcast_to(numf, nseries).astype(np.intc)
+    lambda0_range = np.broadcast_to(lambda0_range, (nseries, 2))
+
+    fits = [_setup_fit(time, signal, error, f0_i, df_i, nharm, psdmin,
+                       detrend_order, freq_zoom, lambda0, lambda0_range_i)
+            for time, signal, error, f0_i, df_i, lambda0_range_i
+            in zip(times, signals, errors, f0, df, lambda0_range)]
+
+    npar = 2*nharm
+    numt = np.array([fit['ntime'] for fit in fits], dtype=np.intc)
+    t_offsets = np.r_[0, np.cumsum(numt)].astype(np.int64)
+    f_offsets = np.r_[0, np.cumsum(numf)].astype(np.int64)
+
+    def concat(key):
+        return np.concatenate([fit[key].ravel() for fit in fits])
+
+    psd = np.zeros(f_offsets[-1], dtype='float64')
+    hat_matr = np.zeros(npar * t_offsets[-1], dtype='float64')
+    hat_hat = np.zeros((nseries, npar, npar), dtype='float64')
+    hat0 = np.zeros((nseries, npar, detrend_order + 1), dtype='float64')
+    soln = np.zeros((nseries, npar), dtype='float64')
+    Tr = np.zeros(nseries, dtype='float64')
+    ifreq = np.zeros(nseries, dtype=np.intc)
+    lambda0s = np.array([fit['lambda0'] for fit in fits], dtype='float64')
+
+    lomb_scargle_batch(numt, numf, t_offsets, f_offsets, nharm, detrend_order,
+            psd, concat('cn'), concat('wth'), concat('sinx'), concat('cosx'),
+            concat('sinx_step'), concat('cosx_step'), concat('sinx_back'),
+            concat('cosx_back'), concat('sinx_smallstep'),
+            concat('cosx_smallstep'), hat_matr, hat_hat, hat0, soln,
+            np.array([fit['chi0'] for fit in fits], dtype='float64'),
+            freq_zoom, np.array([fit['psdmin'] for fit in fits]),
+            tone_control, lambda0s,
+            np.array([fit['lambda0_range'] for fit in fits]), Tr, ifreq,
+            n_jobs)
+
+    out = []
+    for i, (time, fit) in enumerate(zip(times, fits)):
+        t_slice = slice(npar * t_offsets[i], npar * t_offsets[i + 1])
+        fit['psd'] = psd[f_offsets[i]:f_offsets[i + 1]]
+        fit['hat_matr'] = hat_matr[t_slice].reshape((npar, numt[i]))
+        fit['hat_hat'] = hat_hat[i]
+        fit['hat0'] = hat0[i]
+        fit['soln'] = soln[i]
+        fit['lambda0'] = lambda0s[i]
+        fit['Tr'] = Tr[i]
+        fit['ifreq'] = ifreq[i]
+        out.append(_summarize_fit(fit, time, f0[i], df[i], nharm,
+                                  detrend_order, freq_zoom, model_error))
+    return out
+
+
+def _scan_dtype(*arrays):
+    """Floating point type of the periodogram scan for the given inputs:
+    'float32' if they are all single precision, and 'float64' otherwise.
+    """
+    return np.result_type(*arrays, np.float32).name
+
+
+def _is_evenly_spaced(time, tol=UNIFORM_SAMPLING_TOL):
+    """Whether sorted `time` deviates from an evenly spaced grid by at most
+    `tol` times the sampling interval.
+    """
+    if len(time) < 3:
+        return False
+    dt = (time[-1] - time[0]) / (len(time) - 1)
+    grid = time[0] + dt * np.arange(len(time))
+    return dt > 0 and np.max(np.abs(time - grid)) <= tol * dt
+
+
+def _nyquist_frequency(time):
+    """Nyquist frequency of the evenly spaced `time`."""
+    return 0.5 * (len(time) - 1) / (time[-1] - time[0])
+
+
+def _top_peaks(psd, n_peaks):
+    """Indices of the `n_peaks` highest local maxima of `psd`."""
+    padded = np.r_[-np.inf, psd, -np.inf]
+    peaks = np.where((psd >= padded[:-2]) & (psd >= padded[2:]))[0]
+    return peaks[np.argsort(psd[peaks])[::-1][:n_peaks]]
+
+
+def _select_candidates(psd, n_candidates):
+    """Grid indices of the `n_candidates` highest local maxima of `psd`, plus
+    their immediate neighbours, in increasing order.
+    """
+    peaks = _top_peaks(psd, n_candidates)
+    candidates = np.unique(np.r_[peaks - 1, peaks, peaks + 1])
+    return candidates[(candidates >= 0) & (candidates < len(psd))]
+
+
+def scan_periodogram(time, cn, wth, f0, df, numf, dtype='float64'):
+    """Single-harmonic Lomb-Scargle periodogram at every grid frequency, as
+    evaluated by the frequency scan of `fit_lomb_scargle`.
+
+    Parameters
+    ----------
+    time : array_like
+        Time values, with min(time) == 0.
+
+    cn : array_like
+        Weighted, detrended data values.
+
+    wth : array_like
+        Orthonormal detrending basis, with the normalized weights in the
+        first row (or a 1-d array of normalized weights).
+
+    f0, df, numf : float, float, int
+        Frequency grid.
+
+    dtype : str
+        Floating point type of the sine/cosine tables and data values:
+        'float64' or 'float32' (see `coarse_to_fine_periodogram`).
+
+    Returns
+    -------
+    np.ndarray
+        Periodogram values at f0 + df * arange(numf).
+    """
+    sinx_step, cosx_step = trig_table_cache.get(
+        ('coarse_tables', trig_table_cache.key(time), df, 1, dtype),
+        lambda: _decimated_trig_tables(time, df, 1, dtype))[2:]
+    return _scan_psd(time, np.ascontiguousarray(cn, dtype=dtype),
+                     np.ascontiguousarray(wth, dtype=dtype), f0, df, numf,
+                     sinx_step, cosx_step)
+
+
+def coarse_to_fine_periodogram(time, cn, wth, f0, df, numf, decimation=4,
+                               n_peaks=50, dtype='float64'):
+    """Single-harmonic Lomb-Scargle periodogram evaluated only around the
+    highest peaks of the same periodogram on a decimated grid.
+
+    The periodogram of the frequency scan of `fit_lomb_scargle` is first
+    computed on every `decimation`-th grid frequency; the grid frequencies
+    between the neighbours of its `n_peaks` highest local maxima are then
+    evaluated exactly, so that only numf / decimation frequencies plus about
+    2 * n_peaks * decimation frequencies around the peaks are visited at
+    full resolution, instead of all numf. A peak can be missed if it is
+    narrower than the coarse grid spacing `decimation * df`; the peaks of the
+    periodogram are about 1 / max(time) wide, i.e. `oversampling` grid points
+    (see `_frequency_grid`), so `decimation` should not exceed that.
+
+    Parameters
+    ----------
+    time : array_like
+        Time values, with min(time) == 0.
+
+    cn : array_like
+        Weighted, detrended data values.
+
+    wth : array_like
+        Orthonormal detrending basis, with the normalized weights in the
+        first row (or a 1-d array of normalized weights).
+
+    f0, df, numf : float, float, int
+        Frequency grid.
+
+    decimation : int
+        Ratio of the spacing of the coarse grid to `df`.
+
+    n_peaks : int
+        Number of peaks of the coarse periodogram that are refined.
+
+    dtype : str
+        Floating point type of the sine/cosine tables and data values of the
+        scan: 'float64' or 'float32', which is several times faster (half the
+        memory traffic and twice the SIMD width). In single precision the
+        periodogram has a relative error of a few 1e-6: the sums over the
+        times are accumulated in double precision from float partial sums of
+        at most 32 terms, and the sine/cosine recurrence is restarted from
+        exact values every `SCAN_BLOCK` frequencies.
+
+    Returns
+    -------
+    np.ndarray
+        Periodogram values at f0 + df * arange(numf); zero for the frequencies
+        that were not evaluated.
+    """
+    time_key = trig_table_cache.key(time)
+    sinx_coarse, cosx_coarse, sinx_step, cosx_step = trig_table_cache.get(
+        ('coarse_tables', time_key, df, decimation, dtype),
+        lambda: _decimated_trig_tables(time, df, decimation, dtype))
+    cn = np.ascontiguousarray(cn, dtype=dtype)
+    wth = np.ascontiguousarray(wth, dtype=dtype)
+
+    ncoarse = (numf - 1) // decimation + 1
+    coarse_psd = _scan_psd(time, cn, wth, f0, df * decimation, ncoarse,
+                           sinx_coarse, cosx_coarse)
+
+    # Fine grid windows between the coarse neighbours of each peak, merged
+    # where they overlap
+    fine = np.zeros(numf, dtype='float64')
+    peaks = np.sort(_top_peaks(coarse_psd, n_peaks))
+    starts = np.maximum((peaks - 1) * decimation, 0)
+    stops = np.minimum((peaks + 1) * decimation + 1, numf)
+    i = 0
+    while i < len(peaks):
+        start, stop = starts[i], stops[i]
+        while i + 1 < len(peaks) and starts[i + 1] <= stop:
+            i += 1
+            stop = max(stop, stops[i])
+        fine[start:stop] = _scan_psd(time, cn, wth, f0 + df * start, df,
+                                     stop - start, sinx_step, cosx_step)
+        i += 1
+    return fine
+
+
+# Number of frequencies after which `_scan_psd` restarts the sine/cosine
+# recurrence of the C kernel from exactly computed values
+SCAN_BLOCK = 1024
+
+
+def _scan_psd(time, cn, wth, f, df, numf, sinx_step, cosx_step):
+    """Single-harmonic periodogram at f + df * arange(numf), computed by
+    `lomb_scargle_psd` in the floating point type of `cn`.
+    """
+    wth0 = np.atleast_2d(wth)[0]
+    detrend_order = wth.shape[0] - 1 if wth.ndim > 1 else 0
+    tt = 2. * np.pi * time
+    psd = np.zeros(numf, dtype='float64')
+    for start in range(0, numf, SCAN_BLOCK):
+        n = min(SCAN_BLOCK, numf - start)
+        sinx = (np.sin(tt * (f + df * start)) * wth0).astype(cn.dtype)
+        cosx = (np.cos(tt * (f + df * start)) * wth0).astype(cn.dtype)
+        lomb_scargle_psd(len(time), n, detrend_order, psd[start:start + n],
+                         cn, wth, sinx, cosx, sinx_step, cosx_step)
+    return psd
+
+
+def _decimated_trig_tables(time, df, decimation, dtype):
+    """Sine and cosine tables of `coarse_to_fine_periodogram`: the coarse
+    steps by decimation * df and the fine steps by df.
+    """
+    tt = 2. * np.pi * time
+    return tuple(x.astype(dtype) for x in
+                 (np.sin(tt*df*decimation), np.cos(tt*df*decimation),
+                  np.sin(tt*df), np.cos(tt*df)))
+
+
+# Registered after its definition; `fit_lomb_scargle` passes its `decimation`
+PERIODOGRAM_BACKENDS['coarse'] = coarse_to_fine_periodogram
+
+
+class TrigTableCache(object):
+    """Thread-safe in-memory LRU cache of the sine/cosine tables and
+    detrending bases used by `fit_lomb_scargle`.
+
+    Tables are keyed by a hash of the time (and, for the detrending basis,
+    error) values together with the frequency grid parameters, so that they
+    are shared by the frequency passes of `lomb_scargle_model` and by all
+    channels and time series with identical sampling. The cached arrays must
+    not be modified.
+
+    Attributes
+    ----------
+    max_size : int
+        Maximum total size (in bytes) of the cached arrays; the least
+        recently used entries are evicted once it is exceeded. 0 disables
+        caching.
+    """
+    def __init__(self, max_size=2**27):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(*arrays):
+        """Hash of the shape and values of (float64) arrays."""
+        h = hashlib.sha1()
+        for x in arrays:
+            x = np.ascontiguousarray(x, dtype='float64')
+            h.update(str(x.shape).encode())
+            h.update(x.data)
+        return h.hexdigest()
+
+    def get(self, key, compute):
+        """Return the tuple of arrays stored under `key`, calling `compute()`
+        to create (and store) it if necessary.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        value = compute()
+        size = _nbytes(value)
+        with self._lock:
+            if key not in self._entries and size <= self.max_size:
+                self._entries[key] = value
+                self._size += size
+                while self._size > self.max_size:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._size -= _nbytes(evicted)
+        return value
+
+    def size(self):
+        """Total size (in bytes) of the cached arrays."""
+        return self._size
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        """Delete all entries."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+def _nbytes(value):
+    """Total size of the arrays in a (nested) tuple."""
+    if isinstance(value, tuple):
+        return sum(_nbytes(x) for x in value)
+    return value.nbytes if isinstance(value, np.ndarray) else 0
+
+
+# Tables shared by all calls of `fit_lomb_scargle` in this process
+trig_table_cache = TrigTableCache()
+
+
+def _trig_tables(time, f0, df, freq_zoom):
+    """Sine and cosine tables of the frequency scan: (sin, cos)(2*pi*f0*t)
+    (unweighted), the steps by df, the half step back and the zoom steps.
+    """
     tt = 2. * np.pi * time
-    sinx,cosx = np.sin(tt*f0)*wth0,np.cos(tt*f0)*wth0
     sinx_step,cosx_step = np.sin(tt*df),np.cos(tt*df)
     sinx_back,cosx_back = -np.sin(tt*df/2.),np.cos(tt*df/2)
     sinx_smallstep,cosx_smallstep = np.sin(tt*df/freq_zoom),np.cos(tt*df/freq_zoom)
+    return (np.sin(tt*f0), np.cos(tt*f0), sinx_step, cosx_step, sinx_back,
+            cosx_back, sinx_smallstep, cosx_smallstep)
 
-    npar = 2*nharm
-    hat_matr = np.zeros((npar,ntime),dtype='float64')
-    hat0 = np.zeros((npar,detrend_order+1),dtype='float64')
-    hat_hat = np.zeros((npar,npar),dtype='float64')
-    soln = np.zeros(npar,dtype='float64')
-    psd = np.zeros(numf,dtype='float64')
 
-    # Detrend the data and create the orthogonal detrending basis
+def _detrend_basis(time, error, detrend_order):
+    """Normalized weights and orthonormal polynomial detrending basis (also
+    returned as a tuple of separate arrays for the higher-order terms).
+    """
+    ntime = len(time)
+    norm = np.zeros(detrend_order + 1, dtype='float64')
+
+    wth0 = 1. / error
+    s0 = np.dot(wth0, wth0)
+    wth0 /= np.sqrt(s0)
+    norm[0] = 1.
+    vcn = 1.
+
+    # Create the orthogonal detrending basis
+    tt = 2. * np.pi * time
     if detrend_order > 0:
         wth = np.zeros((detrend_order + 1, ntime),dtype='float64')
         wth[0,:] = wth0
     else:
         wth = wth0
 
+    rows = []
     for i in range(detrend_order):
         f = wth[i,:] * tt / (2 * np.pi)
         for j in range(i+1):
             f -= np.dot(f, wth[j,:]) * wth[j,:]
         norm[i+1] = np.sqrt(np.dot(f,f))
         f /= norm[i+1]
-        coef[i+1] = np.dot(cn,f)
-        cn -= coef[i+1]*f
         wth[i+1,:] = f
+        rows.append(f)
         vcn += (f/wth0)**2
+    return wth0, s0, wth, norm, vcn, tuple(rows)
+
+
+def _setup_fit(time, signal, error, f0, df, nharm, psdmin, detrend_order,
+               freq_zoom, lambda0, lambda0_range):
+    """Compute the weighted/detrended data and the sine and cosine tables
+    used as inputs to the C Lomb-Scargle kernel.
+
+    The tables and the detrending basis only depend on the time and error
+    values, and are shared through `trig_table_cache`.
+    """
+    ntime = len(time)
+    time_key = trig_table_cache.key(time)
+    (sin_f0, cos_f0, sinx_step, cosx_step, sinx_back, cosx_back,
+     sinx_smallstep, cosx_smallstep) = trig_table_cache.get(
+         ('tables', time_key, f0, df, freq_zoom),
+         lambda: _trig_tables(time, f0, df, freq_zoom))
+    wth0, s0, wth, norm, vcn, rows = trig_table_cache.get(
+        ('basis', time_key, trig_table_cache.key(error), detrend_order),
+        lambda: _detrend_basis(time, error, detrend_order))
+
+# Polynomial terms
+    coef = np.zeros(detrend_order + 1, dtype='float64')
+
+    cn = signal * wth0
+    coef[0] = np.dot(cn,wth0)
+    cn0 = coef[0]
+    cn -= coef[0] * wth0
+
+    # np.sin's and cosin's for later
+    sinx,cosx = sin_f0*wth0,cos_f0*wth0
+
+    # Detrend the data
+    for i, f in enumerate(rows):
+        coef[i+1] = np.dot(cn,f)
+        cn -= coef[i+1]*f
 
     chi0 = np.dot(cn,cn)
     varcn = chi0/(ntime-1-detrend_order)
     psdmin *= 2*varcn
 
-    Tr = np.array(0., dtype='float64')
-    ifreq = np.array(0, dtype='int32')
-    lambda0 = np.array(lambda0 / s0, dtype='float64')
-    lambda0_range = 10**np.array(lambda0_range, dtype='float64') / s0
+    return {'ntime': ntime, 'coef': coef, 'norm': norm, 'wth0': wth0,
+            's0': s0, 'cn': cn, 'cn0': cn0, 'vcn': vcn, 'wth': wth,
+            'sinx': sinx, 'cosx': cosx, 'sinx_step': sinx_step,
+            'cosx_step': cosx_step, 'sinx_back': sinx_back,
+            'cosx_back': cosx_back, 'sinx_smallstep': sinx_smallstep,
+            'cosx_smallstep': cosx_smallstep, 'chi0': chi0, 'varcn': varcn,
+            'psdmin': psdmin,
+            'lambda0': np.array(lambda0 / s0, dtype='float64'),
+            'lambda0_range': 10**np.array(lambda0_range, dtype='float64') / s0}
+
+
+def _diag_quadratic_form(X, A):
+    """Diagonal of X^T A X, i.e. sum_ij X_in A_ij X_jn, in O(n * p^2) rather
+    than O(n^2 * p) operations for a (p, n) matrix `X`.
+    """
+    return np.einsum('in,in->n', X, np.dot(A, X))
 
-    lomb_scargle(ntime, numf, nharm, detrend_order, psd, cn, wth, sinx, cosx,
-            sinx_step, cosx_step, sinx_back, cosx_back, sinx_smallstep,
-            cosx_smallstep, hat_matr, hat_hat, hat0, soln, chi0, freq_zoom,
-            psdmin, tone_control, lambda0, lambda0_range, Tr, ifreq)
+
+def _summarize_fit(fit, time, f0, df, nharm, detrend_order, freq_zoom,
+                   model_error=True, j=None):
+    """Compute the output parameters of `fit_lomb_scargle` from the results of
+    the C Lomb-Scargle kernel.
+
+    `j` is the grid index of the best-fit frequency (at which the kernel left
+    its model); by default, the maximum of `fit['psd']`. It must be given if
+    `fit['psd']` mixes refined values with unrefined periodogram values.
+    """
+    ntime, s0, wth0, wth = fit['ntime'], fit['s0'], fit['wth0'], fit['wth']
+    coef, norm, cn0, vcn = fit['coef'], fit['norm'], fit['cn0'], fit['vcn']
+    chi0, varcn, psd = fit['chi0'], fit['varcn'], fit['psd']
+    hat_matr, hat_hat, hat0 = fit['hat_matr'], fit['hat_hat'], fit['hat0']
+    soln, lambda0, Tr, ifreq = fit['soln'], fit['lambda0'], fit['Tr'], fit['ifreq']
+    npar = 2*nharm
 
     hat_hat /= s0
     ii = np.arange(nharm, dtype='int32')
@@ -226,7 +876,8 @@ def fit_lomb_scargle(time, signal, error, f0, df, numf, nharm=8, psdmin=6., detr
         out_dict['trend'] = coef[0] + 0*wth0
     out_dict['model'] = modl/wth0 + out_dict['trend']
 
-    j = psd.argmax()
+    if j is None:
+        j = psd.argmax()
     freq = f0 + df * j + (ifreq / freq_zoom - 1/2.) * df
     tt = (time * freq) % 1.
     out_dict['freq'] = freq
@@ -247,10 +898,15 @@ def fit_lomb_scargle(time, signal, error, f0, df, numf, nharm=8, psdmin=6., detr
     vA0, vB0 = err2[0:nharm], err2[nharm:]
     covA0B0 = hat_hat[(ii,nharm+ii)]
 
-    vmodl = vcn/s0 + np.dot((hat_matr/wth0).T, np.dot(hat_hat, hat_matr/wth0))
-    vmodl0 = vcn/s0 + np.dot((hat_matr0/wth0).T, np.dot(hat_hat, hat_matr0/wth0))
-    out_dict['model_error'] = np.sqrt(np.diag(vmodl))
-    out_dict['trend_error'] = np.sqrt(np.diag(vmodl0))
+    if model_error:
+        # Only the diagonals of the (ntime, ntime) model covariance matrices
+        # are needed
+        hat_matr /= wth0
+        hat_matr0 /= wth0
+        vmodl = vcn/s0 + _diag_quadratic_form(hat_matr, hat_hat)
+        vmodl0 = vcn/s0 + _diag_quadratic_form(hat_matr0, hat_hat)
+        out_dict['model_error'] = np.sqrt(vmodl)
+        out_dict['trend_error'] = np.sqrt(vmodl0)
 
     amp = np.sqrt(A0**2 + B0**2)
     damp = np.sqrt(A0**2 * vA0 + B0**2 * vB0 + 2. * A0 * B0 * covA0B0) / amp
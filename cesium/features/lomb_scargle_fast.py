@@ -1,3 +1,5 @@
+import functools
+import math
 import numpy as np
 import gatspy
 
@@ -17,3 +19,205 @@ def lomb_scargle_fast_period(t, m, e):
                                             silence_warnings=True)
     model.fit(t, m, e)
     return model.best_period
+
+
+def extirpolate(x, y, N, M=4):
+    """Extirpolate the values (x, y) onto the integer grid range(N) such that
+    sum(y * f(x)) == sum(grid * f(range(N))) for any polynomial f of degree
+    less than `M` (Press & Rybicki 1989).
+
+    Parameters
+    ----------
+    x : array_like
+        Non-negative (real) positions, at most N - 1.
+
+    y : array_like
+        (Possibly complex) values at the positions `x`.
+
+    N : int
+        Number of grid points.
+
+    M : int
+        Number of neighbouring grid points each value is spread over.
+
+    Returns
+    -------
+    np.ndarray
+        Extirpolated values on the grid range(N).
+    """
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y)
+    result = np.zeros(N, dtype=np.result_type(y, 'float64'))
+
+    # Values lying exactly on a grid point need no spreading
+    on_grid = (x % 1 == 0)
+    np.add.at(result, x[on_grid].astype(int), y[on_grid])
+    x, y = x[~on_grid], y[~on_grid]
+
+    # Lagrange interpolation weights for the M grid points nearest to x
+    ilo = np.clip((x - M // 2).astype(int), 0, N - M)
+    numerator = y * np.prod(x - ilo - np.arange(M)[:, np.newaxis], 0)
+    denominator = float(math.factorial(M - 1))
+    for j in range(M):
+        if j > 0:
+            denominator *= j / (j - M)
+        ind = ilo + (M - 1 - j)
+        np.add.at(result, ind, numerator / (denominator * (x - ind)))
+    return result
+
+
+def trig_sum(t, h, f0, df, numf, oversampling=4, M=6):
+    """Approximate the sums sum(h * sin(2*pi*f*t)), sum(h * cos(2*pi*f*t))
+    for f = f0 + df * arange(numf) in O(N + numf * log(numf)) operations by
+    extirpolating onto a regular grid and using an FFT.
+
+    Parameters
+    ----------
+    t : array_like
+        Non-negative time values.
+
+    h : array_like
+        Weights; a 2-d array computes one pair of sums per row.
+
+    f0, df, numf : float, float, int
+        Frequency grid.
+
+    oversampling : int
+        Ratio of the FFT size to the number of frequencies; larger values are
+        more accurate.
+
+    M : int
+        Order of the extirpolation.
+
+    Returns
+    -------
+    (S, C) : tuple of np.ndarray
+        Sine and cosine sums with shape h.shape[:-1] + (numf,).
+    """
+    t = np.asarray(t, dtype='float64')
+    h = np.asarray(h, dtype='float64') * np.exp(2j * np.pi * f0 * t)
+    nfft = 2 ** int(np.ceil(np.log2(max(oversampling * numf, 2 * M))))
+    tnorm = (t * nfft * df) % nfft
+    grid = np.array([extirpolate(tnorm, h_i, nfft, M)
+                     for h_i in h.reshape((-1, len(t)))])
+    sums = nfft * np.fft.ifft(grid, axis=-1)[:, :numf]
+    sums = sums.reshape(h.shape[:-1] + (numf,))
+    return sums.imag, sums.real
+
+
+def uniform_trig_sum(t, h, f0, df, numf):
+    """Compute the sums sum(h * sin(2*pi*f*t)), sum(h * cos(2*pi*f*t))
+    for f = f0 + df * arange(numf) and evenly spaced times t, in
+    O((N + numf) * log(N + numf)) operations.
+
+    For t = t[0] + dt * arange(N) the sums are a chirp-z transform of the
+    weights, which is evaluated as a convolution via FFTs (Bluestein's
+    algorithm, using n*k = (n**2 + k**2 - (k - n)**2) / 2). Unlike
+    `trig_sum` this is exact (up to rounding) for evenly spaced times.
+
+    Parameters
+    ----------
+    t : array_like
+        Evenly spaced time values (at least two).
+
+    h : array_like
+        Weights; a 2-d array computes one pair of sums per row.
+
+    f0, df, numf : float, float, int
+        Frequency grid.
+
+    Returns
+    -------
+    (S, C) : tuple of np.ndarray
+        Sine and cosine sums with shape h.shape[:-1] + (numf,).
+    """
+    t = np.asarray(t, dtype='float64')
+    h = np.asarray(h, dtype='float64')
+    N = len(t)
+    dt = (t[-1] - t[0]) / (N - 1)
+    b = df * dt
+
+    # Phases pi*b*n**2 are reduced modulo 2*pi before scaling by pi, to keep
+    # them accurate for long series
+    n = np.arange(N)
+    k = np.arange(numf)
+    m = np.arange(-(N - 1), numf)
+    chirp_n = np.exp(1j * np.pi * ((b * n**2. + 2. * f0 * dt * n) % 2.))
+    chirp_m = np.exp(-1j * np.pi * ((b * m**2.) % 2.))
+    chirp_k = np.exp(1j * np.pi * ((b * k**2. + 2. * (f0 + df * k) * t[0])
+                                   % 2.))
+
+    nfft = 2 ** int(np.ceil(np.log2(N + numf - 1)))
+    kernel = np.zeros(nfft, dtype='complex128')
+    kernel[m % nfft] = chirp_m
+    u = np.fft.fft(h * chirp_n, nfft, axis=-1)
+    sums = np.fft.ifft(u * np.fft.fft(kernel), axis=-1)[..., :numf] * chirp_k
+    return sums.imag, sums.real
+
+
+def fast_periodogram(time, cn, wth, f0, df, numf, oversampling=4, M=6):
+    """Approximate (single-harmonic) Lomb-Scargle periodogram on a frequency
+    grid, computed from FFT-based trigonometric sums.
+
+    Reproduces the simple sine + cosine periodogram evaluated at each grid
+    point by the frequency scan of `fit_lomb_scargle`, but in
+    O(N + numf * log(numf)) rather than O(N * numf) operations, so that the
+    (expensive) regularized multi-harmonic fit can be restricted to the
+    highest peaks.
+
+    Parameters
+    ----------
+    time : array_like
+        Time values, with min(time) == 0.
+
+    cn : array_like
+        Weighted, detrended data values.
+
+    wth : array_like
+        Orthonormal detrending basis, with the normalized weights in the
+        first row (or a 1-d array of normalized weights).
+
+    f0, df, numf : float, float, int
+        Frequency grid.
+
+    Returns
+    -------
+    np.ndarray
+        Periodogram values at f0 + df * arange(numf).
+    """
+    return _periodogram(functools.partial(trig_sum, oversampling=oversampling,
+                                          M=M),
+                        time, cn, wth, f0, df, numf)
+
+
+def uniform_periodogram(time, cn, wth, f0, df, numf):
+    """Single-harmonic Lomb-Scargle periodogram of evenly sampled data.
+
+    Same as `fast_periodogram`, but the trigonometric sums are computed
+    exactly with `uniform_trig_sum`, in O((N + numf) * log(N + numf))
+    operations. Only valid if `time` is evenly spaced.
+    """
+    return _periodogram(uniform_trig_sum, time, cn, wth, f0, df, numf)
+
+
+def _periodogram(trig_sum, time, cn, wth, f0, df, numf):
+    """Single-harmonic periodogram from the sums computed by `trig_sum`."""
+    wth = np.atleast_2d(wth)
+    wth0 = wth[0]
+    sh_st, ch_ct = trig_sum(time, np.vstack((cn * wth0, wth0 * wth)), f0, df,
+                            numf)
+    S2, C2 = trig_sum(time, wth0**2, 2 * f0, 2 * df, numf)
+    sh, ch = sh_st[0], ch_ct[0]
+    st, ct = (sh_st[1:]**2).sum(0), (ch_ct[1:]**2).sum(0)
+    cst = (sh_st[1:] * ch_ct[1:]).sum(0)
+
+    # sum(w**2 * sin * cos) and sum(w**2 * cos**2) from the double-angle sums
+    cs = 0.5 * S2 - cst
+    c2 = 0.5 * (1. + C2)
+    s2 = 1. - c2 - st
+    c2 -= ct
+    detm = c2 * s2 - cs**2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        psd = (c2 * sh**2 - 2. * cs * ch * sh + s2 * ch**2) / detm
+    psd[~(detm > 0)] = 0.
+    return psd
@@ -3,41 +3,83 @@ from . import lomb_scargle as ls
 from . import common_functions as cf
 
 
-# TODO is this worth it since it doubles running time?
-def period_folding(x, y, dy, lomb_model, sys_err=0.05):
+def period_folding(x, y, dy, lomb_model, sys_err=0.05, rescan=True,
+                   fit_2p=None):
     """
     This section is used to calculate Dubath (10. Percentile90:2P/P),
     which requires regenerating a model using 2P where P is the original found period
 
-    NOTE: this essentially runs everything a second time, so makes feature
-    generation take roughly twice as long.
+    NOTE: with `rescan=True` this essentially runs everything a second time,
+    so makes feature generation take roughly twice as long. With
+    `rescan=False` the residual frequencies are not searched for over the
+    full frequency grid; instead the frequencies found by `lomb_model` are
+    reused (and only refined within one grid step), at the cost of slightly
+    different residuals.
+
+    `fit_2p` is the output of `period_folded_fit`, if it has already been
+    computed (e.g., for `period_folded_slopes`).
     """
     out_dict = {}
-    model_vals = np.zeros(len(y))
-    freq_2p = lomb_model['freq_fits'][0]['freq'] * 0.5
-    ytest_2p = y.copy()
     dy0 = np.sqrt(dy**2 + sys_err**2)
+    if fit_2p is None:
+        fit_2p = period_folded_fit(x, y, dy, lomb_model, sys_err)
+    model_vals = fit_2p['model']
 
-    # Here we force the freq to just 2*freq1_Period; we also do not use linear
-    # detrending since we are not searching for freqs, and we want the
-    # resulting model to be smooth when in phase-space. Detrending would result
-    # in non-smooth model when period folded
+    ytest_2p = y - model_vals
     lambda0_range = [-np.log10(len(x)), 8.]
-    fit = ls.fit_lomb_scargle(x, ytest_2p, dy0, freq_2p, lomb_model['df'], 1,
-            lambda0_range=lambda0_range, nharm=lomb_model['nharm'], detrend_order=0)
-    model_vals += fit['model']
-
-    ytest_2p -= fit['model']
     for i in range(1, lomb_model['nfreq']):
-        fit = ls.fit_lomb_scargle(x, ytest_2p, dy0, lomb_model['f0'],
-                lomb_model['df'], lomb_model['numf'],
-                lambda0_range=lambda0_range, nharm=lomb_model['nharm'],
-                detrend_order=0)
+        if rescan:
+            fit = ls.fit_lomb_scargle(x, ytest_2p, dy0, lomb_model['f0'],
+                    lomb_model['df'], lomb_model['numf'],
+                    lambda0_range=lambda0_range, nharm=lomb_model['nharm'],
+                    detrend_order=0, model_error=False,
+                    dtype=ls._scan_dtype(x, y, dy))
+        else:
+            fit = ls.fit_lomb_scargle(x, ytest_2p, dy0,
+                    lomb_model['freq_fits'][i]['freq'], lomb_model['df'], 1,
+                    lambda0_range=lambda0_range, nharm=lomb_model['nharm'],
+                    detrend_order=0, model_error=False)
         ytest_2p -= fit['model']
 
     out_dict['1p_resid'] = lomb_model['freq_fits'][-1]['resid']
     out_dict['2p_resid'] = ytest_2p
+    out_dict['folded_slopes'] = _folded_slopes(x, model_vals, lomb_model)
+
+    return out_dict
+
+
+def period_folded_slopes(x, y, dy, lomb_model, sys_err=0.05, fit_2p=None):
+    """Slopes of the model fit at twice the period of `lomb_model`, folded by
+    twice the period.
+
+    Only requires the single (fixed frequency) fit of the 2P model, so this is
+    much cheaper than `period_folding`; `fit_2p` is the output of
+    `period_folded_fit`, if it has already been computed.
+    """
+    if fit_2p is None:
+        fit_2p = period_folded_fit(x, y, dy, lomb_model, sys_err)
+    return {'folded_slopes': _folded_slopes(x, fit_2p['model'], lomb_model)}
+
 
+def period_folded_fit(x, y, dy, lomb_model, sys_err=0.05):
+    """Fit a multi-harmonic model at half the first frequency of `lomb_model`,
+    i.e. at twice the period.
+    """
+    dy0 = np.sqrt(dy**2 + sys_err**2)
+    freq_2p = lomb_model['freq_fits'][0]['freq'] * 0.5
+
+    # Here we force the freq to just 2*freq1_Period; we also do not use linear
+    # detrending since we are not searching for freqs, and we want the
+    # resulting model to be smooth when in phase-space. Detrending would result
+    # in non-smooth model when period folded
+    lambda0_range = [-np.log10(len(x)), 8.]
+    return ls.fit_lomb_scargle(x, y, dy0, freq_2p, lomb_model['df'], 1,
+            lambda0_range=lambda0_range, nharm=lomb_model['nharm'], detrend_order=0,
+            model_error=False)
+
+
+def _folded_slopes(x, model_vals, lomb_model):
+    """Slopes of the 2P model values, folded by twice the period."""
     # So the following uses the 2*Period model, and gets a time-sorted, folded t and m:
     # NOTE: if this is succesful, I think a lot of other features could characterize the
     # shapes of the 2P folded data (not P or 2P dependent).
@@ -48,13 +90,12 @@ def period_folding(x, y, dy, lomb_model, sys_err=0.05):
     # NOTE: we only use the model from freq1 because this with its harmonics seems to
     # adequately model shapes such as RRLyr skewed sawtooth, multi minima of rvtau
     # without getting the scatter from using additional LS found frequencies.
+    freq_2p = lomb_model['freq_fits'][0]['freq'] * 0.5
     t_2per_fold = np.array(x % (1. / freq_2p))
     t_2per_sort_inds = np.argsort(t_2per_fold)
     t_2per_fold = t_2per_fold[t_2per_sort_inds]
     y_2per_fold = np.array(model_vals)[t_2per_sort_inds]
-    out_dict['folded_slopes'] = slopes = np.diff(y_2per_fold) / np.diff(t_2per_fold)
-
-    return out_dict
+    return np.diff(y_2per_fold) / np.diff(t_2per_fold)
 
 
 def p2p_model(x, y, frequency):
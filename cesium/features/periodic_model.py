@@ -3,10 +3,29 @@ from scipy import optimize
 
 
 # TODO what is this exactly?
-def periodic_model(lomb_model):
+def periodic_model(lomb_model, engine='fmin'):
     """
     Compute features related to the extreme points of the fitted Lomb Scargle
     model.
+
+    Starting at 5% of the phase, we successively find a maximum, a minimum, a
+    second maximum and a second minimum of the model by local search.
+    `engine` selects how each local search is performed:
+        - 'fmin': Nelder-Mead simplex search (`scipy.optimize.fmin`)
+        - 'analytic': since the model is a trigonometric polynomial, the
+          model derivative is evaluated on a dense phase grid (in one
+          vectorized step) to bracket the extremum reached by following the
+          slope of the model, which is then refined by Newton iterations
+          using the analytic second derivative; see `find_model_extremum`.
+          This is much faster, and exact up to floating-point precision
+          rather than to the simplex tolerance.
+
+    The two engines are not interchangeable: the initial simplex of 'fmin'
+    can step back over the preceding extremum, so that the same extremum is
+    found twice (and `min_delta_mags`/`max_delta_mags` are 0), whereas
+    'analytic' always moves on to the next extremum in phase. The default
+    feature graph uses 'fmin'; see `features.feature_graph_options` for
+    selecting 'analytic' when featurizing.
     """
     out_dict = {}
 
@@ -23,14 +42,29 @@ def periodic_model(lomb_model):
                 A[6] * np.sin(2. * np.pi * 7. * t + ph[6]) +
                 A[7] * np.sin(2. * np.pi * 8. * t + ph[7]))
 
-    def model_neg(t):
-        return -1. * model_f(t)
+    if engine == 'fmin':
+        def model_neg(t):
+            return -1. * model_f(t)
+
+        def find_max(x0):
+            return optimize.fmin(model_neg, x0, disp=False)[0]
+
+        def find_min(x0):
+            return optimize.fmin(model_f, x0, disp=False)[0]
+    elif engine == 'analytic':
+        def find_max(x0):
+            return find_model_extremum(A[:8], ph[:8], x0, maximum=True)
+
+        def find_min(x0):
+            return find_model_extremum(A[:8], ph[:8], x0, maximum=False)
+    else:
+        raise ValueError("Unknown engine '{}'.".format(engine))
 
     # Start finding 1st minima, at 5% of phase (fudge/magic number) > 0.018
-    min_1_a = optimize.fmin(model_neg, 0.05, disp=False)[0]
-    max_2_a = optimize.fmin(model_f, min_1_a + 0.01, disp=False)[0]
-    min_3_a = optimize.fmin(model_neg, max_2_a + 0.01, disp=False)[0]
-    max_4_a = optimize.fmin(model_f, min_3_a + 0.01, disp=False)[0]
+    min_1_a = find_max(0.05)
+    max_2_a = find_min(min_1_a + 0.01)
+    min_3_a = find_max(max_2_a + 0.01)
+    max_4_a = find_min(min_3_a + 0.01)
 
 # TODO !!! is this wrong? seems like it should be a minus
     out_dict['phi1_phi2'] = (min_3_a - max_2_a) / (max_4_a / min_3_a)
@@ -39,6 +73,80 @@ def periodic_model(lomb_model):
     return out_dict
 
 
+def _model_derivatives(amplitudes, phases, t):
+    """First and second derivatives of sum_k A_k sin(2 pi k t + phi_k)."""
+    k = 2. * np.pi * np.arange(1, len(amplitudes) + 1)
+    arg = np.multiply.outer(t, k) + phases
+    d1 = np.dot(np.cos(arg), amplitudes * k)
+    d2 = -np.dot(np.sin(arg), amplitudes * k**2)
+    return d1, d2
+
+
+def find_model_extremum(amplitudes, phases, x0, maximum=True, n_grid=512,
+                        tol=1e-12, max_iter=50):
+    """Local extremum of the periodic model sum_k A_k sin(2 pi k t + phi_k)
+    reached from `x0` by following the slope of the model (upwards for a
+    maximum, downwards for a minimum).
+
+    The derivative is evaluated on a grid of `n_grid` points per period in
+    the direction of ascent (descent), up to one period away from `x0`; the
+    first sign change brackets the extremum, which is then located by Newton
+    iterations safeguarded by bisection.
+
+    Parameters
+    ----------
+    amplitudes, phases : array_like
+        Amplitudes A_k and phases phi_k of the harmonics k = 1, 2, ...
+    x0 : float
+        Starting point.
+    maximum : bool, optional
+        Whether to find a maximum (default) or a minimum.
+
+    Returns
+    -------
+    float
+        Location of the extremum; `x0` if the model is constant.
+    """
+    amplitudes = np.asarray(amplitudes, dtype='float64')
+    phases = np.asarray(phases, dtype='float64')
+    sign = 1. if maximum else -1.
+
+    def slope(t):
+        d1, d2 = _model_derivatives(amplitudes, phases, t)
+        return sign * d1, sign * d2
+
+    g0 = slope(x0)[0]
+    if g0 == 0.:
+        return x0
+    direction = 1. if g0 > 0 else -1.
+    grid = x0 + direction * np.arange(1, n_grid + 1) / n_grid
+    g = slope(grid)[0]
+    crossings = np.flatnonzero(g <= 0 if g0 > 0 else g >= 0)
+    if len(crossings) == 0:  # constant model
+        return x0
+    i = crossings[0]
+    a = grid[i - 1] if i > 0 else x0
+    b = grid[i]
+    # The (signed) slope decreases through zero at the extremum
+    lo, hi = min(a, b), max(a, b)
+
+    x = 0.5 * (lo + hi)
+    for it in range(max_iter):
+        g_x, dg_x = slope(x)
+        if g_x > 0:
+            lo = x
+        else:
+            hi = x
+        step = -g_x / dg_x if dg_x != 0 else np.inf
+        x_new = x + step
+        if not min(lo, hi) < x_new < max(lo, hi):
+            x_new = 0.5 * (lo + hi)  # bisection fallback
+        if abs(x_new - x) < tol * max(1., abs(x)):
+            return x_new
+        x = x_new
+    return x
+
+
 def get_max_delta_mags(model):
     """Largest value minus second largest value of fitted Lomb Scargle model."""
     return model['max_delta_mags']
@@ -1,8 +1,9 @@
 import numpy as np
 from scipy.stats import norm
-from scipy.linalg import solveh_banded, cholesky_banded
 from scipy.special import gammaln, betainc, gammaincc
 
+from ._qso_model import tridiag_cholesky, tridiag_cholesky_batch
+
 
 # TODO duplicate
 def lprob2sigma(lprob):
@@ -61,16 +62,75 @@ def qso_engine(time,data,error,ltau=3.,lvar=-1.7,sys_err=0.,return_model=False):
         T = L^(-1)
         Data variance is D
         Full covariance C^(-1) = (L+D)^(-1) = T [T+D^(-1)]^(-1) D^(-1)
-        Code takes advantage of the tridiagonality of T and T+D^(-1).
+        Code takes advantage of the tridiagonality of T and T+D^(-1): the
+        factorization, solves, log-determinants and inverse diagonal are
+        computed in a single pass by `_qso_model.tridiag_cholesky`.
     """
+    system = _qso_system(time, data, error, ltau, lvar, sys_err)
+    if system is None:
+        return _qso_default_output()
+    _, (z, z0), ldet_Tp, Tpm = tridiag_cholesky(
+        system['Tp'], [system['wt'] * system['dat'], system['wt']])
+    ldet_T = tridiag_cholesky(system['T'])[2]
+    return _qso_statistics(system, z, z0, ldet_Tp, ldet_T, Tpm, data, error,
+                           return_model)
+
+
+def qso_engine_batch(times, data, errors, ltau=3., lvar=-1.7, sys_err=0.,
+                     return_model=False):
+    """`qso_engine` for many light curves at once.
+
+    The tridiagonal systems of all light curves are solved by a single call
+    of the compiled kernel `_qso_model.tridiag_cholesky_batch`.
+
+    Input:
+        times, data, errors - lists of arrays of measurement times, magnitudes
+                              and uncertainties (see `qso_engine`)
 
+    Output:
+        list of dictionaries (see `qso_engine`)
+    """
+    systems = [_qso_system(t, d, e, ltau, lvar, sys_err)
+               for t, d, e in zip(times, data, errors)]
+    valid = [system for system in systems if system is not None]
+    if valid:
+        offsets = np.cumsum([0] + [system['ln'] for system in valid])
+        _, (z, z0), ldet_Tp, Tpm = tridiag_cholesky_batch(
+            np.hstack([system['Tp'] for system in valid]),
+            [np.hstack([system['wt'] * system['dat'] for system in valid]),
+             np.hstack([system['wt'] for system in valid])], offsets)
+        ldet_T = tridiag_cholesky_batch(
+            np.hstack([system['T'] for system in valid]), None, offsets)[2]
+
+    out = []
+    i = 0
+    for system, d, e in zip(systems, data, errors):
+        if system is None:
+            out.append(_qso_default_output())
+            continue
+        cols = slice(offsets[i], offsets[i + 1])
+        out.append(_qso_statistics(system, z[cols], z0[cols], ldet_Tp[i],
+                                   ldet_T[i], Tpm[:, cols], d, e,
+                                   return_model))
+        i += 1
+    return out
+
+
+def _qso_default_output():
+    """Output of `qso_engine` for light curves with too few distinct times."""
     out_dict = {}
     out_dict['chi2_qso/nu']=999; out_dict['chi2_qso/nu_extra']=0.;
     out_dict['signif_qso']=0.; out_dict['signif_not_qso']=0.;  out_dict['signif_vary']=0.
     out_dict['chi2_qso/nu_NULL']=0.; out_dict['chi2/nu']=0.; out_dict['nu']=0
     out_dict['model']=[]; out_dict['dmodel']=[];
     out_dict['class']='ambiguous'
+    return out_dict
 
+
+def _qso_system(time, data, error, ltau, lvar, sys_err):
+    """Data, weights and tridiagonal matrices T, T+D^(-1) of `qso_engine`;
+    None if there are fewer than 2 distinct times.
+    """
     lvar0 = np.log10(0.5) + lvar + ltau
 
     ln = len(data)
@@ -80,10 +140,7 @@ def qso_engine(time,data,error,ltau=3.,lvar=-1.7,sys_err=0.,return_model=False):
     g = np.where(dt>0.)[0]; lg = len(g)
     # must have at least 2 data points
     if lg <= 0:
-        return out_dict
-
-    if return_model:
-        model = 1.*data; dmodel = -1.*error
+        return None
 
     if lg < ln:
       dt = dt[g]
@@ -91,14 +148,10 @@ def qso_engine(time,data,error,ltau=3.,lvar=-1.7,sys_err=0.,return_model=False):
       dat = data[gg]; wt = 1./(sys_err**2+error[gg]**2)
       ln = lg+1
     else:
+      gg = slice(None)
       dat = 1.*data
       wt = 1./(sys_err**2+error**2)
 
-    out_dict['nu'] = ln-1.
-    varx = np.var(dat)
-    dat0 = (dat * wt).sum() / wt.sum()
-    out_dict['chi2/nu'] = ((dat - dat0)**2 * wt).sum() / out_dict['nu']
-
     # define tridiagonal matrix T = L^(-1)
     # sparse matrix form: ab[u + i - j, j] == a[i,j]   i<=j, (here u=1)
     T = np.zeros((2,ln),dtype='float64')
@@ -110,23 +163,26 @@ def qso_engine(time,data,error,ltau=3.,lvar=-1.7,sys_err=0.,return_model=False):
     fac = np.exp(np.log(10)*lvar0)/T0
     Tp = 1.*T
     Tp[1,:] += wt*fac
-    # solve Tp*z=y for z (y=wt*dat)
-    # This works for scipy __version__>='0.9.0' on anathem (20120809)
-    b1 = (wt*dat).reshape((1,ln))
-    b2 = b1.T
-    #(Tpc,z) = solveh_banded(Tp,b2)
-    z = solveh_banded(Tp,b2)
-    Tpc = cholesky_banded(Tp) # the solveh_banded() function used to return the cholesky matrix, now we get seperately
-    z = z.T
-    z = z[0,:]
-    c1 = wt.reshape((1,ln))
-    c2 = c1.T
-    #(Tpc,z0) = solveh_banded(Tp,c2)
-    z0 = solveh_banded(Tp,c2)
-    #HAS NOT CHANGED#Tpc2 = cholesky_banded(Tp)
-    z0 = z0.T
-    z0 = z0[0,:]
 
+    return {'ln': ln, 'gg': gg, 'dat': dat, 'wt': wt, 'T': T, 'Tp': Tp}
+
+
+def _qso_statistics(system, z, z0, ldet_Tp, ldet_T, Tpm, data, error,
+                    return_model):
+    """Fit statistics of `qso_engine` from the solutions z, z0 of
+    Tp*z=wt*dat, Tp*z0=wt, the log-determinants of Tp and T and the
+    tridiagonal part Tpm of Tp^(-1).
+    """
+    out_dict = _qso_default_output()
+    ln, gg, dat, wt, T = (system[key] for key in ['ln', 'gg', 'dat', 'wt', 'T'])
+
+    if return_model:
+        model = 1.*data; dmodel = -1.*error
+
+    out_dict['nu'] = ln-1.
+    varx = np.var(dat)
+    dat0 = (dat * wt).sum() / wt.sum()
+    out_dict['chi2/nu'] = ((dat - dat0)**2 * wt).sum() / out_dict['nu']
 
     #finally, get u=T*z
     u = T[1,:]*z; u[1:] += T[0,1:]*z[:-1]; u[:-1] += T[0,1:]*z[1:]
@@ -141,15 +197,10 @@ def qso_engine(time,data,error,ltau=3.,lvar=-1.7,sys_err=0.,return_model=False):
     # -2*log(likelihood) = chi2_qso + ldet_C + log(u0sum)
     #   first term: use chi2_qso/nu for goodness of fit with fixed parameters;
     #   all terms: use chi2_qso/nu + chi2_qso/nu_extra for fitting with variable parameters
-    # get log of determinant for use later
-    Tc = cholesky_banded(T)
-    ldet_Tp = 2*np.log(Tpc[1,:]).sum()
-    ldet_T = 2*np.log(Tc[1,:]).sum()
     ldet_C = ldet_Tp-ldet_T-np.log(wt).sum()
     out_dict['chi2_qso/nu_extra'] = (ldet_C + np.log(u0sum))/out_dict['nu']
 
     # get trace of C^(-1) for significance calculation
-    Tpm = chol_inverse_diag(Tpc)
     diagC = T[1,:]*wt*Tpm[1,:]
     diagC[:-1] += T[0,1:]*wt[0:-1]*Tpm[0,1:]
     diagC[1:] += T[0,1:]*wt[1:]*Tpm[0,1:]
@@ -228,6 +279,33 @@ def qso_fit(time, data, error, filter='g', mag0=19., sys_err=0.0, return_model=F
     """
 
     data = data.copy() - np.median(data) + mag0
+    lvar, ltau = _qso_fit_params(filter, mag0)
+    adict = qso_engine(time, data, error, ltau=ltau, lvar=lvar, return_model=return_model, sys_err=sys_err)
+
+    return _qso_fit_output(adict, lvar, ltau, return_model)
+
+
+def qso_fit_batch(times, data, errors, filter='g', mag0=19., sys_err=0.0,
+                  return_model=False):
+    """`qso_fit` for many light curves at once, using `qso_engine_batch`.
+
+    Input:
+        times, data, errors - lists of arrays of measurement times, magnitudes
+                              and uncertainties (see `qso_fit`)
+
+    Output:
+        list of dictionaries (see `qso_fit`)
+    """
+    data = [d.copy() - np.median(d) + mag0 for d in data]
+    lvar, ltau = _qso_fit_params(filter, mag0)
+    adicts = qso_engine_batch(times, data, errors, ltau=ltau, lvar=lvar,
+                              return_model=return_model, sys_err=sys_err)
+    return [_qso_fit_output(adict, lvar, ltau, return_model)
+            for adict in adicts]
+
+
+def _qso_fit_params(filter, mag0):
+    """Model parameters (lvar, ltau) of `qso_fit` for the given filter."""
     pars={}
     pars['u'] = [-3.90, 0.12, 2.73, -0.02]
     pars['g'] = [-4.10, 0.14, 2.92, -0.07]
@@ -238,9 +316,11 @@ def qso_fit(time, data, error, filter='g', mag0=19., sys_err=0.0, return_model=F
     par = pars[filter.lower()]
     lvar = par[0]+par[1]*(mag0-19.)
     ltau = par[2]+par[3]*(mag0-19.)
+    return lvar, ltau
 
-    adict = qso_engine(time, data, error, ltau=ltau, lvar=lvar, return_model=return_model, sys_err=sys_err)
 
+def _qso_fit_output(adict, lvar, ltau, return_model):
+    """Output dictionary of `qso_fit` from the output of `qso_engine`."""
     out_dict={}
     out_dict['lvar']=lvar
     out_dict['ltau']=ltau
@@ -1,9 +1,17 @@
 import os
+import sys
 import numpy as np
 from Cython.Build import cythonize
 
 base_path = os.path.abspath(os.path.dirname(__file__))
 
+# The batched Lomb-Scargle kernel distributes series over an OpenMP thread
+# pool; without OpenMP it still runs (serially) with the GIL released.
+if sys.platform.startswith('linux'):
+    openmp_flags = ['-fopenmp']
+else:
+    openmp_flags = []
+
 
 def configuration(parent_package='', top_path=None):
     from numpy.distutils.misc_util import Configuration
@@ -12,6 +20,12 @@ def configuration(parent_package='', top_path=None):
     cythonize(os.path.join(base_path, '_lomb_scargle.pyx'))
 
     config.add_extension('_lomb_scargle', '_lomb_scargle.c',
+                         include_dirs=[np.get_include()],
+                         extra_compile_args=openmp_flags,
+                         extra_link_args=openmp_flags)
+
+    cythonize(os.path.join(base_path, '_qso_model.pyx'))
+    config.add_extension('_qso_model', '_qso_model.c',
                          include_dirs=[np.get_include()])
 
     return config
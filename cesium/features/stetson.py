@@ -25,21 +25,37 @@ def stetson_j(x, y=[], dx=0.1, dy=0.1):
     """
     n = len(x)
     x0 = stetson_mean(x, 1./dx**2)
-    delta_x = np.sqrt(n / (n - 1.)) * (x - x0) / dx
-
     if (len(y) > 0):
+        delta_x = np.sqrt(n / (n - 1.)) * (x - x0) / dx
         y0 = stetson_mean(y, 1./dy**2)
         delta_y = np.sqrt(n / (n - 1.)) * (y - y0) / dy
         p_k = delta_x * delta_y
+        return np.mean(np.sign(p_k) * np.sqrt(np.abs(p_k)))
     else:
-        p_k = delta_x**2 - 1.
+        return get_stetson_j(x, x0, dx)
+
 
+def get_stetson_j(x, x0, dx=0.1):
+    """Robust variance statistic for observations x with uncertainty dx.
+
+    Computed from the robust mean `x0` of `x` (see `stetson_mean`).
+    """
+    n = len(x)
+    delta_x = np.sqrt(n / (n - 1.)) * (x - x0) / dx
+    p_k = delta_x**2 - 1.
     return np.mean(np.sign(p_k) * np.sqrt(np.abs(p_k)))
 
 
 def stetson_k(x, dx=0.1):
     """A robust kurtosis statistic."""
+    return get_stetson_k(x, stetson_mean(x, 1./dx**2), dx)
+
+
+def get_stetson_k(x, x0, dx=0.1):
+    """A robust kurtosis statistic.
+
+    Computed from the robust mean `x0` of `x` (see `stetson_mean`).
+    """
     n = len(x)
-    x0 = stetson_mean(x, 1./dx**2)
     delta_x = np.sqrt(n / (n - 1.)) * (x - x0) / dx
     return 1. / 0.798 * np.mean(np.abs(delta_x)) / np.sqrt(np.mean(delta_x**2))
@@ -0,0 +1,54 @@
+import numpy as np
+import numpy.testing as npt
+
+from cesium.features import batch, stetson
+from cesium.features.batch import (BATCH_FEATS, generate_batch_features,
+                                   pack_rows)
+from cesium.features.tests.util import generate_features, irregular_random
+
+
+def test_pack_rows():
+    """Test packing of ragged arrays into a NaN-padded 2-d array."""
+    x = pack_rows([np.arange(3), np.arange(1)])
+    npt.assert_array_equal(x, [[0, 1, 2], [0, np.nan, np.nan]])
+
+
+def test_batch_features():
+    """Test that batch features match the single time series feature graph."""
+    all_series = [irregular_random(seed=i, size=size)
+                  for i, size in enumerate([50, 20, 101, 7])]
+    times, values, errors = zip(*all_series)
+    batch_values = generate_batch_features(times, values, errors, BATCH_FEATS)
+    for i, (t, m, e) in enumerate(all_series):
+        f = generate_features(t, m, e, BATCH_FEATS)
+        for feature in BATCH_FEATS:
+            npt.assert_allclose(batch_values[feature][i], f[feature],
+                                rtol=1e-10, err_msg=feature)
+
+
+def test_batch_features_float32():
+    """Test that single precision inputs give close double precision
+    features.
+    """
+    all_series = [irregular_random(seed=i, size=size)
+                  for i, size in enumerate([50, 20, 101, 7])]
+    times, values, errors = zip(*all_series)
+    batch_values = generate_batch_features(times, values, errors, BATCH_FEATS)
+    single = [[x.astype('float32') for x in xs]
+              for xs in (times, values, errors)]
+    batch_values32 = generate_batch_features(*single, BATCH_FEATS)
+    for feature in BATCH_FEATS:
+        npt.assert_allclose(batch_values32[feature], batch_values[feature],
+                            rtol=1e-4, atol=1e-4, err_msg=feature)
+
+
+def test_batch_stetson_mean():
+    """Test simultaneous iteration of Stetson means with early convergence."""
+    all_values = [irregular_random(seed=i, size=size)[1]
+                  for i, size in enumerate([50, 20, 101, 7])]
+    all_values.append(np.ones(10))  # converges immediately
+    x = pack_rows(all_values)
+    for nmax in [1, 3, 20]:
+        npt.assert_allclose(batch.stetson_mean(x, nmax=nmax),
+                            [stetson.stetson_mean(v, nmax=nmax)
+                             for v in all_values], rtol=1e-12)
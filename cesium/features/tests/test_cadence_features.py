@@ -5,6 +5,19 @@ from cesium.features import cadence_features as cf
 from cesium.features.tests.util import irregular_random
 
 
+def test_cad_probs():
+    """Test evaluation of cadence probabilities for all lags at once."""
+    times, values, errors = irregular_random(size=200)
+    cads = np.diff(times)
+    # Include ties with the tested lags, in days
+    cads[:10] = np.array(cf.CAD_PROB_TIMES)[:10] / (24.0 * 60.0)
+    probs = cf.cad_probs(cads)
+    assert sorted(probs) == sorted(cf.CAD_PROB_TIMES)
+    for time in cf.CAD_PROB_TIMES:
+        assert cf.get_cad_prob(probs, time) == cf.cad_prob(cads, time)
+    assert cf.cad_probs([], [1])[1] == cf.cad_prob([], 1)
+
+
 def test_delta_t_hist():
     """Test histogram of all time lags."""
     times, values, errors = irregular_random(500)
@@ -13,6 +26,12 @@ def test_delta_t_hist():
     bins = np.linspace(0, max(times) - min(times), nbins + 1)
     npt.assert_allclose(cf.delta_t_hist(times, nbins),
                         np.histogram(delta_ts, bins=bins)[0], atol=2)
+    npt.assert_array_equal(cf.delta_t_hist(times, nbins, method='exact'),
+                           np.histogram(delta_ts, bins=bins)[0])
+    npt.assert_array_equal(cf.delta_t_hist(times, nbins, method='fft'),
+                           cf.delta_t_hist(times, nbins, method='direct'))
+    npt.assert_array_equal(cf.delta_t_hist(times, 5, 4, method='fft'),
+                           cf.delta_t_hist(times, 5, 4, method='direct'))
 
 
 def test_normalize_hist():
@@ -46,6 +65,43 @@ def test_find_sorted_peaks():
     npt.assert_allclose(cf.find_sorted_peaks(x), np.array([[3, 5]]))
 
 
+def find_sorted_peaks_loop(x):
+    """Reference (loop-based) implementation of `find_sorted_peaks`."""
+    peak_inds = []
+    nbins = len(x)
+    for i in range(nbins):
+        if i == 0 or x[i] > x[i - 1]:  # Increasing from left
+            if i == nbins - 1 or x[i] > x[i + 1]:  # Increasing from right
+                peak_inds.append(i)
+            elif x[i] == x[i + 1]:  # Tied; check the next non-equal value
+                for j in range(i + 1, nbins):
+                    if x[j] != x[i]:
+                        if x[j] < x[i]:
+                            peak_inds.append(i)
+                        break
+                if j == nbins - 1 and x[i] == x[j]:  # Reached the end
+                    peak_inds.append(i)
+    sorted_peak_inds = sorted(peak_inds, key=lambda i: x[i], reverse=True)
+    return list(zip(sorted_peak_inds, x[sorted_peak_inds]))
+
+
+def test_find_sorted_peaks_random():
+    """Compare peak-finding to the loop-based implementation."""
+    state = np.random.RandomState(0)
+    for i in range(500):
+        size = state.randint(1, 20)
+        # Few distinct values, so that there are many plateaus and ties
+        x = state.randint(0, state.randint(1, 6), size).astype(float)
+        if state.rand() < 0.2:
+            x[state.randint(size)] = np.nan
+        npt.assert_equal(cf.find_sorted_peaks(x), find_sorted_peaks_loop(x))
+
+    x = state.randint(0, 4, (50, 12)).astype(float)
+    npt.assert_equal(cf.find_sorted_peaks(x), [find_sorted_peaks_loop(x_i)
+                                               for x_i in x])
+    assert cf.find_sorted_peaks(np.array([])) == []
+
+
 def test_peak_ratio():
     """ Test peak ratio method."""
     x = np.array([0, 5, 2, 3, 1])
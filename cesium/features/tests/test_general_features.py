@@ -212,6 +212,63 @@ def test_qso_features():
     npt.assert_allclose(f['qso_log_chi2nuNULL_chi2nu'], -0.456526327522)
 
 
+def test_tridiag_cholesky():
+    """Test single-pass tridiagonal solver against banded LAPACK routines."""
+    from scipy.linalg import cholesky_banded, solveh_banded
+    from cesium.features._qso_model import (tridiag_cholesky,
+                                            tridiag_cholesky_batch)
+    from cesium.features.qso_model import chol_inverse_diag
+
+    rng = np.random.RandomState(0)
+    systems = []
+    for n in [2, 3, 17, 50]:
+        ab = np.zeros((2, n))
+        ab[0, 1:] = rng.uniform(-1, 1, n - 1)
+        ab[1] = rng.uniform(2, 3, n)
+        rhs = rng.normal(size=(2, n))
+        systems.append((ab, rhs))
+
+        chol, x, logdet, inv_diag = tridiag_cholesky(ab, rhs)
+        chol_ref = cholesky_banded(ab)
+        npt.assert_allclose(chol, chol_ref, rtol=1e-12)
+        npt.assert_allclose(x, solveh_banded(ab, rhs.T).T, rtol=1e-10)
+        npt.assert_allclose(logdet, 2 * np.log(chol_ref[1]).sum(), rtol=1e-12)
+        inv_ref = chol_inverse_diag(chol_ref)
+        npt.assert_allclose(inv_diag[1], inv_ref[1], rtol=1e-10)
+        npt.assert_allclose(inv_diag[0, 1:], inv_ref[0, 1:], rtol=1e-10)
+
+    offsets = np.cumsum([0] + [ab.shape[1] for ab, rhs in systems])
+    chol, x, logdet, inv_diag = tridiag_cholesky_batch(
+        np.hstack([ab for ab, rhs in systems]),
+        np.hstack([rhs for ab, rhs in systems]), offsets)
+    for i, (ab, rhs) in enumerate(systems):
+        cols = slice(offsets[i], offsets[i + 1])
+        single = tridiag_cholesky(ab, rhs)
+        npt.assert_array_equal(chol[:, cols], single[0])
+        npt.assert_array_equal(x[:, cols], single[1])
+        npt.assert_array_equal(logdet[i], single[2])
+        npt.assert_array_equal(inv_diag[:, cols], single[3])
+
+
+def test_qso_fit_batch():
+    """Test that batched QSO model fits match individual fits."""
+    from cesium.features.qso_model import qso_fit, qso_fit_batch
+
+    all_series = [irregular_random(seed=i, size=size)
+                  for i, size in enumerate([50, 20, 101, 7])]
+    times, values, errors = zip(*all_series)
+    for fit, (t, m, e) in zip(qso_fit_batch(times, values, errors,
+                                            return_model=True), all_series):
+        expected = qso_fit(t, m, e, return_model=True)
+        assert fit.keys() == expected.keys()
+        for key in expected:
+            if key == 'class':
+                assert fit[key] == expected[key]
+            else:
+                npt.assert_allclose(fit[key], expected[key], rtol=1e-12,
+                                    err_msg=key)
+
+
 def test_skew():
     """Test statistical skew feature."""
     from scipy import stats
@@ -264,3 +321,26 @@ def test_weighted_average():
                                       ['percent_beyond_1_std'])
     npt.assert_equal(f['percent_beyond_1_std'],
                      np.mean(np.abs(stds_from_weighted_avg) > 1.))
+
+
+def test_flux_quantiles():
+    """Test that the flux percentile features computed from the shared flux
+    quantiles match separate percentile computations exactly.
+    """
+    times, values, errors = irregular_random()
+    feats = ['percent_amplitude', 'percent_difference_flux_percentile'] + [
+        'flux_percentile_ratio_mid{}'.format(r) for r in [20, 35, 50, 65, 80]]
+    f = generate_features(times, values, errors, feats)
+
+    y = 10 ** (-0.4 * values)
+    y_med = np.median(y)
+    npt.assert_equal(f['percent_amplitude'],
+                     max(abs((y.max() - y_med) / y_med),
+                         abs((y_med - y.min()) / y_med)))
+    npt.assert_equal(f['percent_difference_flux_percentile'],
+                     (np.percentile(y, 95) - np.percentile(y, 5)) / y_med)
+    for r in [20, 35, 50, 65, 80]:
+        npt.assert_equal(f['flux_percentile_ratio_mid{}'.format(r)],
+                         (np.percentile(y, 50 + r / 2.)
+                          - np.percentile(y, 50 - r / 2.))
+                         / (np.percentile(y, 95) - np.percentile(y, 5)))
@@ -1,10 +1,11 @@
 import os
 import numpy as np
 import numpy.testing as npt
+import pytest
 
 from cesium import data_management
 from cesium.features import graphs
-from cesium.features.tests.util import generate_features
+from cesium.features.tests.util import generate_features, irregular_random
 
 
 # Fixed set of features w/ known values
@@ -44,3 +45,35 @@ def test_feature_generation():
 
     npt.assert_equal(features_extracted, features_expected)
     npt.assert_array_almost_equal(values_computed, values_expected)
+
+
+def test_feature_plan():
+    """Test that a compiled feature plan matches the dask graph."""
+    t, m, e = irregular_random()
+    features_to_use = graphs.CADENCE_FEATS + ['amplitude', 'skew']
+    plan = graphs.compile_feature_plan(graphs.generate_dask_graph(None, None,
+                                                                  None),
+                                       features_to_use)
+    values = graphs.execute_feature_plan(plan, {'t': t, 'm': m, 'e': e})
+    expected = generate_features(t, m, e, features_to_use)
+    npt.assert_equal(values, [expected[f] for f in features_to_use])
+
+    # Only dependencies of the requested features are computed
+    plan = graphs.compile_feature_plan(graphs.dask_feature_graph,
+                                       ['cads_med'])
+    assert [task[0] for task in plan[0]] == ['cads', 'cads_med']
+
+
+def test_feature_plan_exceptions():
+    """Test that failed tasks propagate to dependent features."""
+    def raise_exc(x):
+        raise ValueError()
+    graph = {'t': None, 'bad': (raise_exc, 't'), 'worse': (len, 'bad'),
+             'good': (len, 't')}
+    plan = graphs.compile_feature_plan(graph, ['worse', 'good'])
+    worse, good = graphs.execute_feature_plan(plan, {'t': [1, 2]},
+                                              raise_exceptions=False)
+    assert isinstance(worse, Exception)
+    assert good == 2
+    with pytest.raises(ValueError):
+        graphs.execute_feature_plan(plan, {'t': [1, 2]})
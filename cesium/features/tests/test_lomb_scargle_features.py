@@ -1,7 +1,14 @@
+import os
+import dask
 import numpy as np
 import numpy.testing as npt
+import pytest
 
-from cesium.features import lomb_scargle
+from cesium import data_management
+from cesium.features import lomb_scargle, period_folding, periodic_model
+from cesium.features.lomb_scargle_fast import (fast_periodogram,
+                                               uniform_periodogram)
+from cesium.features import feature_graph_options, generate_dask_graph
 from cesium.features.graphs import LOMB_SCARGLE_FEATS
 from cesium.features.tests.util import (generate_features, irregular_random,
                                         regular_periodic, irregular_periodic)
@@ -10,6 +17,7 @@ from cesium.features.tests.util import (generate_features, irregular_random,
 # These values are chosen because they lie exactly on the grid of frequencies
 # searched by the Lomb Scargle optimization procedure
 WAVE_FREQS = np.array([5.3, 3.3, 2.1])
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
 
 
 def test_lomb_scargle_regular_single_freq():
@@ -229,3 +237,483 @@ def test_scatter_res_raw():
     value_mad = np.median(np.abs(values - np.median(values)))
     f = generate_features(times, values, errors, ['scatter_res_raw'])
     npt.assert_allclose(f['scatter_res_raw'], resid_mad / value_mad, atol=3e-2)
+
+
+def test_lomb_scargle_model_batch():
+    """Test that the batched Lomb-Scargle model matches the per-series fits."""
+    frequencies = WAVE_FREQS
+    amplitudes = np.zeros((len(frequencies),4))
+    amplitudes[:,0] = [4,2,1]
+    all_series = [irregular_random(seed=0), irregular_random(seed=1, size=30),
+                  irregular_periodic(frequencies, amplitudes, 0.1, size=101)]
+    times, values, errors = [list(x) for x in zip(*all_series)]
+    batch_models = lomb_scargle.lomb_scargle_model_batch(times, values, errors,
+                                                         n_jobs=2)
+    assert len(batch_models) == len(all_series)
+    for (t, m, e), batch_model in zip(all_series, batch_models):
+        model = lomb_scargle.lomb_scargle_model(t, m, e)
+        npt.assert_allclose(batch_model['varrat'], model['varrat'])
+        npt.assert_allclose(batch_model['trend'], model['trend'])
+        for batch_fit, fit in zip(batch_model['freq_fits'],
+                                  model['freq_fits']):
+            for key in ['freq', 'signif', 'lambda', 'amplitude', 'rel_phase',
+                        'model', 'model_error', 'resid']:
+                npt.assert_allclose(batch_fit[key], fit[key])
+
+
+def test_lomb_scargle_model_error():
+    """Test skipping the computation of the model uncertainties."""
+    times, values, errors = irregular_random()
+    model = lomb_scargle.lomb_scargle_model(times, values, errors)
+    model_no_error = lomb_scargle.lomb_scargle_model(times, values, errors,
+                                                     model_error=False)
+    for fit, fit_no_error in zip(model['freq_fits'],
+                                 model_no_error['freq_fits']):
+        assert fit['model_error'].shape == times.shape
+        assert np.all(fit['model_error'] > 0)
+        assert np.all(fit['trend_error'] > 0)
+        assert 'model_error' not in fit_no_error
+        assert 'trend_error' not in fit_no_error
+        for key in ['freq', 'signif', 'amplitude', 'rel_phase', 'model']:
+            npt.assert_array_equal(fit_no_error[key], fit[key])
+
+
+def test_lomb_scargle_model_error_reference(monkeypatch):
+    """Test the model uncertainties against the diagonals of the full
+    (ntime, ntime) covariance matrices, for the fits with (first frequency)
+    and without (other frequencies) a linear trend.
+    """
+    times, values, errors = irregular_random(size=60)
+    model = lomb_scargle.lomb_scargle_model(times, values, errors,
+                                            backend='scan')
+    monkeypatch.setattr(lomb_scargle, '_diag_quadratic_form',
+                        lambda X, A: np.diag(np.dot(X.T, np.dot(A, X))))
+    ref_model = lomb_scargle.lomb_scargle_model(times, values, errors,
+                                                backend='scan')
+    for fit, ref_fit in zip(model['freq_fits'], ref_model['freq_fits']):
+        for key in ['model_error', 'trend_error']:
+            npt.assert_allclose(fit[key], ref_fit[key], rtol=1e-12,
+                                err_msg=key)
+
+
+def test_trig_table_cache():
+    """Test sharing of Lomb-Scargle tables between series with identical
+    sampling.
+    """
+    times, values, errors = irregular_random()
+    cache = lomb_scargle.trig_table_cache
+    max_size = cache.max_size
+    try:
+        cache.clear()
+        cache.max_size = 0
+        expected = [lomb_scargle.lomb_scargle_model(times, values + i, errors)
+                    for i in range(2)]
+        assert len(cache) == 0
+
+        cache.max_size = max_size
+        models = [lomb_scargle.lomb_scargle_model(times, values + i, errors)
+                  for i in range(2)]
+        # One table and two detrending bases (orders 1 and 0)
+        assert len(cache) == 3
+        for model, expected_model in zip(models, expected):
+            for fit, expected_fit in zip(model['freq_fits'],
+                                         expected_model['freq_fits']):
+                for key in ['freq', 'amplitude', 'model', 'model_error']:
+                    npt.assert_array_equal(fit[key], expected_fit[key])
+
+        # Least recently used entries are evicted
+        cache.max_size = 2 * cache.size() // 3
+        lomb_scargle.lomb_scargle_model(1.01 * times, values, errors)
+        assert 0 < cache.size() <= cache.max_size
+    finally:
+        cache.max_size = max_size
+        cache.clear()
+
+
+def test_period_folding_reuse_freqs():
+    """Test period folding without rescanning for residual frequencies."""
+    frequencies = WAVE_FREQS
+    amplitudes = np.zeros((len(frequencies),4))
+    amplitudes[:,0] = [4,2,1]
+    times, values, errors = regular_periodic(frequencies, amplitudes, 0.1)
+    lomb_model = lomb_scargle.lomb_scargle_model(times, values, errors)
+
+    folded = period_folding.period_folding(times, values, errors, lomb_model)
+    folded_fixed = period_folding.period_folding(times, values, errors,
+                                                 lomb_model, rescan=False)
+    npt.assert_allclose(folded_fixed['folded_slopes'], folded['folded_slopes'])
+    npt.assert_allclose(period_folding.get_medperc90_2p_p(folded_fixed),
+                        period_folding.get_medperc90_2p_p(folded), rtol=1e-3)
+
+    slopes = period_folding.period_folded_slopes(times, values, errors,
+                                                 lomb_model)
+    npt.assert_allclose(slopes['folded_slopes'], folded['folded_slopes'])
+
+    # The residuals and slopes can share a single 2P fit
+    fit_2p = period_folding.period_folded_fit(times, values, errors,
+                                              lomb_model)
+    folded_shared = period_folding.period_folding(times, values, errors,
+                                                  lomb_model, fit_2p=fit_2p)
+    npt.assert_array_equal(folded_shared['2p_resid'], folded['2p_resid'])
+    slopes_shared = period_folding.period_folded_slopes(
+        times, values, errors, lomb_model, fit_2p=fit_2p)
+    npt.assert_array_equal(slopes_shared['folded_slopes'],
+                           slopes['folded_slopes'])
+
+
+def test_period_folding_graph(monkeypatch):
+    """Test that the period folding features share a single 2P fit, and
+    selecting the reuse of residual frequencies in the feature graph.
+    """
+    frequencies = WAVE_FREQS
+    amplitudes = np.zeros((len(frequencies),4))
+    amplitudes[:,0] = [4,2,1]
+    times, values, errors = regular_periodic(frequencies, amplitudes, 0.1)
+
+    def refit(*args, **kwargs):
+        raise AssertionError("2P model fit more than once")
+    # The graph node refers to the original function
+    monkeypatch.setattr(period_folding, 'period_folded_fit', refit)
+    features = ['medperc90_2p_p', 'fold2P_slope_10percentile',
+                'fold2P_slope_90percentile', '_lomb_model']
+    graph = generate_dask_graph(times, values, errors)
+    result = dict(zip(features, dask.get(graph, features)))
+    graph.update(feature_graph_options(rescan_residual_freqs=False))
+    result_fixed = dict(zip(features, dask.get(graph, features)))
+    monkeypatch.undo()
+
+    lomb_model = result['_lomb_model']
+    folded = period_folding.period_folding(times, values, errors, lomb_model)
+    npt.assert_allclose(result['medperc90_2p_p'],
+                        period_folding.get_medperc90_2p_p(folded))
+    for alpha in [10, 90]:
+        npt.assert_allclose(
+            result['fold2P_slope_{}percentile'.format(alpha)],
+            np.percentile(folded['folded_slopes'], alpha))
+    folded_fixed = period_folding.period_folding(times, values, errors,
+                                                 lomb_model, rescan=False)
+    npt.assert_allclose(result_fixed['medperc90_2p_p'],
+                        period_folding.get_medperc90_2p_p(folded_fixed))
+
+
+def test_fast_periodogram():
+    """Test the FFT-based periodogram against a direct evaluation of the
+    single-harmonic periodogram computed by the frequency scan.
+    """
+    state = np.random.RandomState(0)
+    times = np.sort(state.uniform(0, 100, 200))
+    values = np.sin(2*np.pi*times*1.7) + state.normal(0, 0.5, 200)
+    errors = state.exponential(0.1, 200)
+    f0, df, numf = lomb_scargle._frequency_grid(times)
+    fit = lomb_scargle._setup_fit(times, values, errors, f0, df, 8, 6., 1,
+                                  10., 1., [-8, 6])
+    cn, wth = fit['cn'], fit['wth']
+
+    phase = 2*np.pi*np.outer(f0 + df*np.arange(numf), times)
+    sinx, cosx = np.sin(phase)*wth[0], np.cos(phase)*wth[0]
+    st, ct = np.dot(sinx, wth.T), np.dot(cosx, wth.T)
+    cs = (sinx*cosx).sum(1) - (st*ct).sum(1)
+    s2 = 1 - (cosx**2).sum(1) - (st**2).sum(1)
+    c2 = (cosx**2).sum(1) - (ct**2).sum(1)
+    sh, ch = np.dot(sinx, cn), np.dot(cosx, cn)
+    psd = (c2*sh**2 - 2*cs*ch*sh + s2*ch**2) / (c2*s2 - cs**2)
+
+    fast_psd = fast_periodogram(times, cn, wth, f0, df, numf)
+    npt.assert_allclose(fast_psd, psd, atol=2e-2*psd.max())
+    assert fast_psd.argmax() == psd.argmax()
+
+
+def test_lomb_scargle_fft_backend():
+    """Test that refining the peaks of the FFT-based periodogram reproduces
+    the exhaustive frequency scan.
+    """
+    frequencies = WAVE_FREQS
+    amplitudes = np.zeros((len(frequencies),4))
+    amplitudes[:,0] = [4,2,1]
+    for times, values, errors in [
+            irregular_periodic(frequencies, amplitudes, 0.1),
+            regular_periodic(frequencies, amplitudes, 0.1),
+            irregular_random()]:
+        model = lomb_scargle.lomb_scargle_model(times, values, errors)
+        fast_model = lomb_scargle.lomb_scargle_model(times, values, errors,
+                                                     backend='fft')
+        for fast_fit, fit in zip(fast_model['freq_fits'], model['freq_fits']):
+            for key in ['freq', 'signif', 'amplitude', 'rel_phase']:
+                npt.assert_allclose(fast_fit[key], fit[key], rtol=1e-6,
+                                    atol=1e-8)
+
+
+def test_uniform_periodogram():
+    """Test the chirp-z periodogram for evenly sampled data against a direct
+    evaluation of the single-harmonic periodogram.
+    """
+    frequencies = WAVE_FREQS
+    amplitudes = np.zeros((len(frequencies),4))
+    amplitudes[:,0] = [4,2,1]
+    times, values, errors = regular_periodic(frequencies, amplitudes, 0.1)
+    values = values + np.random.RandomState(0).normal(0, 0.5, len(times))
+    f0, df, numf = lomb_scargle._frequency_grid(times)
+    fit = lomb_scargle._setup_fit(times, values, errors, f0, df, 8, 6., 1,
+                                  10., 1., [-8, 6])
+    cn, wth = fit['cn'], fit['wth']
+
+    phase = 2*np.pi*np.outer(f0 + df*np.arange(numf), times)
+    sinx, cosx = np.sin(phase)*wth[0], np.cos(phase)*wth[0]
+    st, ct = np.dot(sinx, wth.T), np.dot(cosx, wth.T)
+    cs = (sinx*cosx).sum(1) - (st*ct).sum(1)
+    s2 = 1 - (cosx**2).sum(1) - (st**2).sum(1)
+    c2 = (cosx**2).sum(1) - (ct**2).sum(1)
+    sh, ch = np.dot(sinx, cn), np.dot(cosx, cn)
+    psd = (c2*sh**2 - 2*cs*ch*sh + s2*ch**2) / (c2*s2 - cs**2)
+
+    npt.assert_allclose(uniform_periodogram(times, cn, wth, f0, df, numf),
+                        psd, rtol=1e-8, atol=1e-10*psd.max())
+
+
+def test_lomb_scargle_uniform_backend():
+    """Test that the automatic FFT path for evenly sampled data reproduces the
+    exhaustive frequency scan, and that irregular data uses the scan.
+    """
+    frequencies = WAVE_FREQS
+    amplitudes = np.zeros((len(frequencies),4))
+    amplitudes[:,0] = [4,2,1]
+    all_data = [regular_periodic(frequencies, amplitudes, 0.1),
+                regular_periodic(frequencies, amplitudes, 1.3, size=2001)]
+    times, values, errors = regular_periodic(frequencies, amplitudes, 0.6)
+    noise = np.random.RandomState(0).normal(0, 0.5, len(times))
+    all_data.append((times, values + noise, errors))
+    for times, values, errors in all_data:
+        assert lomb_scargle._is_evenly_spaced(times)
+        model = lomb_scargle.lomb_scargle_model(times, values, errors,
+                                                backend='scan')
+        fast_model = lomb_scargle.lomb_scargle_model(times, values, errors)
+        for fast_fit, fit in zip(fast_model['freq_fits'], model['freq_fits']):
+            for key in ['freq', 'signif', 'amplitude', 'rel_phase', 'model']:
+                npt.assert_allclose(fast_fit[key], fit[key], rtol=1e-6,
+                                    atol=1e-8, err_msg=key)
+
+    times, values, errors = irregular_periodic(frequencies, amplitudes, 0.1)
+    assert not lomb_scargle._is_evenly_spaced(times)
+    model = lomb_scargle.lomb_scargle_model(times, values, errors,
+                                            backend='scan')
+    auto_model = lomb_scargle.lomb_scargle_model(times, values, errors)
+    for auto_fit, fit in zip(auto_model['freq_fits'], model['freq_fits']):
+        npt.assert_array_equal(auto_fit['psd'], fit['psd'])
+
+
+def test_lomb_scargle_uniform_backend_aliased():
+    """Test that evenly sampled data whose frequency grid extends beyond the
+    Nyquist frequency uses the exhaustive scan, and that the fit of candidate
+    backends does not depend on the scale of the approximate periodogram.
+    """
+    frequencies = WAVE_FREQS
+    amplitudes = np.zeros((len(frequencies),4))
+    amplitudes[:,0] = [4,2,1]
+    for size in [31, 51, 61]:
+        times, values, errors = regular_periodic(frequencies, amplitudes, 0.1,
+                                                 size=size)
+        assert lomb_scargle._nyquist_frequency(times) < 33.
+        model = lomb_scargle.lomb_scargle_model(times, values, errors,
+                                                backend='scan')
+        auto_model = lomb_scargle.lomb_scargle_model(times, values, errors)
+        for auto_fit, fit in zip(auto_model['freq_fits'],
+                                 model['freq_fits']):
+            npt.assert_array_equal(auto_fit['psd'], fit['psd'])
+
+        def scaled_periodogram(*args):
+            return 1e3 * uniform_periodogram(*args)
+        f0, df, numf = lomb_scargle._frequency_grid(times)
+        fit = lomb_scargle.fit_lomb_scargle(times, values, errors, f0, df,
+                                            numf, backend='uniform')
+        scaled_fit = lomb_scargle.fit_lomb_scargle(times, values, errors, f0,
+                                                   df, numf,
+                                                   backend=scaled_periodogram)
+        for key in ['freq', 'chi2', 'psd', 'model']:
+            npt.assert_allclose(scaled_fit[key], fit[key], rtol=1e-10,
+                                err_msg=key)
+
+
+def test_coarse_to_fine_periodogram():
+    """Test that the coarse-to-fine periodogram recovers the highest peaks of
+    the exhaustive scan, and that refining its peaks reproduces the exhaustive
+    scan of an oversampled frequency grid.
+    """
+    frequencies = WAVE_FREQS
+    amplitudes = np.zeros((len(frequencies),4))
+    amplitudes[:,0] = [4,2,1]
+    all_data = [irregular_periodic(frequencies, amplitudes, 0.1)]
+    for fname in ['245486.dat', '257141.dat']:
+        all_data.append(data_management.parse_ts_data(
+            os.path.join(DATA_DIR, fname)))
+
+    for times, values, errors in all_data[1:]:
+        times = times - times.min()
+        f0, df, numf = lomb_scargle._frequency_grid(times, fmax=10.,
+                                                    oversampling=5.)
+        fit = lomb_scargle._setup_fit(times, values, errors, f0, df, 8, 6.,
+                                      1, 10., 1., [-8, 6])
+        psd = lomb_scargle.coarse_to_fine_periodogram(
+            times, fit['cn'], fit['wth'], f0, df, numf, decimation=1,
+            n_peaks=numf)
+        coarse_psd = lomb_scargle.coarse_to_fine_periodogram(
+            times, fit['cn'], fit['wth'], f0, df, numf, decimation=5)
+        assert np.count_nonzero(coarse_psd) < numf / 2
+        peaks = lomb_scargle._top_peaks(psd, 10)
+        npt.assert_allclose(coarse_psd[peaks], psd[peaks], rtol=1e-10)
+
+    for times, values, errors in all_data:
+        model = lomb_scargle.lomb_scargle_model(times, values, errors,
+                                                backend='scan', fmax=10.,
+                                                oversampling=5.)
+        coarse_model = lomb_scargle.lomb_scargle_model(
+            times, values, errors, backend='coarse', fmax=10.,
+            oversampling=5.)
+        for coarse_fit, fit in zip(coarse_model['freq_fits'],
+                                   model['freq_fits']):
+            for key in ['freq', 'signif', 'amplitude', 'rel_phase']:
+                npt.assert_allclose(coarse_fit[key], fit[key], rtol=1e-6,
+                                    atol=1e-8, err_msg=key)
+
+
+def test_lomb_scargle_float32():
+    """Test that the single precision frequency scan reproduces the double
+    precision periodogram, and that float32 inputs give the same model as the
+    double precision scan.
+    """
+    for fname in ['245486.dat', '257141.dat']:
+        times, values, errors = data_management.parse_ts_data(
+            os.path.join(DATA_DIR, fname))
+        times = times - times.min()
+        f0, df, numf = lomb_scargle._frequency_grid(times)
+        fit = lomb_scargle._setup_fit(times, values, errors, f0, df, 8, 6.,
+                                      1, 10., 1., [-8, 6])
+        psd = lomb_scargle.coarse_to_fine_periodogram(
+            times, fit['cn'], fit['wth'], f0, df, numf, decimation=1,
+            n_peaks=numf)
+        psd32 = lomb_scargle.coarse_to_fine_periodogram(
+            times, fit['cn'], fit['wth'], f0, df, numf, decimation=1,
+            n_peaks=numf, dtype='float32')
+        assert psd32.dtype == np.float64
+        # (nearly) degenerate frequencies may be zeroed in only one of them
+        nonzero = (psd > 0) & (psd32 > 0)
+        assert np.count_nonzero((psd > 0) != (psd32 > 0)) < 1e-4 * numf
+        npt.assert_allclose(psd32[nonzero], psd[nonzero],
+                            atol=1e-4 * psd.max())
+        npt.assert_array_equal(lomb_scargle._top_peaks(psd32, 10),
+                               lomb_scargle._top_peaks(psd, 10))
+
+        model = lomb_scargle.lomb_scargle_model(times, values, errors,
+                                                backend='scan')
+        # The single precision scan refines the same frequencies in double
+        # precision
+        model32 = lomb_scargle.lomb_scargle_model(
+            times.astype('float32'), values.astype('float32'),
+            errors.astype('float32'))
+        model64 = lomb_scargle.lomb_scargle_model(times, values, errors,
+                                                  dtype='float32')
+        for fit32, fit64, fit in zip(model32['freq_fits'],
+                                     model64['freq_fits'],
+                                     model['freq_fits']):
+            npt.assert_allclose(fit32['freq'], fit['freq'], rtol=1e-6)
+            for key in ['freq', 'signif', 'amplitude', 'rel_phase']:
+                npt.assert_allclose(fit64[key], fit[key], rtol=1e-8,
+                                    atol=1e-12, err_msg=key)
+
+
+def test_frequency_grid():
+    """Test the parameters of the searched frequency grid."""
+    times = np.linspace(0, 10, 101)
+    f0, df, numf = lomb_scargle._frequency_grid(times)
+    npt.assert_allclose([f0, df], [0.1, 0.08])
+    assert numf == int((33. - f0) / df)
+    f0, df, numf = lomb_scargle._frequency_grid(times, fmax=5.,
+                                                oversampling=4.)
+    npt.assert_allclose([f0, df], [0.1, 0.025])
+    assert numf == 196
+
+    model = lomb_scargle.lomb_scargle_model(times, np.sin(times), 0.1 + 0*times,
+                                            nfreq=1, fmax=5., oversampling=4.)
+    assert (model['f0'], model['df'], model['numf']) == (f0, df, numf)
+
+
+def test_periodic_model_analytic():
+    """Test that the analytic extremum search matches Nelder-Mead."""
+    frequencies = WAVE_FREQS
+    amplitudes = np.zeros((len(frequencies),4))
+    amplitudes[:,:] = [[4,2,1,0.5], [2,1,0.5,0.25], [1,0.5,0.25,0.1]]
+    all_data = [irregular_periodic(frequencies, amplitudes, 0.1),
+                regular_periodic(frequencies, amplitudes, 0.3),
+                irregular_random()]
+    for fname in ['257141', '245486', '247327']:
+        all_data.append(data_management.parse_ts_data(
+            os.path.join(DATA_DIR, '{}.dat'.format(fname))))
+
+    for data in all_data:
+        model = lomb_scargle.lomb_scargle_model(*data)
+        expected = periodic_model.periodic_model(model, engine='fmin')
+        result = periodic_model.periodic_model(model, engine='analytic')
+        for key in ['phi1_phi2', 'min_delta_mags', 'max_delta_mags']:
+            npt.assert_allclose(result[key], expected[key], atol=1e-4,
+                                err_msg=key)
+
+
+def test_periodic_model_degenerate():
+    """Test that only the analytic engine moves on to the next extremum."""
+    A = np.zeros(8)
+    ph = np.zeros(8)
+    A[:2] = [0.65, 0.25]
+    ph[:2] = [-0.2, -1.6]
+    model = {'freq_fits': [{'amplitude': A, 'rel_phase': ph}]}
+    # Nelder-Mead steps back to the extrema it started from
+    result = periodic_model.periodic_model(model, engine='fmin')
+    npt.assert_allclose(result['min_delta_mags'], 0., atol=1e-6)
+    npt.assert_allclose(result['max_delta_mags'], 0., atol=1e-6)
+    result = periodic_model.periodic_model(model, engine='analytic')
+    npt.assert_allclose(result['min_delta_mags'], 1.260831, rtol=1e-6)
+    npt.assert_allclose(result['max_delta_mags'], 0.181035, rtol=1e-5)
+
+
+def test_periodic_model_graph_option():
+    """Test selecting the periodic model engine in the feature graph."""
+    assert feature_graph_options() == {}
+    times, values, errors = irregular_periodic(WAVE_FREQS, np.ones((3, 4)),
+                                               0.1)
+    graph = generate_dask_graph(times, values, errors)
+    graph.update(feature_graph_options(periodic_model_engine='analytic'))
+    features = ['freq_model_max_delta_mags', 'freq_model_min_delta_mags',
+                'freq_model_phi1_phi2', '_lomb_model']
+    result = dict(zip(features, dask.get(graph, features)))
+    expected = periodic_model.periodic_model(result['_lomb_model'],
+                                             engine='analytic')
+    npt.assert_allclose(result['freq_model_max_delta_mags'],
+                        expected['max_delta_mags'])
+    npt.assert_allclose(result['freq_model_min_delta_mags'],
+                        expected['min_delta_mags'])
+    npt.assert_allclose(result['freq_model_phi1_phi2'], expected['phi1_phi2'])
+    with pytest.raises(ValueError):
+        feature_graph_options(periodic_model_engine='newton')
+
+
+def test_find_model_extremum():
+    """Test that extrema are reached by following the slope of the model."""
+    state = np.random.RandomState(0)
+    t = np.linspace(-1, 1, 20001)
+    for i in range(20):
+        A = state.normal(size=8) / np.arange(1, 9)**2
+        ph = state.uniform(-np.pi, np.pi, 8)
+        x0 = state.uniform(0, 1)
+        for maximum in [True, False]:
+            x = periodic_model.find_model_extremum(A, ph, x0, maximum)
+            d1, d2 = periodic_model._model_derivatives(A, ph, x)
+            npt.assert_allclose(d1, 0., atol=1e-8)
+            assert (d2 < 0) == maximum
+            # Model is monotonic between starting point and extremum
+            sign = 1. if maximum else -1.
+            between = np.linspace(min(x0, x), max(x0, x), 1001)[1:-1]
+            slopes = sign * periodic_model._model_derivatives(A, ph,
+                                                              between)[0]
+            assert np.all(slopes * np.sign(x - x0) >= 0)
+
+    # Constant model
+    assert periodic_model.find_model_extremum(np.zeros(8), np.zeros(8),
+                                              0.05) == 0.05
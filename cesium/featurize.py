@@ -1,24 +1,36 @@
 import copy
+import functools
+import itertools
+import multiprocessing
+import os
+import shutil
+import tempfile
 from collections import Iterable
 import numpy as np
 import pandas as pd
 import dask
 import dask.threaded
 from dask import delayed
-from dask.compatibility import reraise
-from dask.threaded import pack_exception
 from sklearn.preprocessing import Imputer
 
-from . import time_series
+from . import data_management, time_series
 from .time_series import TimeSeries
-from .features import generate_dask_graph
+from dask.core import get_dependencies
+
+from .features import (generate_dask_graph, compile_feature_plan,
+                       execute_feature_plan, dask_feature_graph)
+from .cache import FeatureCache
+from .features.batch import (BATCH_FEATS, batch_feature_graph,
+                             generate_batch_features)
 
 __all__ = ['featurize_time_series', 'featurize_single_ts',
-           'featurize_ts_files', 'assemble_featureset']
+           'featurize_batch', 'featurize_process_pool', 'featurize_ts_files',
+           'featurize_iter', 'assemble_featureset']
 
 
 def featurize_single_ts(ts, features_to_use, custom_script_path=None,
-                        custom_functions=None, raise_exceptions=True):
+                        custom_functions=None, raise_exceptions=True,
+                        cache=None):
     """Compute feature values for a given single time-series. Data is
     returned as dictionaries/lists of lists.
 
@@ -40,6 +52,12 @@ def featurize_single_ts(ts, features_to_use, custom_script_path=None,
         If True, exceptions during feature computation are raised immediately;
         if False, exceptions are supressed and `np.nan` is returned for the
         given feature and any dependent features. Defaults to True.
+    cache : FeatureCache or str, optional
+        Persistent feature cache (or path to its database file); features
+        found in the cache are not recomputed, and newly computed values are
+        added to it. Custom features and any features that depend on entries
+        of a custom dask graph are neither read from nor added to the cache.
+        Defaults to None.
 
     Returns
     -------
@@ -47,36 +65,435 @@ def featurize_single_ts(ts, features_to_use, custom_script_path=None,
         Dictionary with feature names as keys, lists of feature values (one per
         channel) as values.
     """
+    custom_graph = {}
+    custom_calls = {}
+    if custom_functions:
+        # If values in custom_functions are functions, add calls to graph
+        if all(hasattr(v, '__call__') for v in custom_functions.values()):
+            custom_calls = custom_functions
+            custom_graph = {feat: None for feat in custom_functions}
+        # Otherwise, custom_functions is another dask graph
+        else:
+            custom_graph = custom_functions
+
+    if custom_graph and not custom_calls:
+        # A custom dask graph can change the dependencies of any feature, so
+        # the plan is compiled for each call
+        graph_key = None
+        feature_graph = generate_dask_graph(None, None, None)
+        feature_graph.update(ts.meta_features)
+        feature_graph.update(custom_graph)
+    else:
+        graph_key = (tuple(ts.meta_features), tuple(custom_graph))
+        feature_graph = _placeholder_graph(*graph_key)
+
+    cached = {}
+    uncacheable = set()
+    if cache is not None:
+        if isinstance(cache, str):
+            cache = FeatureCache(cache)
+        # The custom graph is not part of the cache key, so neither custom
+        # features nor any values computed from them (e.g., built-in features
+        # of an overridden '_lomb_model') are cached
+        if custom_graph:
+            uncacheable = _dependents(feature_graph, custom_graph)
+        cache_key = cache.key(ts)
+        cached = cache.get(cache_key, [f for f in list(features_to_use)
+                                       + list(cache.intermediates)
+                                       if f not in uncacheable])
+    missing = [f for f in features_to_use if f not in cached]
+    cached_intermediates = [k for k in cached if k not in features_to_use]
+    intermediates = []
+    if cache is not None:
+        intermediates = [k for k in cache.intermediates
+                         if k not in uncacheable]
+
+    # The graph has the same structure for all channels (and for all time
+    # series with the same meta-features), so the features' dependencies are
+    # only resolved once
+    if graph_key is None:
+        plan, new_intermediates = _compile_plan(feature_graph, missing,
+                                                cached_intermediates,
+                                                intermediates)
+    else:
+        plan, new_intermediates = _memoized_plan(graph_key, tuple(missing),
+                                                 tuple(cached_intermediates),
+                                                 tuple(intermediates))
+    new_values = {k: [] for k in missing + new_intermediates
+                  if k not in uncacheable}
+
     # Initialize empty feature array for all channels
     feature_values = np.empty((len(features_to_use), ts.n_channels))
     for (t_i, m_i, e_i), i in zip(ts.channels(), range(ts.n_channels)):
-        feature_graph = generate_dask_graph(t_i, m_i, e_i)
-        feature_graph.update(ts.meta_features)
-
-        if custom_functions:
-            # If values in custom_functions are functions, add calls to graph
-            if all(hasattr(v, '__call__') for v in custom_functions.values()):
-                feature_graph.update({feat: f(t_i, m_i, e_i)
-                                      for feat, f in custom_functions.items()})
-            # Otherwise, custom_functions is another dask graph
-            else:
-                feature_graph.update(custom_functions)
+        inputs = {'t': t_i, 'm': m_i, 'e': e_i}
+        inputs.update(ts.meta_features)
+        inputs.update(custom_graph)
+        inputs.update({feat: f(t_i, m_i, e_i)
+                       for feat, f in custom_calls.items()})
+        inputs.update({k: cached[k][i] for k in cached_intermediates})
 
         # Do not execute in parallel; parallelization has already taken place
         # at the level of time series, so we compute features for a single time
         # series in serial.
-        if raise_exceptions:
-            raise_callback = reraise
-        else:
-            raise_callback = lambda e, tb: None
-        dask_values = dask.get(feature_graph, features_to_use,
-                               raise_exception=raise_callback,
-                               pack_exception=pack_exception)
-        feature_values[:, i] = [x if not isinstance(x, Exception) else np.nan
-                                for x in dask_values]
-    index = pd.MultiIndex.from_product((features_to_use, range(ts.n_channels)),
-                                       names=('feature', 'channel'))
-    return pd.Series(feature_values.ravel(), index=index)
+        values = dict(zip(missing + new_intermediates,
+                          execute_feature_plan(plan, inputs,
+                                               raise_exceptions)))
+        for k in new_values:
+            new_values[k].append(values[k])
+        values.update({f: cached[f][i] for f in features_to_use
+                       if f in cached})
+        feature_values[:, i] = [values[f] if not isinstance(values[f],
+                                                            Exception)
+                                else np.nan for f in features_to_use]
+
+    if cache is not None:
+        # Failed computations are not cached
+        cache.put(cache_key, {k: v for k, v in new_values.items()
+                              if not any(isinstance(x, Exception)
+                                         for x in v)})
+    return pd.Series(feature_values.ravel(),
+                     index=_feature_index(tuple(features_to_use),
+                                          ts.n_channels))
+
+
+@functools.lru_cache(maxsize=32)
+def _placeholder_graph(meta_feature_names, custom_feature_names):
+    """Feature graph of `featurize_single_ts` for time series with the given
+    meta-features and custom feature functions (which are supplied as
+    inputs); cached, and must not be modified.
+    """
+    feature_graph = generate_dask_graph(None, None, None)
+    feature_graph.update({k: None for k in meta_feature_names
+                          + custom_feature_names})
+    return feature_graph
+
+
+def _compile_plan(feature_graph, missing, cached_intermediates,
+                  intermediates):
+    """Plan of `featurize_single_ts` for the features `missing`, given the
+    values of `cached_intermediates`, which also computes (and returns the
+    names of) those of the `intermediates` that the features depend on.
+    """
+    if cached_intermediates:
+        feature_graph = dict(feature_graph)
+        feature_graph.update({k: None for k in cached_intermediates})
+    plan = compile_feature_plan(feature_graph, list(missing))
+    planned = {task[0] for task in plan[0]}
+    new_intermediates = [k for k in intermediates
+                         if k in planned and k not in missing]
+    if new_intermediates:
+        plan = compile_feature_plan(feature_graph,
+                                    list(missing) + new_intermediates)
+    return plan, new_intermediates
+
+
+def _memoized_plan(graph_key, missing, cached_intermediates, intermediates):
+    """`_compile_plan` for `_placeholder_graph(*graph_key)`, compiled once per
+    set of arguments. Plans are recompiled if an entry of
+    `features.graphs.dask_feature_graph` that they use has been replaced.
+    """
+    plan, new_intermediates, tasks = _memoized_plan_tasks(
+        graph_key, missing, cached_intermediates, intermediates)
+    if any(dask_feature_graph.get(k) is not task for k, task in tasks):
+        _placeholder_graph.cache_clear()
+        _memoized_plan_tasks.cache_clear()
+        plan, new_intermediates, tasks = _memoized_plan_tasks(
+            graph_key, missing, cached_intermediates, intermediates)
+    return plan, new_intermediates
+
+
+@functools.lru_cache(maxsize=256)
+def _memoized_plan_tasks(graph_key, missing, cached_intermediates,
+                         intermediates):
+    """Output of `_compile_plan` and the graph entries it was compiled from,
+    cached for `_memoized_plan`.
+    """
+    feature_graph = _placeholder_graph(*graph_key)
+    plan, new_intermediates = _compile_plan(feature_graph, missing,
+                                            cached_intermediates,
+                                            intermediates)
+    tasks = tuple((task[0], feature_graph[task[0]]) for task in plan[0]
+                  if task[0] in dask_feature_graph)
+    return plan, new_intermediates, tasks
+
+
+def _dependents(graph, keys):
+    """Keys of the dask `graph` that are, or (transitively) depend on, any of
+    `keys`.
+    """
+    dependents = {}
+    for key in graph:
+        for dep in get_dependencies(graph, key):
+            dependents.setdefault(dep, []).append(key)
+    found = set()
+    stack = [key for key in keys if key in graph]
+    while stack:
+        key = stack.pop()
+        if key not in found:
+            found.add(key)
+            stack.extend(dependents.get(key, []))
+    return found
+
+
+def featurize_batch(time_series, features_to_use, raise_exceptions=True):
+    """Compute vectorizable feature values (see `features.batch.BATCH_FEATS`)
+    for a list of time series at once.
+
+    Each channel of all time series is packed into a single NaN-padded 2-d
+    array, so that every feature is computed for the whole collection by a
+    few NumPy reductions instead of one task per time series.
+
+    Parameters
+    ----------
+    time_series : list of TimeSeries objects
+        Time series to be featurized.
+    features_to_use : list of str
+        List of feature names to be generated; must be in `BATCH_FEATS`.
+    raise_exceptions : bool, optional
+        If True, exceptions during feature computation are raised immediately;
+        if False, exceptions are suppressed and `np.nan` is returned for the
+        given feature (and any dependent features) of all time series in the
+        batch. Defaults to True.
+
+    Returns
+    -------
+    list of pd.Series
+        Feature values for each time series, in the format returned by
+        `featurize_single_ts`.
+    """
+    n_channels = max([ts.n_channels for ts in time_series], default=0)
+    feature_values = np.full((len(time_series), len(features_to_use),
+                              n_channels), np.nan)
+    for i in range(n_channels):
+        rows = [j for j, ts in enumerate(time_series) if ts.n_channels > i]
+        t, m, e = zip(*[list(time_series[j].channels())[i] for j in rows])
+        try:
+            batch_values = generate_batch_features(
+                t, m, e, features_to_use, raise_exceptions=raise_exceptions)
+        except Exception:
+            if raise_exceptions:
+                raise
+            continue
+        for k, feature in enumerate(features_to_use):
+            if not isinstance(batch_values[feature], Exception):
+                feature_values[rows, k, i] = batch_values[feature]
+
+    return [pd.Series(values[:, :ts.n_channels].ravel(),
+                      index=_feature_index(tuple(features_to_use),
+                                           ts.n_channels))
+            for ts, values in zip(time_series, feature_values)]
+
+
+@functools.lru_cache(maxsize=32)
+def _feature_index(features_to_use, n_channels):
+    """(feature, channel) index of the values returned by
+    `featurize_single_ts`; cached since it is the same for most time series.
+    """
+    return pd.MultiIndex.from_product((features_to_use, range(n_channels)),
+                                      names=('feature', 'channel'))
+
+
+def featurize_process_pool(time_series, features_to_use,
+                           custom_script_path=None, custom_functions=None,
+                           raise_exceptions=True, n_jobs=None, cache=None):
+    """Compute feature values for a list of time series in a pool of worker
+    processes.
+
+    Rather than pickling each `TimeSeries` and its features through a pipe,
+    the arrays of all time series are written once to a memory-mapped
+    scratch file (in shared memory, i.e. /dev/shm, if available); workers
+    receive only the offsets of each time series and write its feature
+    values directly into a preallocated memory-mapped output matrix.
+
+    Worker processes are forked, so `custom_functions` need not be picklable
+    on platforms that support the 'fork' start method.
+
+    Parameters
+    ----------
+    time_series : list of TimeSeries objects
+        Time series to be featurized.
+    features_to_use : list of str
+        List of feature names to be generated.
+    custom_script_path : str, optional
+        Path to Python script containing function definitions for the
+        generation of any custom features. Defaults to None.
+    custom_functions : dict, optional
+        Custom feature functions or dask graph; see `featurize_single_ts`.
+    raise_exceptions : bool, optional
+        See `featurize_single_ts`. Defaults to True.
+    n_jobs : int, optional
+        Number of worker processes; defaults to the number of CPUs.
+    cache : FeatureCache or str, optional
+        Persistent feature cache; see `featurize_single_ts`.
+
+    Returns
+    -------
+    list of pd.Series
+        Feature values for each time series, in the format returned by
+        `featurize_single_ts`.
+    """
+    n_channels = [ts.n_channels for ts in time_series]
+    channels = [list(ts.channels()) for ts in time_series]
+    lengths = [[len(t) for t, m, e in ts_channels] for ts_channels in channels]
+    offsets = np.cumsum([0] + [n for ts_lengths in lengths
+                               for n in ts_lengths])
+    n_feats = len(features_to_use)
+    out_shape = (len(time_series), n_feats * max(n_channels, default=0))
+    dtype = ('float32' if all(ts.dtype == np.float32 for ts in time_series)
+             else 'float64')
+
+    scratch_dir = tempfile.mkdtemp(
+        prefix='cesium_', dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+    try:
+        data_path = os.path.join(scratch_dir, 'data.dat')
+        data = np.memmap(data_path, dtype=dtype, mode='w+',
+                         shape=(3, max(offsets[-1], 1)))
+        tasks = []
+        k = 0
+        for i, ts in enumerate(time_series):
+            for t, m, e in channels[i]:
+                data[:, offsets[k]:offsets[k + 1]] = (t, m, e)
+                k += 1
+            tasks.append((i, offsets[k - n_channels[i]:k + 1],
+                          ts.meta_features))
+        data.flush()
+        del data
+
+        out_path = os.path.join(scratch_dir, 'features.dat')
+        out = np.memmap(out_path, dtype='float64', mode='w+',
+                        shape=(max(out_shape[0], 1), max(out_shape[1], 1)))
+        out[:] = np.nan
+        out.flush()
+
+        n_jobs = n_jobs or os.cpu_count() or 1
+        pool = multiprocessing.Pool(
+            n_jobs, initializer=_init_pool_worker,
+            initargs=(data_path, dtype, (3, max(offsets[-1], 1)), out_path,
+                      out.shape, features_to_use, custom_script_path,
+                      custom_functions, raise_exceptions, cache))
+        try:
+            chunksize = max(1, len(tasks) // (8 * n_jobs))
+            for _ in pool.imap_unordered(_featurize_pool_task, tasks,
+                                         chunksize):
+                pass
+        finally:
+            pool.terminate()
+            pool.join()
+        values = np.array(out[:out_shape[0], :out_shape[1]])
+        del out
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    return [pd.Series(row[:n_feats * n],
+                      index=_feature_index(tuple(features_to_use), n))
+            for row, n in zip(values, n_channels)]
+
+
+_pool_worker_state = {}
+
+
+def _init_pool_worker(data_path, data_dtype, data_shape, out_path, out_shape,
+                      features_to_use, custom_script_path, custom_functions,
+                      raise_exceptions, cache):
+    """Map the shared input/output arrays in a `featurize_process_pool`
+    worker.
+    """
+    _pool_worker_state.update(
+        data=np.memmap(data_path, dtype=data_dtype, mode='r',
+                       shape=data_shape),
+        out=np.memmap(out_path, dtype='float64', mode='r+', shape=out_shape),
+        args=(features_to_use, custom_script_path, custom_functions,
+              raise_exceptions, cache))
+
+
+def _featurize_pool_task(task):
+    """Featurize the time series in rows `offsets` of the shared data and
+    write its feature values to row `i` of the shared output matrix.
+    """
+    i, offsets, meta_features = task
+    data, out = _pool_worker_state['data'], _pool_worker_state['out']
+    t, m, e = zip(*[data[:, start:stop]
+                    for start, stop in zip(offsets[:-1], offsets[1:])])
+    if len(t) == 1:
+        ts = TimeSeries(t[0], m[0], e[0], meta_features=meta_features,
+                        dtype=data.dtype)
+    else:
+        ts = TimeSeries(list(t), list(m), list(e), meta_features=meta_features,
+                        dtype=data.dtype)
+    features = featurize_single_ts(ts, *_pool_worker_state['args'])
+    out[i, :len(features)] = features.values
+
+
+def _combine_features(features, batch_features, single_feats, batch_feats,
+                      features_to_use):
+    """Merge per-series and batch feature values in `features_to_use` order."""
+    n_channels = len(batch_features) // len(batch_feats)
+    values = np.concatenate((features.values, batch_features.values))
+    names = single_feats + batch_feats
+    order = [names.index(f) for f in features_to_use]
+    values = values.reshape((-1, n_channels))[order].ravel()
+    return pd.Series(values, index=_feature_index(tuple(features_to_use),
+                                                  n_channels))
+
+
+def _featurize_all(all_time_series, features_to_use, custom_script_path,
+                   custom_functions, raise_exceptions, vectorize,
+                   processes=False, cache=None):
+    """Delayed feature values for each (delayed) time series; if `vectorize`,
+    features in `BATCH_FEATS` are computed for all time series at once. If
+    `processes`, the remaining features are computed by
+    `featurize_process_pool`.
+    """
+    if isinstance(cache, str):
+        cache = FeatureCache(cache)
+    batch_feats = []
+    if vectorize:
+        batch_feats = _batch_feats(features_to_use, custom_functions)
+    single_feats = [f for f in features_to_use if f not in batch_feats]
+    if batch_feats:
+        batch_features = delayed(featurize_batch, pure=True)(
+            all_time_series, batch_feats, raise_exceptions)
+        if not single_feats:
+            return [batch_features[i] for i in range(len(all_time_series))]
+    if processes:
+        pool_features = delayed(featurize_process_pool, pure=True)(
+            all_time_series, single_feats, custom_script_path,
+            custom_functions, raise_exceptions, cache=cache)
+        all_features = [pool_features[i] for i in range(len(all_time_series))]
+    else:
+        all_features = [delayed(featurize_single_ts, pure=True)(
+                            ts, single_feats, custom_script_path,
+                            custom_functions, raise_exceptions, cache)
+                        for ts in all_time_series]
+    if batch_feats:
+        all_features = [delayed(_combine_features, pure=True)(
+                            features, batch_features[i], single_feats,
+                            batch_feats, features_to_use)
+                        for i, features in enumerate(all_features)]
+    return all_features
+
+
+# Single-series tasks reimplemented by the batch graph; features that depend on
+# entries of `dask_feature_graph` that have since been replaced are computed
+# per time series instead (see `_batch_feats`)
+_batch_reference_graph = dict(dask_feature_graph)
+
+
+def _batch_feats(features_to_use, custom_functions):
+    """Features in `features_to_use` that `featurize_batch` computes as the
+    (custom) single-series graph would: those in `BATCH_FEATS` that neither
+    are nor (in the single-series or batch graph) depend on custom features
+    or replaced entries of `dask_feature_graph`.
+    """
+    overridden = set(custom_functions or ())
+    overridden.update(k for k, task in _batch_reference_graph.items()
+                      if dask_feature_graph.get(k) is not task)
+    excluded = set()
+    for graph in (_batch_reference_graph, batch_feature_graph):
+        excluded.update(_dependents(dict(graph, t=None, m=None, e=None),
+                                    overridden))
+    return [f for f in features_to_use
+            if f in BATCH_FEATS and f not in excluded]
 
 
 def assemble_featureset(features_list, time_series=None,
@@ -106,8 +523,8 @@ def assemble_featureset(features_list, time_series=None,
         meta_features_list, names = zip(*[(ts.meta_features, ts.name)
                                           for ts in time_series])
     if len(features_list) > 0:
-        feat_df = pd.concat(features_list, axis=1, ignore_index=True).T
-        feat_df.index = names
+        values, columns = _stack_features(features_list)
+        feat_df = pd.DataFrame(values, index=names, columns=columns)
     else:
         feat_df = pd.DataFrame(index=names)
 
@@ -120,12 +537,48 @@ def assemble_featureset(features_list, time_series=None,
     return feat_df
 
 
+def _stack_features(features_list):
+    """Stack per-series feature values into a 2-d array (one row per series).
+
+    Equivalent to `pd.concat(features_list, axis=1).T`, but the output is
+    preallocated and filled row by row, and the column positions are only
+    computed once for each distinct index (typically, a single index shared
+    by all series; see `_feature_index`).
+
+    Returns
+    -------
+    values : (n_series, n_columns) array
+    columns : pd.MultiIndex
+    """
+    indexes = {}
+    for features in features_list:
+        indexes.setdefault(id(features.index), features.index)
+    if (not all(index.is_unique for index in indexes.values())
+            or not all(features.dtype.kind == 'f' for features in features_list)):
+        feat_df = pd.concat(features_list, axis=1, ignore_index=True).T
+        return feat_df.values, feat_df.columns
+
+    distinct = list(indexes.values())
+    columns = distinct[0]
+    if not all(index.equals(columns) for index in distinct[1:]):
+        # Same (sorted) column order as the outer join performed by `pd.concat`
+        columns = functools.reduce(lambda x, y: x.union(y), distinct)
+    positions = {key: columns.get_indexer(index)
+                 for key, index in indexes.items()}
+
+    values = np.full((len(features_list), len(columns)), np.nan)
+    for row, features in zip(values, features_list):
+        row[positions[id(features.index)]] = features.values
+    return values, columns
+
+
 # TODO should this be changed to use TimeSeries objects? or maybe an optional
 # argument for TimeSeries? some redundancy here...
 def featurize_time_series(times, values, errors=None, features_to_use=[],
                           meta_features={}, names=None,
                           custom_script_path=None, custom_functions=None,
-                          scheduler=dask.threaded.get, raise_exceptions=True):
+                          scheduler=dask.threaded.get, raise_exceptions=True,
+                          vectorize=False, cache=None, dtype='float64'):
     """Versatile feature generation function for one or more time series.
 
     For a single time series, inputs may have the form:
@@ -188,13 +641,30 @@ def featurize_time_series(times, values, errors=None, features_to_use=[],
         dask graph, these arrays should be referenced as 't', 'm', 'e',
         respectively, and any values with keys present in `features_to_use`
         will be computed.
-    scheduler : function, optional
+    scheduler : function or 'processes', optional
         `dask` scheduler function used to perform feature extraction
-        computation. Defaults to `dask.threaded.get`.
+        computation. Defaults to `dask.threaded.get`. If 'processes', features
+        are computed by a pool of worker processes that share the time series
+        data and feature values through memory-mapped arrays (see
+        `featurize_process_pool`), avoiding the serialization overhead of
+        `dask.multiprocessing.get`.
     raise_exceptions : bool, optional
         If True, exceptions during feature computation are raised immediately;
         if False, exceptions are supressed and `np.nan` is returned for the
         given feature and any dependent features. Defaults to True.
+    vectorize : bool, optional
+        If True, the cheap statistical and cadence features (see
+        `features.batch.BATCH_FEATS`) are computed for all time series at
+        once using NumPy reductions over NaN-padded arrays, rather than by
+        separate tasks for each time series. Defaults to False.
+    cache : FeatureCache or str, optional
+        Persistent feature cache (or path to its database file), keyed by the
+        content of each time series; only features missing from the cache
+        are computed (see `cache.FeatureCache`). Defaults to None.
+    dtype : str, optional
+        Floating point type of the time series values: 'float64' (default) or
+        'float32', which halves the memory used by the values; see
+        `TimeSeries`.
 
     Returns
     -------
@@ -246,21 +716,23 @@ def featurize_time_series(times, values, errors=None, features_to_use=[],
 
     all_time_series = [delayed(TimeSeries(t, m, e,
                                           meta_features=meta_features.loc[name],
-                                          name=name), pure=True)
+                                          name=name, dtype=dtype), pure=True)
                        for t, m, e, name in zip(times, values, errors, names)]
 
-    all_features = [delayed(featurize_single_ts, pure=True)(ts, features_to_use,
-                                                            custom_script_path,
-                                                            custom_functions,
-                                                            raise_exceptions)
-                    for ts in all_time_series]
+    processes = (scheduler == 'processes')
+    if processes:
+        scheduler = dask.get
+    all_features = _featurize_all(all_time_series, features_to_use,
+                                  custom_script_path, custom_functions,
+                                  raise_exceptions, vectorize, processes,
+                                  cache)
     result = delayed(assemble_featureset, pure=True)(all_features, all_time_series)
     return result.compute(get=scheduler)
 
 
 def featurize_ts_files(ts_paths, features_to_use, custom_script_path=None,
                        custom_functions=None, scheduler=dask.threaded.get,
-                       raise_exceptions=True):
+                       raise_exceptions=True, vectorize=False, cache=None):
     """Feature generation function for on-disk time series (.npz) files.
 
     By default, computes features concurrently using the
@@ -274,9 +746,13 @@ def featurize_ts_files(ts_paths, features_to_use, custom_script_path=None,
 
     Parameters
     ----------
-    ts_paths : list of str
-        List of paths to time series data, stored in `numpy` .npz format.
-        See `time_series.load` for details.
+    ts_paths : list of str, str or TimeSeriesCollection
+        List of paths to time series data, stored in `numpy` .npz format
+        (see `time_series.load` for details), or a collection of time series
+        in the columnar format written by `time_series.save_collection` (or
+        the path to its directory), or the path to a tar- or zipfile of
+        time series files, which are read without extracting the archive
+        (see `data_management.iter_time_series`).
     features_to_use : list of str, optional
         List of feature names to be generated. Defaults to an empty list, which
         will result in only meta_features features being stored.
@@ -291,26 +767,108 @@ def featurize_ts_files(ts_paths, features_to_use, custom_script_path=None,
         dask graph, these arrays should be referenced as 't', 'm', 'e',
         respectively, and any values with keys present in `features_to_use`
         will be computed.
-    scheduler : function, optional
+    scheduler : function or 'processes', optional
         `dask` scheduler function used to perform feature extraction
-        computation. Defaults to `dask.threaded.get`.
+        computation. Defaults to `dask.threaded.get`. If 'processes', features
+        are computed by a pool of worker processes that share the time series
+        data and feature values through memory-mapped arrays (see
+        `featurize_process_pool`), avoiding the serialization overhead of
+        `dask.multiprocessing.get`.
     raise_exceptions : bool, optional
         If True, exceptions during feature computation are raised immediately;
         if False, exceptions are supressed and `np.nan` is returned for the
         given feature and any dependent features. Defaults to True.
+    vectorize : bool, optional
+        If True, the cheap statistical and cadence features are computed for
+        all time series at once; see `featurize_time_series`. Defaults to
+        False.
+    cache : FeatureCache or str, optional
+        Persistent feature cache; see `featurize_time_series`. Defaults to
+        None.
 
     Returns
     -------
     pd.DataFrame
         DataFrame with columns containing feature values, indexed by name.
     """
-    all_time_series = [delayed(time_series.load, pure=True)(ts_path)
-                       for ts_path in ts_paths]
-    all_features = [delayed(featurize_single_ts, pure=True)(ts, features_to_use,
-                                                            custom_script_path,
-                                                            custom_functions,
-                                                            raise_exceptions)
-                    for ts in all_time_series]
+    if isinstance(ts_paths, str) and not os.path.isdir(ts_paths):
+        all_time_series = [delayed(ts, pure=True) for ts
+                           in data_management.iter_time_series(ts_paths)]
+    elif isinstance(ts_paths, str):
+        ts_paths = time_series.load_collection(ts_paths)
+    if isinstance(ts_paths, time_series.TimeSeriesCollection):
+        all_time_series = [delayed(ts_paths.__getitem__, pure=True)(i)
+                           for i in range(len(ts_paths))]
+    elif not isinstance(ts_paths, str):
+        all_time_series = [delayed(time_series.load, pure=True)(ts_path)
+                           for ts_path in ts_paths]
+    return _featurize_delayed_ts(all_time_series, features_to_use,
+                                 custom_script_path, custom_functions,
+                                 scheduler, raise_exceptions, vectorize, cache)
+
+
+def featurize_iter(time_series_iter, features_to_use, chunk_size=1000,
+                   custom_script_path=None, custom_functions=None,
+                   scheduler=dask.threaded.get, raise_exceptions=True,
+                   vectorize=False, cache=None):
+    """Feature generation generator for streams of time series.
+
+    Time series are consumed from `time_series_iter` in chunks of
+    `chunk_size`; the time series of each chunk are featurized concurrently
+    and the resulting featureset is yielded before the next chunk is read, so
+    that memory usage is bounded by the chunk size rather than the size of
+    the whole dataset. The featuresets of successive chunks can be
+    concatenated (`pd.concat`) or written out incrementally.
+
+    Parameters
+    ----------
+    time_series_iter : iterable of TimeSeries objects or str
+        Time series to featurize, or paths to time series stored in `numpy`
+        .npz format (see `time_series.load`); may be a (lazy) iterator, or a
+        `time_series.TimeSeriesCollection`.
+    features_to_use : list of str
+        List of feature names to be generated.
+    chunk_size : int, optional
+        Number of time series to featurize at once. Defaults to 1000.
+    custom_script_path, custom_functions, scheduler, raise_exceptions,
+    vectorize, cache :
+        See `featurize_ts_files`.
+
+    Yields
+    ------
+    fset : pd.DataFrame
+        DataFrame with columns containing feature values for the time series
+        in a chunk, indexed by name.
+    labels : tuple
+        Labels of the time series in the chunk.
+    """
+    time_series_iter = iter(time_series_iter)
+    while True:
+        chunk = list(itertools.islice(time_series_iter, chunk_size))
+        if not chunk:
+            return
+        all_time_series = [delayed(time_series.load, pure=True)(ts)
+                           if isinstance(ts, str) else delayed(ts, pure=True)
+                           for ts in chunk]
+        yield _featurize_delayed_ts(all_time_series, features_to_use,
+                                    custom_script_path, custom_functions,
+                                    scheduler, raise_exceptions, vectorize,
+                                    cache)
+
+
+def _featurize_delayed_ts(all_time_series, features_to_use, custom_script_path,
+                          custom_functions, scheduler, raise_exceptions,
+                          vectorize, cache):
+    """Featureset and labels for a list of delayed `TimeSeries`; see
+    `featurize_ts_files`.
+    """
+    processes = (scheduler == 'processes')
+    if processes:
+        scheduler = dask.get
+    all_features = _featurize_all(all_time_series, features_to_use,
+                                  custom_script_path, custom_functions,
+                                  raise_exceptions, vectorize, processes,
+                                  cache)
     names, meta_feats, all_labels = zip(*[(ts.name, ts.meta_features, ts.label)
                                           for ts in all_time_series])
     result = delayed(assemble_featureset, pure=True)(all_features,
@@ -0,0 +1,116 @@
+from functools import partial
+
+import numpy as np
+import numpy.testing as npt
+import dask
+
+from cesium import featurize
+from cesium.cache import FeatureCache
+from cesium.features.lomb_scargle import lomb_scargle_model
+from cesium.time_series import TimeSeries
+from cesium.tests.fixtures import sample_values
+
+
+def test_cache_get_put(tmpdir):
+    cache = FeatureCache(str(tmpdir.join('cache.db')))
+    assert cache.get('key', ['a', 'b']) == {}
+    cache.put('key', {'a': [1., 2.], 'b': [np.nan, 3.]})
+    values = cache.get('key', ['a', 'c'])
+    assert values == {'a': [1., 2.]}
+    assert len(cache) == 2
+
+    cache.clear()
+    assert len(cache) == 0 and cache.size() == 0
+
+
+def test_cache_key():
+    t, m, e = sample_values()
+    key = FeatureCache.key(TimeSeries(t, m, e))
+    assert key == FeatureCache.key(TimeSeries(t.copy(), m.copy(), e.copy()))
+    assert key != FeatureCache.key(TimeSeries(t, m + 1., e))
+    assert key != FeatureCache.key(TimeSeries(t, m, e,
+                                              meta_features={'meta1': 0.5}))
+
+
+def test_cache_eviction(tmpdir):
+    cache = FeatureCache(str(tmpdir.join('cache.db')))
+    cache.put('key0', {'a': np.zeros(100)})
+    entry_size = cache.size()
+    cache = FeatureCache(cache.path, max_size=int(2.5 * entry_size))
+    cache.put('key1', {'a': np.zeros(100)})
+    cache.get('key0', ['a'])  # key1 is now least recently used
+    cache.put('key2', {'a': np.zeros(100)})
+    assert cache.size() <= cache.max_size
+    assert 'a' in cache.get('key0', ['a'])
+    assert cache.get('key1', ['a']) == {}
+
+
+def test_featurize_cache(tmpdir):
+    list_of_series = [sample_values(size=size, channels=2)
+                      for size in [51, 20]]
+    times, values, errors = [list(x) for x in zip(*list_of_series)]
+    features_to_use = ['amplitude', 'freq1_freq', 'test_f']
+    custom_functions = {'test_f': lambda t, m, e: np.pi}
+    cache = FeatureCache(str(tmpdir.join('cache.db')),
+                         intermediates=['_lomb_model'])
+    fset = featurize.featurize_time_series(times, values, errors,
+                                           features_to_use,
+                                           custom_functions=custom_functions,
+                                           scheduler=dask.get)
+    fset_cached = featurize.featurize_time_series(
+        times, values, errors, features_to_use,
+        custom_functions=custom_functions, scheduler=dask.get, cache=cache)
+    assert fset_cached.equals(fset)
+    # Features and intermediates are cached for each series; custom
+    # features are not
+    assert len(cache) == 2 * 3
+
+    # Cached values are used instead of recomputing
+    key = FeatureCache.key(TimeSeries(times[0], values[0], errors[0]))
+    cache.put(key, {'amplitude': [-1., -2.]})
+    fset_cached = featurize.featurize_time_series(
+        times, values, errors, features_to_use + ['freq1_amplitude1'],
+        custom_functions=custom_functions, scheduler=dask.get,
+        cache=cache.path)
+    npt.assert_array_equal(fset_cached.loc[0, 'amplitude'], [-1., -2.])
+    npt.assert_array_equal(fset_cached['amplitude'].iloc[1],
+                           fset['amplitude'].iloc[1])
+    npt.assert_array_equal(fset_cached['test_f'], np.pi)
+    fset_ref = featurize.featurize_time_series(times, values, errors,
+                                               ['freq1_amplitude1'],
+                                               scheduler=dask.get)
+    npt.assert_allclose(fset_cached['freq1_amplitude1'],
+                        fset_ref['freq1_amplitude1'])
+
+
+def test_featurize_cache_custom_graph(tmpdir):
+    list_of_series = [sample_values(size=size, channels=2)
+                      for size in [51, 20]]
+    times, values, errors = [list(x) for x in zip(*list_of_series)]
+    features_to_use = ['amplitude', 'freq1_freq', 'freq1_amplitude1']
+    custom_graph = {'_lomb_model': (partial(lomb_scargle_model, fmax=5.,
+                                            model_error=False),
+                                    't', 'm', 'e')}
+    cache = FeatureCache(str(tmpdir.join('cache.db')),
+                         intermediates=['_lomb_model'])
+    fset = featurize.featurize_time_series(times, values, errors,
+                                           features_to_use,
+                                           scheduler=dask.get, cache=cache)
+    n_entries = len(cache)
+
+    # Features computed from the overridden intermediate are not read from
+    # or added to the cache; others still are
+    fset_custom = featurize.featurize_time_series(
+        times, values, errors, features_to_use,
+        custom_functions=custom_graph, scheduler=dask.get)
+    assert not np.allclose(fset_custom['freq1_freq'], fset['freq1_freq'])
+    fset_cached = featurize.featurize_time_series(
+        times, values, errors, features_to_use,
+        custom_functions=custom_graph, scheduler=dask.get, cache=cache)
+    assert fset_cached.equals(fset_custom)
+    assert len(cache) == n_entries
+    fset_cached = featurize.featurize_time_series(times, values, errors,
+                                                  features_to_use,
+                                                  scheduler=dask.get,
+                                                  cache=cache)
+    assert fset_cached.equals(fset)
@@ -2,11 +2,13 @@ try:
     from StringIO import StringIO
 except:
     from io import StringIO
+import io
 import os
 from os.path import join as pjoin
 import shutil
+import tarfile
 import numpy as np
-from cesium import data_management
+from cesium import data_management, time_series
 from cesium import util
 
 import numpy.testing as npt
@@ -86,3 +88,114 @@ def test_parsing_and_saving(tmpdir):
     for ts in time_series:
         assert isinstance(ts, str)
         assert os.path.exists(ts)
+
+
+def test_parse_ts_data_parsers():
+    """Test that the pandas and NumPy parsers produce identical values and
+    reject the same malformed files.
+    """
+    ts_path = pjoin(DATA_PATH, "dotastro_215153.dat")
+    npt.assert_array_equal(data_management.parse_ts_data(ts_path),
+                           data_management.parse_ts_data(ts_path,
+                                                         parser='numpy'))
+    with pytest.raises(ValueError):
+        data_management.parse_ts_data(ts_path, parser='unknown')
+
+    # Malformed rows are errors for both parsers; NaN values are not
+    for data in ['1,2,3\n4,5\n', '1,2,3,\n4,5,6,\n', '1,2,3\n4,5,6,7\n',
+                 '1,,3\n4,5,6\n']:
+        for parser in ['pandas', 'numpy']:
+            with pytest.raises(ValueError):
+                data_management.parse_ts_data(StringIO(data), parser=parser)
+    npt.assert_array_equal(
+        data_management.parse_ts_data(StringIO('1,nan,3\n4,5,6\n')),
+        [[1, 4], [np.nan, 5], [3, 6]])
+
+
+def test_parallel_resumable_ingest(tmpdir):
+    """Test parallel ingest, resuming from the manifest and collection
+    output.
+    """
+    data_file_path = pjoin(DATA_PATH, "215153_215176_218272_218934.tar.gz")
+    header_path = pjoin(DATA_PATH, "215153_215176_218272_218934_metadata.dat")
+    output_dir = str(tmpdir.join('npz'))
+    ts_paths = data_management.parse_and_store_ts_data(
+        data_file_path, output_dir, header_path, cleanup_archive=False,
+        cleanup_header=False, n_jobs=2, resume=True)
+    assert len(ts_paths) == 4
+    with open(pjoin(output_dir, data_management.INGEST_MANIFEST)) as f:
+        assert sorted(f.read().split()) == sorted(
+            util.shorten_fname(p) for p in ts_paths)
+
+    # Simulate an interrupted ingest: only the missing file is parsed again
+    os.remove(ts_paths[0])
+    mtimes = [os.path.getmtime(p) for p in ts_paths[1:]]
+    with open(pjoin(output_dir, data_management.INGEST_MANIFEST), 'w') as f:
+        f.write('\n'.join(util.shorten_fname(p) for p in ts_paths[1:]) + '\n')
+    assert data_management.parse_and_store_ts_data(
+        data_file_path, output_dir, header_path, cleanup_archive=False,
+        cleanup_header=False, resume=True) == ts_paths
+    assert os.path.exists(ts_paths[0])
+    assert [os.path.getmtime(p) for p in ts_paths[1:]] == mtimes
+
+    collection_path = data_management.parse_and_store_ts_data(
+        data_file_path, str(tmpdir.join('collection')), header_path,
+        cleanup_archive=False, cleanup_header=False, n_jobs=2,
+        collection=True)
+    collection = time_series.load_collection(collection_path)
+    for ts_path, ts in zip(ts_paths, collection):
+        expected = time_series.load(ts_path)
+        assert ts.name == expected.name
+        assert ts.label == expected.label
+        npt.assert_array_equal(ts.measurement, expected.measurement)
+        npt.assert_allclose(ts.meta_features['meta1'],
+                            expected.meta_features['meta1'])
+
+    with pytest.raises(ValueError):
+        data_management.parse_and_store_ts_data(
+            data_file_path, output_dir, header_path, cleanup_archive=False,
+            cleanup_header=False, resume=True, collection=True)
+
+
+def test_resumable_ingest_interrupted(tmpdir):
+    """Test that series stored before a failure are recorded in the
+    manifest.
+    """
+    archive_path = str(tmpdir.join('data.tar'))
+    with tarfile.open(archive_path, 'w') as archive:
+        for name, data in [('a.dat', b'1,2,0.1\n2,3,0.1\n3,1,0.1\n'),
+                           ('b.dat', b'1,5,0.1\n2,4,0.1\n3,6,0.1\n'),
+                           ('c.dat', b'foo,bar\nbaz,qux\n')]:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    output_dir = str(tmpdir.join('npz'))
+    with pytest.raises(ValueError):
+        data_management.parse_and_store_ts_data(
+            archive_path, output_dir, cleanup_archive=False, resume=True)
+    with open(pjoin(output_dir, data_management.INGEST_MANIFEST)) as f:
+        assert f.read().split() == ['a', 'b']
+
+
+def test_iter_time_series():
+    """Test reading time series directly from an archive."""
+    data_file_path = pjoin(DATA_PATH, "215153_215176_218272_218934.tar.gz")
+    header_path = pjoin(DATA_PATH, "215153_215176_218272_218934_metadata.dat")
+    all_ts = list(data_management.iter_time_series(data_file_path,
+                                                   header_path))
+    labels, metadata = data_management.parse_headerfile(header_path)
+    assert sorted(ts.name for ts in all_ts) == sorted(labels.index)
+    for ts in all_ts:
+        assert ts.label == labels.loc[ts.name]
+        npt.assert_allclose(ts.meta_features['meta1'],
+                            metadata.loc[ts.name].meta1)
+    ts = [ts for ts in all_ts if ts.name == 'dotastro_215153'][0]
+    npt.assert_array_equal(
+        np.vstack((ts.time, ts.measurement, ts.error)),
+        data_management.parse_ts_data(pjoin(DATA_PATH,
+                                            "dotastro_215153.dat")))
+
+    with pytest.raises(ValueError):
+        list(data_management.iter_time_series(
+            data_file_path, pjoin(DATA_PATH, "asas_training_subset_classes_"
+                                             "with_metadata.dat")))
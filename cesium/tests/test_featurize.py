@@ -5,7 +5,7 @@ import pandas as pd
 import scipy.stats
 import dask
 
-from cesium import featurize
+from cesium import featurize, time_series
 from cesium.tests.fixtures import (sample_values, sample_ts_files,
                                    sample_featureset)
 
@@ -281,3 +281,208 @@ def test_ignore_exceptions():
         assert np.isnan(fset.values).all()
     finally:
         cesium.features.graphs.dask_feature_graph['mean'] = old_value
+
+
+def test_featurize_time_series_vectorize():
+    """Test vectorized computation of cheap features for multiple series"""
+    n_channels = 3
+    list_of_series = [sample_values(size=size, channels=n_channels)
+                      for size in [51, 20, 33]]
+    times, values, errors = [list(x) for x in zip(*list_of_series)]
+    features_to_use = ['amplitude', 'stetson_j', 'std_err', 'cad_probs_1',
+                       'test_f']
+    meta_features = {'meta1': 0.5}
+    custom_functions = {'test_f': lambda t, m, e: np.pi}
+    fset = featurize.featurize_time_series(times, values, errors,
+                                           features_to_use, meta_features,
+                                           custom_functions=custom_functions,
+                                           scheduler=dask.get)
+    fset_vec = featurize.featurize_time_series(times, values, errors,
+                                               features_to_use, meta_features,
+                                               custom_functions=custom_functions,
+                                               scheduler=dask.get,
+                                               vectorize=True)
+    npt.assert_array_equal(fset_vec.columns, fset.columns)
+    npt.assert_allclose(fset_vec.values, fset.values, rtol=1e-10)
+
+
+def test_featurize_time_series_vectorize_overrides():
+    """Test that vectorized features respect custom and replaced graph
+    entries."""
+    import cesium.features.batch
+    import cesium.features.graphs
+    list_of_series = [sample_values(size=size) for size in [51, 20, 33]]
+    times, values, errors = [list(x) for x in zip(*list_of_series)]
+    features_to_use = ['cads_std', 'percent_amplitude', 'mean', 'std']
+    custom_graph = {'cads': (lambda t: np.diff(t) ** 2, 't'),
+                    '_flux': (lambda m: m, 'm')}
+    fset = featurize.featurize_time_series(times, values, errors,
+                                           features_to_use,
+                                           custom_functions=custom_graph,
+                                           scheduler=dask.get)
+    fset_vec = featurize.featurize_time_series(times, values, errors,
+                                               features_to_use,
+                                               custom_functions=custom_graph,
+                                               scheduler=dask.get,
+                                               vectorize=True)
+    npt.assert_allclose(fset_vec.values, fset.values, rtol=1e-10)
+    npt.assert_allclose(fset_vec['cads_std'].values.ravel(),
+                        [np.std(np.diff(t) ** 2) for t in times])
+
+    def raise_exc(x):
+        raise ValueError()
+    old_value = cesium.features.graphs.dask_feature_graph['mean']
+    try:
+        cesium.features.graphs.dask_feature_graph['mean'] = (raise_exc, 't')
+        with pytest.raises(ValueError):
+            featurize.featurize_time_series(times, values, errors, ['mean'],
+                                            scheduler=dask.get,
+                                            vectorize=True)
+        fset_vec = featurize.featurize_time_series(times, values, errors,
+                                                   features_to_use,
+                                                   scheduler=dask.get,
+                                                   raise_exceptions=False,
+                                                   vectorize=True)
+        assert np.isnan(fset_vec['mean'].values).all()
+        assert not np.isnan(fset_vec['std'].values).any()
+    finally:
+        cesium.features.graphs.dask_feature_graph['mean'] = old_value
+
+    # Exceptions in batch features are suppressed in the same way
+    old_value = cesium.features.batch.batch_feature_graph['std']
+    try:
+        cesium.features.batch.batch_feature_graph['std'] = (raise_exc, 'm')
+        with pytest.raises(ValueError):
+            featurize.featurize_time_series(times, values, errors, ['std'],
+                                            scheduler=dask.get,
+                                            vectorize=True)
+        fset_vec = featurize.featurize_time_series(times, values, errors,
+                                                   features_to_use,
+                                                   scheduler=dask.get,
+                                                   raise_exceptions=False,
+                                                   vectorize=True)
+        assert np.isnan(fset_vec['std'].values).all()
+        assert not np.isnan(fset_vec['mean'].values).any()
+    finally:
+        cesium.features.batch.batch_feature_graph['std'] = old_value
+
+
+def test_featurize_time_series_processes():
+    """Test featurization in a shared-memory process pool"""
+    list_of_series = [sample_values(size=size, channels=channels)
+                      for size, channels in [(51, 1), (20, 3), (33, 2)]]
+    times, values, errors = [list(x) for x in zip(*list_of_series)]
+    features_to_use = ['amplitude', 'stetson_j', 'std_err', 'test_f']
+    meta_features = {'meta1': 0.5}
+    custom_functions = {'test_f': lambda t, m, e: np.pi}
+    fset = featurize.featurize_time_series(times, values, errors,
+                                           features_to_use, meta_features,
+                                           custom_functions=custom_functions,
+                                           scheduler=dask.get)
+    fset_proc = featurize.featurize_time_series(times, values, errors,
+                                                features_to_use, meta_features,
+                                                custom_functions=custom_functions,
+                                                scheduler='processes')
+    pd.util.testing.assert_frame_equal(fset_proc, fset)
+
+    with sample_ts_files(size=4, labels=['A', 'B']) as ts_paths:
+        fset, labels = featurize.featurize_ts_files(ts_paths,
+                                                    features_to_use=["std_err"],
+                                                    scheduler='processes')
+    assert fset.shape == (4, 1)
+    npt.assert_array_equal(labels, ['A', 'B', 'A', 'B'])
+
+
+def test_featurize_files_collection(tmpdir):
+    """Test featurize function for a columnar time series collection"""
+    with sample_ts_files(size=4, labels=['A', 'B']) as ts_paths:
+        fset, labels = featurize.featurize_ts_files(ts_paths,
+                                                    features_to_use=["std_err"],
+                                                    scheduler=dask.get)
+        collection_path = str(tmpdir.join('collection'))
+        time_series.save_collection([time_series.load(path)
+                                     for path in ts_paths], collection_path)
+    fset_coll, labels_coll = featurize.featurize_ts_files(
+        collection_path, features_to_use=["std_err"], scheduler=dask.get)
+    pd.util.testing.assert_frame_equal(fset_coll, fset)
+    npt.assert_array_equal(labels_coll, labels)
+
+
+def test_featurize_iter():
+    """Test chunked featurization of a stream of time series"""
+    with sample_ts_files(size=5, labels=['A', 'B']) as ts_paths:
+        fset, labels = featurize.featurize_ts_files(ts_paths,
+                                                    features_to_use=["std_err"],
+                                                    scheduler=dask.get)
+        chunks = list(featurize.featurize_iter(iter(ts_paths), ["std_err"],
+                                               chunk_size=2,
+                                               scheduler=dask.get))
+        all_ts = [time_series.load(path) for path in ts_paths]
+    assert [len(fset_i) for fset_i, labels_i in chunks] == [2, 2, 1]
+    pd.util.testing.assert_frame_equal(pd.concat([c[0] for c in chunks]),
+                                       fset)
+    npt.assert_array_equal(sum([list(c[1]) for c in chunks], []), labels)
+
+    chunks = featurize.featurize_iter(all_ts, ["std_err"], chunk_size=3,
+                                      scheduler=dask.get)
+    pd.util.testing.assert_frame_equal(pd.concat([c[0] for c in chunks]),
+                                       fset)
+
+
+def test_assemble_featureset():
+    """Test that assembled featuresets match concatenated feature series"""
+    def features(n_channels, features_to_use=['b', 'a']):
+        index = pd.MultiIndex.from_product((features_to_use,
+                                            range(n_channels)),
+                                           names=('feature', 'channel'))
+        return pd.Series(np.random.random(len(index)), index=index)
+
+    for features_list in ([features(2) for i in range(3)],
+                          [features(1), features(3), features(2)],
+                          [features(1), features(1, ['c'])]):
+        names = ['x{}'.format(i) for i in range(len(features_list))]
+        fset = featurize.assemble_featureset(features_list, names=names)
+        expected = pd.concat(features_list, axis=1, ignore_index=True).T
+        expected.index = names
+        pd.util.testing.assert_frame_equal(fset, expected)
+
+
+def test_featurize_files_archive(tmpdir):
+    """Test featurize function for time series read directly from archives"""
+    import tarfile
+    import zipfile
+    with sample_ts_files(size=4, labels=['A', 'B']) as ts_paths:
+        fset, labels = featurize.featurize_ts_files(ts_paths,
+                                                    features_to_use=["std_err"],
+                                                    scheduler=dask.get)
+        tar_path = str(tmpdir.join('ts.tar.gz'))
+        with tarfile.open(tar_path, 'w:gz') as archive:
+            for path in ts_paths:
+                archive.add(path, arcname=os.path.basename(path))
+        zip_path = str(tmpdir.join('ts.zip'))
+        with zipfile.ZipFile(zip_path, 'w') as archive:
+            for path in ts_paths:
+                archive.write(path, arcname=os.path.basename(path))
+    for archive_path in [tar_path, zip_path]:
+        fset_archive, labels_archive = featurize.featurize_ts_files(
+            archive_path, features_to_use=["std_err"], scheduler=dask.get)
+        npt.assert_array_equal(fset_archive.values, fset.values)
+        npt.assert_array_equal(labels_archive, labels)
+
+
+def test_featurize_single_ts_plan_reuse():
+    """Test that the feature plan is compiled once for all time series with
+    the same features and meta-features.
+    """
+    features_to_use = ['amplitude', 'std_err', 'skew']
+    all_ts = [time_series.TimeSeries(*sample_values(size=size))
+              for size in [51, 20, 33]]
+    featurize.featurize_single_ts(all_ts[0], features_to_use)
+    misses = featurize._memoized_plan_tasks.cache_info().misses
+    for ts in all_ts:
+        fset = featurize.featurize_single_ts(ts, features_to_use)
+        npt.assert_allclose(fset['amplitude'],
+                            featurize.featurize_single_ts(
+                                ts, ['amplitude'])['amplitude'])
+        featurize.featurize_single_ts(ts, features_to_use)
+    assert featurize._memoized_plan_tasks.cache_info().misses == misses + 1
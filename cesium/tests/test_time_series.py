@@ -193,3 +193,72 @@ def test_time_series_sort():
         npt.assert_allclose(ts.time[i], np.sort(t[0]))
         npt.assert_allclose(ts.measurement[i], m[i][np.argsort(t[0])])
         npt.assert_allclose(ts.error[i], e[0][np.argsort(t[0])])
+
+
+def test_time_series_collection(tmpdir):
+    n_channels = 3
+    t, m, e = sample_time_series(channels=n_channels)
+    ragged = [x_i[0:i+2] for x in (t, m, e) for i, x_i in enumerate(x)]
+    all_ts = [TimeSeries(t[0], m[0], e[0], label='A', name='a',
+                         meta_features={'meta1': 0.5}),
+              TimeSeries(t, m, e, label=1.),
+              TimeSeries(ragged[:3], ragged[3:6], ragged[6:], name='c')]
+    path = os.path.join(str(tmpdir), 'collection')
+    time_series.save_collection(all_ts, path)
+    collection = time_series.load_collection(path)
+    assert len(collection) == len(all_ts)
+    assert collection.labels == ['A', 1., None]
+    for ts, ts_loaded in zip(all_ts, collection):
+        assert_ts_equal(ts, ts_loaded)
+    assert_ts_equal(all_ts[-1], collection[-1])
+    assert len(collection[1:]) == 2
+
+    # Collections can be written from a generator in a single pass
+    path = os.path.join(str(tmpdir), 'collection_gen')
+    time_series.save_collection((ts for ts in all_ts), path)
+    collection = time_series.load_collection(path)
+    assert len(collection) == len(all_ts)
+    for ts, ts_loaded in zip(all_ts, collection):
+        assert_ts_equal(ts, ts_loaded)
+    assert not any(f.endswith('.raw') for f in os.listdir(path))
+
+    # The headers are rewritten in place with the final (padded) shape
+    n_values = sum(len(t_i) for ts in all_ts for t_i, _, _ in ts.channels())
+    for key in ['time', 'measurement', 'error']:
+        with open(os.path.join(path, key + '.npy'), 'rb') as f:
+            assert np.lib.format.read_magic(f) == (1, 0)
+            header = np.lib.format.read_array_header_1_0(f)
+            assert header == ((n_values,), False, np.float64)
+            assert f.tell() % 16 == 0
+        assert len(np.load(os.path.join(path, key + '.npy'))) == n_values
+
+    path = os.path.join(str(tmpdir), 'collection_empty')
+    time_series.save_collection([], path)
+    assert len(time_series.load_collection(path)) == 0
+
+
+def test_time_series_float32(tmpdir):
+    n_channels = 3
+    t, m, e = sample_time_series(channels=n_channels)
+    ragged = [x_i[0:i+2] for x in (t, m, e) for i, x_i in enumerate(x)]
+    all_ts = [TimeSeries(t[0], m[0], e[0], dtype='float32'),
+              TimeSeries(t, m, e, dtype='float32'),
+              TimeSeries(ragged[:3], ragged[3:6], ragged[6:],
+                         dtype='float32')]
+    for ts in all_ts:
+        assert ts.dtype == np.float32
+        for t_i, m_i, e_i in ts.channels():
+            assert t_i.dtype == m_i.dtype == e_i.dtype == np.float32
+
+        ts_path = os.path.join(str(tmpdir), str(uuid4()) + '.npz')
+        ts.save(ts_path)
+        ts_loaded = time_series.load(ts_path)
+        assert ts_loaded.dtype == np.float32
+        assert_ts_equal(ts, ts_loaded)
+
+    path = os.path.join(str(tmpdir), 'collection')
+    time_series.save_collection(all_ts, path, dtype='float32')
+    collection = time_series.load_collection(path)
+    for ts, ts_loaded in zip(all_ts, collection):
+        assert ts_loaded.dtype == np.float32
+        assert_ts_equal(ts, ts_loaded)
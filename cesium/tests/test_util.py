@@ -29,3 +29,32 @@ def test_remove_files(tmpdir):
 
     # File does not exist, should not raise exception
     util.remove_files(fpath)
+
+
+def test_iter_archive_members(tmpdir):
+    """Test util.iter_archive_members"""
+    import tarfile
+    import zipfile
+    contents = {'a.dat': b'1,2,3\n', 'b.dat': b'4,5,6\n'}
+    for name, data in contents.items():
+        with open(os.path.join(str(tmpdir), name), 'wb') as f:
+            f.write(data)
+    tar_path = os.path.join(str(tmpdir), 'ts.tar.gz')
+    with tarfile.open(tar_path, 'w:gz') as archive:
+        archive.add(str(tmpdir.join('a.dat')), arcname='ts/a.dat')
+        archive.add(str(tmpdir.join('b.dat')), arcname='ts/b.dat')
+    zip_path = os.path.join(str(tmpdir), 'ts.zip')
+    with zipfile.ZipFile(zip_path, 'w') as archive:
+        archive.write(str(tmpdir.join('a.dat')), arcname='ts/a.dat')
+        archive.write(str(tmpdir.join('b.dat')), arcname='ts/b.dat')
+
+    for path in [tar_path, zip_path]:
+        members = [(name, f.read())
+                   for name, f in util.iter_archive_members(path)]
+        npt.assert_equal(members, [('ts/a.dat', contents['a.dat']),
+                                   ('ts/b.dat', contents['b.dat'])])
+
+    a_path = str(tmpdir.join('a.dat'))
+    npt.assert_equal([(name, f.read())
+                      for name, f in util.iter_archive_members(a_path)],
+                     [(a_path, contents['a.dat'])])
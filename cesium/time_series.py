@@ -1,10 +1,14 @@
 import copy
-from collections import Iterable
+import io
+import json
+import os
+import struct
+from collections import Iterable, Sequence
 import numpy as np
 
 
-__all__ = ['load', 'TimeSeries', 'DEFAULT_MAX_TIME',
-           'DEFAULT_ERROR_VALUE']
+__all__ = ['load', 'TimeSeries', 'TimeSeriesCollection', 'save_collection',
+           'load_collection', 'DEFAULT_MAX_TIME', 'DEFAULT_ERROR_VALUE']
 
 
 DEFAULT_MAX_TIME = 1.0
@@ -70,21 +74,28 @@ def _default_values_like(old_values, value=None, upper=None):
     return new_values
 
 
-def _make_array_if_possible(x):
+def _make_array_if_possible(x, dtype='float64'):
     """Helper function to cast (1, n) arrays to (n,) arrrays, or uniform lists
-    of arrays to (p, n) arrays.
+    of arrays to (p, n) arrays, of floating point type `dtype`.
     """
     try:
-        x = np.asfarray(x).squeeze()
+        x = np.asarray(x, dtype=dtype).squeeze()
     except ValueError:
-        pass
+        if np.dtype(dtype) != np.float64:  # ragged: cast each channel
+            x = [np.asarray(x_i, dtype=dtype) for x_i in x]
     return x
 
 
 def load(ts_path):
-    """Load serialized TimeSeries from .npz file."""
+    """Load serialized TimeSeries from .npz file.
+
+    Time series stored in single precision (see `TimeSeries`) are loaded as
+    float32, all others as float64.
+    """
     with np.load(ts_path) as npz_file:
         data = dict(npz_file)
+    single = [data[key].dtype == np.float32 for key in data
+              if key.startswith('measurement')]
 
     for key in ['time', 'measurement', 'error']:
         if key not in data:  # combine channel arrays into list
@@ -101,7 +112,170 @@ def load(ts_path):
                       e=data.get('error'),
                       meta_features=dict(zip(data['meta_feat_names'],
                                              data['meta_feat_values'])),
-                      name=data.get('name'), label=data.get('label'))
+                      name=data.get('name'), label=data.get('label'),
+                      dtype='float32' if single and all(single)
+                      else 'float64')
+
+
+def _json_value(x):
+    """Convert NumPy scalars to the corresponding Python type for JSON."""
+    return x.item() if isinstance(x, np.generic) else x
+
+
+def save_collection(time_series, path, dtype='float64'):
+    """Store a collection of TimeSeries objects in a columnar on-disk format.
+
+    Rather than one .npz file per time series, the time, measurement and error
+    values of all channels of all time series are concatenated into three
+    `.npy` arrays, which can be memory-mapped for zero-copy access to each
+    time series (see `load_collection`). The directory `path` contains:
+        - time.npy, measurement.npy, error.npy: concatenated channel values
+        - offsets.npy: start of each channel (and end of the last channel)
+          in the concatenated arrays
+        - channels.npy: index of the first channel of each time series (and
+          total number of channels) in `offsets.npy`
+        - index.json: names, labels, meta-features and channel names
+
+    Parameters
+    ----------
+    time_series : iterable of TimeSeries objects
+        Time series to be stored; iterated over once, so this can be a
+        generator (the values are streamed to disk rather than held in
+        memory).
+    path : str
+        Path of the output directory, which will be created if necessary.
+    dtype : str, optional
+        Floating point type of the stored values; 'float32' halves the size
+        of the collection (and the amount of data read to featurize it),
+        but see the caveats of `TimeSeries`' `dtype`. Defaults to 'float64'.
+    """
+    os.makedirs(path, exist_ok=True)
+    dtype = np.dtype(dtype)
+    keys = ['time', 'measurement', 'error']
+    channels = [0]
+    offsets = [0]
+    index = {'name': [], 'label': [], 'meta_features': [],
+             'channel_names': []}
+
+    # The values are streamed to the .npy files in a single pass, after a
+    # placeholder header of the same size as the final header, which is
+    # written once the total length is known
+    header_size = len(_npy_header(dtype, np.iinfo(np.int64).max))
+    files = []
+    try:
+        for key in keys:
+            files.append(open(os.path.join(path, key + '.npy'), 'wb'))
+            files[-1].write(_npy_header(dtype, 0, header_size))
+        for ts in time_series:
+            for t_i, m_i, e_i in ts.channels():
+                for f, values in zip(files, (t_i, m_i, e_i)):
+                    f.write(np.ascontiguousarray(values,
+                                                 dtype=dtype).tobytes())
+                offsets.append(offsets[-1] + len(t_i))
+            channels.append(len(offsets) - 1)
+            index['name'].append(_json_value(ts.name))
+            index['label'].append(_json_value(ts.label))
+            index['meta_features'].append({feat: _json_value(value)
+                                           for feat, value
+                                           in ts.meta_features.items()})
+            index['channel_names'].append(ts.channel_names)
+        for f in files:
+            f.seek(0)
+            f.write(_npy_header(dtype, offsets[-1], header_size))
+    finally:
+        for f in files:
+            f.close()
+
+    np.save(os.path.join(path, 'channels.npy'), np.array(channels))
+    np.save(os.path.join(path, 'offsets.npy'), np.array(offsets))
+    with open(os.path.join(path, 'index.json'), 'w') as f:
+        json.dump(index, f)
+
+
+def _npy_header(dtype, length, size=None):
+    """Version 1.0 `.npy` header of a 1-d array of `length` values of type
+    `dtype`, padded with spaces to `size` bytes (if given)."""
+    f = io.BytesIO()
+    np.lib.format.write_array_header_1_0(
+        f, {'descr': np.lib.format.dtype_to_descr(dtype),
+            'fortran_order': False, 'shape': (length,)})
+    header = f.getvalue()
+    if size is not None and len(header) < size:
+        # The header is the magic string and version (8 bytes) and its
+        # length (2 bytes), followed by the dictionary and a newline
+        padding = size - len(header)
+        header = (header[:8] + struct.pack('<H', len(header) - 10 + padding)
+                  + header[10:-1] + b' ' * padding + b'\n')
+    return header
+
+
+def load_collection(path):
+    """Open a collection of time series stored by `save_collection`.
+
+    Returns
+    -------
+    TimeSeriesCollection
+        Sequence of the stored time series backed by memory-mapped arrays.
+    """
+    return TimeSeriesCollection(path)
+
+
+class TimeSeriesCollection(Sequence):
+    """Sequence of time series stored in the columnar format written by
+    `save_collection`.
+
+    The concatenated value arrays are memory-mapped, so opening a collection
+    is cheap regardless of its size, and each `TimeSeries` is only created
+    (from views of the mapped arrays, in the stored floating point type) when
+    it is accessed. Collections are pickled by path, so they can be passed to
+    other processes.
+
+    Attributes
+    ----------
+    path : str
+        Path of the collection directory.
+    names, labels : list
+        Name and label of each time series.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'index.json')) as f:
+            self._index = json.load(f)
+        self.names = self._index['name']
+        self.labels = self._index['label']
+        self._channels = np.load(os.path.join(path, 'channels.npy'))
+        self._offsets = np.load(os.path.join(path, 'offsets.npy'))
+        self._arrays = [np.load(os.path.join(path, key + '.npy'),
+                                mmap_mode='r')
+                        for key in ['time', 'measurement', 'error']]
+
+    def __getstate__(self):
+        return self.path
+
+    def __setstate__(self, path):
+        self.__init__(path)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("TimeSeriesCollection index out of range")
+        bounds = self._offsets[self._channels[i]:self._channels[i + 1] + 1]
+        t, m, e = [[np.asarray(array[start:stop])
+                    for start, stop in zip(bounds[:-1], bounds[1:])]
+                   for array in self._arrays]
+        if len(bounds) == 2:  # single channel
+            t, m, e = t[0], m[0], e[0]
+        return TimeSeries(t, m, e, label=self.labels[i],
+                          meta_features=self._index['meta_features'][i],
+                          name=self.names[i],
+                          channel_names=self._index['channel_names'][i],
+                          dtype=self._arrays[1].dtype)
 
 
 class TimeSeries(object):
@@ -151,9 +325,19 @@ class TimeSeries(object):
         List of names of channels of measurement; by default these are simply
         `channel_{i}`, but can be arbitrary depending on the nature of the
         different measurement channels.
+    dtype : numpy.dtype
+        Floating point type of the time, measurement and error values:
+        float64 (default) or float32 (opt-in, e.g. `dtype='float32'`). Single
+        precision halves the memory (and memory bandwidth) used by the values
+        and features are computed from the float32 values, but the
+        Lomb-Scargle fits and the sums in the vectorized features
+        (`features.batch`) are accumulated in double precision. Since float32
+        only has about 7 significant digits, times should be given relative
+        to a nearby epoch (e.g., days since the first observation rather than
+        MJD): cadence and periodic features depend on time differences.
     """
     def __init__(self, t=None, m=None, e=None, label=None, meta_features={},
-                 name=None, path=None, channel_names=None):
+                 name=None, path=None, channel_names=None, dtype='float64'):
         """Create a `TimeSeries` object from measurement values/metadata.
 
         See `TimeSeries` documentation for parameter values.
@@ -188,9 +372,10 @@ class TimeSeries(object):
             raise ValueError("m must be a 1D or 2D array, or a 2D list of"
                              " arrays.")
 
-        self.time = _make_array_if_possible(t)
-        self.measurement = _make_array_if_possible(m)
-        self.error = _make_array_if_possible(e)
+        self.dtype = np.dtype(dtype)
+        self.time = _make_array_if_possible(t, self.dtype)
+        self.measurement = _make_array_if_possible(m, self.dtype)
+        self.error = _make_array_if_possible(e, self.dtype)
         self.sort()  # re-order by time before broadcasting
 
         if _ndim(self.time) == 1 and _ndim(self.measurement) == 2:
@@ -6,7 +6,8 @@ import tempfile
 import zipfile
 
 
-__all__ = ['shorten_fname', 'remove_files', 'extract_time_series']
+__all__ = ['shorten_fname', 'remove_files', 'extract_time_series',
+           'iter_archive_members']
 
 
 def shorten_fname(file_path):
@@ -104,3 +105,39 @@ def extract_time_series(data_path, cleanup_archive=True, cleanup_files=False,
     finally:
         if cleanup_files:
             remove_files(file_paths)
+
+
+def iter_archive_members(data_path):
+    """Iterate over the files in a zip- or tarfile of time series without
+    extracting them to disk.
+
+    Tarfiles (including compressed ones) are read as a stream, so each
+    member is decompressed exactly once and in order. If the given file is
+    not a tar- or zipfile then it is treated as a single time series file.
+
+    Parameters
+    ----------
+    data_path : str
+        Path to data archive or single data file.
+
+    Yields
+    ------
+    (str, file)
+        Path of each file within the archive and a binary file object from
+        which its contents can be read; the file object is only valid until
+        the next item is requested.
+    """
+    if tarfile.is_tarfile(data_path):
+        with tarfile.open(data_path, mode='r|*') as archive:
+            for member in archive:
+                if member.isfile():
+                    yield member.name, archive.extractfile(member)
+    elif zipfile.is_zipfile(data_path):
+        with zipfile.ZipFile(data_path) as archive:
+            for info in archive.infolist():
+                if not info.filename.endswith('/'):
+                    with archive.open(info) as f:
+                        yield info.filename, f
+    else:
+        with open(data_path, 'rb') as f:
+            yield data_path, f
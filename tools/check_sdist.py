@@ -18,7 +18,7 @@ data = [l.replace('hard linking ', '') for l in data]
 data = ['./' + l.split(' ->')[0] for l in data]
 
 ignore_exts = ['.pyc', '.so', '.o', '#', '~']
-ignore_dirs = ['./dist', './tools', './doc']
+ignore_dirs = ['./dist', './tools', './doc', './benchmarks']
 ignore_files = ['./TODO.md', './README.md',
                 './run_script_in_container.py', './.gitignore',
                 './.travis.yml']